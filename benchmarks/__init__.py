@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+
+"""Created on 17.10.26
+
+.. moduleauthor:: Paweł Pecio
+
+"""
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+
+"""Created on 17.10.26
+
+Attributes diff (DefaultDiffProducer.same_opening_node) of inline-styled elements, as produced by WYSIWYG
+editors: thousands of spans sharing a few styles, some of them changed. Dedicated CSS/class diff (declarations
+compared by properties, memoized diffs) is compared against sequence matching of every attributes pair.
+
+Run from repository root::
+
+    PYTHONPATH=pyhtmldiff python -m benchmarks.attributes --elements 20000
+
+.. moduleauthor:: Paweł Pecio
+"""
+import argparse
+import base64
+import random
+import sys
+import time
+from difflib import SequenceMatcher
+
+from pyhtmldiff.dtd.const import DOMNode
+from pyhtmldiff.producer.standard import DefaultDiffProducer
+
+
+FONTS = (u'Arial', u'"Times New Roman", serif', u'Verdana')
+COLORS = (u'red', u'#333', u'rgb(10, 20, 30)', u'black')
+CLASSES = (u'bold', u'italic', u'lead', u'note', u'highlight')
+
+
+class SequenceDiffProducer(DefaultDiffProducer):
+    """
+    Attributes diffed by sequence matching of items, without memoized diffs
+    """
+
+    @classmethod
+    def _diff_attr(cls, attr_name, old_node, new_node, differ):
+        old_value = cls._get_attr(old_node, attr_name)
+        new_value = cls._get_attr(new_node, attr_name)
+        if old_value == new_value:
+            return None
+
+        diff = u'\n'.join(differ(old_value or u'', new_value or u''))
+        return base64.b64encode(diff.encode('utf-8')).decode('ascii')
+
+    @classmethod
+    def _sequence_diff(cls, old_items, new_items):
+        result = []
+        for tag, i1, i2, j1, j2 in SequenceMatcher(None, old_items, new_items).get_opcodes():
+            if tag == 'equal':
+                result.extend(cls._diff_item_unchanged(item) for item in old_items[i1:i2])
+                continue
+            result.extend(cls._diff_item_remove(item) for item in old_items[i1:i2])
+            result.extend(cls._diff_item_insert(item) for item in new_items[j1:j2])
+        return result
+
+    @classmethod
+    def _get_css_diff(cls, old_value, new_value):
+        return cls._sequence_diff(cls.re_css_split.split(old_value)[1::2], cls.re_css_split.split(new_value)[1::2])
+
+    @classmethod
+    def _get_class_diff(cls, old_value, new_value):
+        return cls._sequence_diff(old_value.split(' '), new_value.split(' '))
+
+
+PRODUCERS = (
+    ('sequence', SequenceDiffProducer),
+    ('fast', DefaultDiffProducer),
+)
+
+
+def _style(rnd):
+    return u'font-family: %s; font-size: %dpt; color: %s' % (
+        rnd.choice(FONTS), rnd.choice((10, 11, 12)), rnd.choice(COLORS)
+    )
+
+
+def styled_elements(count, seed=7):
+    """
+    :return: list of pairs (old node, new node) of spans, about a third of them with changed attributes
+    """
+    rnd = random.Random(seed)
+    pairs = []
+    for _ in range(count):
+        style = _style(rnd)
+        classes = u' '.join(rnd.sample(CLASSES, 2))
+        old = DOMNode('span', ((u'style', style), (u'class', classes)))
+
+        if rnd.random() < 0.2:
+            style = _style(rnd)
+        if rnd.random() < 0.1:
+            style = u'; '.join(reversed(style.split(u'; ')))
+        if rnd.random() < 0.1:
+            classes = u' '.join(rnd.sample(CLASSES, 2))
+        pairs.append((old, DOMNode('span', ((u'style', style), (u'class', classes)))))
+
+    return pairs
+
+
+def measure(pairs, repeat=3):
+    """
+    :return: dict producer name -> best time in seconds of diffing given pairs
+    """
+    results = {}
+    for name, producer in PRODUCERS:
+        best = None
+        for _ in range(repeat):
+            # caches are cold at the beginning of every run
+            producer._parsed_values.clear()
+            producer._interned.clear()
+            producer._attr_diffs.clear()
+
+            start = time.time()
+            for old, new in pairs:
+                producer.same_opening_node(old, new)
+            elapsed = time.time() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results[name] = best
+
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="py-html-diff attributes diff benchmark")
+    parser.add_argument('--elements', type=int, default=20000, help="Number of diffed elements")
+    parser.add_argument('--repeat', type=int, default=3, help="Number of timing runs, best one is taken")
+    args = parser.parse_args(argv)
+
+    results = measure(styled_elements(args.elements), args.repeat)
+    for name, _ in PRODUCERS:
+        sys.stdout.write('%-10s %8.3fs\n' % (name, results[name]))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+
+"""Created on 17.10.26
+
+Synthetic documents corpus for benchmarks. Every generator is deterministic (seeded) and returns
+a pair (original, modified) of HTML documents.
+
+.. moduleauthor:: Paweł Pecio
+"""
+import random
+
+
+WORDS = (
+    u'agreement party contract shall the of and to in a is that for on with as by this be any '
+    u'obligations payment term notice period written consent provided herein date effective services '
+    u'delivery invoice amount total tax rate clause section schedule annex liability damages law'
+).split()
+
+
+def _sentence(rnd, min_words=5, max_words=20):
+    words = [rnd.choice(WORDS) for _ in range(rnd.randint(min_words, max_words))]
+    return u' '.join(words).capitalize() + u'.'
+
+
+def _paragraph(rnd):
+    parts = []
+    for _ in range(rnd.randint(2, 6)):
+        sentence = _sentence(rnd)
+        if rnd.random() < 0.2:
+            sentence = u'<b>%s</b>' % sentence
+        elif rnd.random() < 0.1:
+            sentence = u'<span style="color: red">%s</span>' % sentence
+        parts.append(sentence)
+    return u'<p>%s</p>' % u' '.join(parts)
+
+
+def _edit_words(rnd, text, edits):
+    """Replace, insert or remove given number of words in text (tags are kept untouched)"""
+    words = text.split(u' ')
+    for _ in range(edits):
+        idx = rnd.randrange(len(words))
+        if u'<' in words[idx] or u'>' in words[idx]:
+            continue
+
+        action = rnd.random()
+        if action < 0.4:
+            words[idx] = rnd.choice(WORDS)
+        elif action < 0.7:
+            words.insert(idx, rnd.choice(WORDS))
+        elif len(words) > 1:
+            del words[idx]
+    return u' '.join(words)
+
+
+def long_article(scale=1, seed=1):
+    """Long article, a few words changed in a few paragraphs"""
+    rnd = random.Random(seed)
+    paragraphs = [_paragraph(rnd) for _ in range(400 * scale)]
+    modified = list(paragraphs)
+    for idx in rnd.sample(range(len(paragraphs)), 5):
+        modified[idx] = _edit_words(rnd, modified[idx], 3)
+    return u'\n'.join(paragraphs), u'\n'.join(modified)
+
+
+def many_small_edits(scale=1, seed=2):
+    """Article where almost every paragraph has a small change"""
+    rnd = random.Random(seed)
+    paragraphs = [_paragraph(rnd) for _ in range(200 * scale)]
+    modified = [_edit_words(rnd, p, 2) if rnd.random() < 0.8 else p for p in paragraphs]
+    return u'\n'.join(paragraphs), u'\n'.join(modified)
+
+
+def few_big_edits(scale=1, seed=3):
+    """Article where big sections were removed, inserted and rewritten"""
+    rnd = random.Random(seed)
+    paragraphs = [_paragraph(rnd) for _ in range(300 * scale)]
+    modified = list(paragraphs)
+    size = len(modified)
+    # rewrite a section, remove another one and insert a brand new one
+    modified[size // 10:size // 10 + 20 * scale] = [_paragraph(rnd) for _ in range(20 * scale)]
+    del modified[size // 2:size // 2 + 30 * scale]
+    modified[size // 3:size // 3] = [_paragraph(rnd) for _ in range(25 * scale)]
+    return u'\n'.join(paragraphs), u'\n'.join(modified)
+
+
+def wide_table(scale=1, seed=4):
+    """Financial-like table with many rows and columns, some cells changed and a row inserted"""
+    rnd = random.Random(seed)
+    columns = 12
+
+    def row(values):
+        return u'<tr>%s</tr>' % u''.join(u'<td>%s</td>' % v for v in values)
+
+    rows = [[u'%.2f' % (rnd.random() * 10000) for _ in range(columns)] for _ in range(300 * scale)]
+    modified = [list(r) for r in rows]
+    for _ in range(20 * scale):
+        modified[rnd.randrange(len(modified))][rnd.randrange(columns)] = u'%.2f' % (rnd.random() * 10000)
+    modified.insert(len(modified) // 2, [u'%.2f' % (rnd.random() * 10000) for _ in range(columns)])
+
+    def table(data):
+        return u'<table>\n<tbody>\n%s\n</tbody>\n</table>' % u'\n'.join(row(r) for r in data)
+
+    return table(rows), table(modified)
+
+
+def nested_lists(scale=1, seed=5):
+    """Deeply nested lists, items edited at various depths"""
+    rnd = random.Random(seed)
+
+    def build(depth):
+        return [
+            (_sentence(rnd, 3, 8), build(depth + 1) if depth < 4 else [])
+            for _ in range(4 if depth < 4 else 6)
+        ]
+
+    def render(items, edit):
+        result = []
+        for text, children in items:
+            if edit and rnd.random() < 0.1:
+                text = _edit_words(rnd, text, 1)
+            result.append(u'<li>%s%s</li>' % (text, render(children, edit) if children else u''))
+        return u'<ul>%s</ul>' % u''.join(result)
+
+    trees = [build(0) for _ in range(scale)]
+    original = u'\n'.join(render(tree, False) for tree in trees)
+    modified = u'\n'.join(render(tree, True) for tree in trees)
+    return original, modified
+
+
+def identical(scale=1, seed=6):
+    """Both versions are the same"""
+    original, _ = long_article(scale, seed)
+    return original, original
+
+
+CORPUS = (
+    ('long_article', long_article),
+    ('many_small_edits', many_small_edits),
+    ('few_big_edits', few_big_edits),
+    ('wide_table', wide_table),
+    ('nested_lists', nested_lists),
+    ('identical', identical),
+)
@@ -0,0 +1,360 @@
+# -*- coding: utf-8 -*-
+
+"""Created on 17.10.26
+
+Benchmark runner. Diffs synthetic corpus (see corpus module) with Diff, so every diff mode (hierarchical,
+streaming, cached documents, parser backends) can be measured, and reports every phase of the diff separately:
+parse, tokenize, match, process and render (see DiffStats). Results are written as JSON and can be compared
+against saved baseline.
+
+Run from repository root::
+
+    PYTHONPATH=pyhtmldiff python -m benchmarks.run --output results.json
+    PYTHONPATH=pyhtmldiff python -m benchmarks.run --baseline results.json
+
+.. moduleauthor:: Paweł Pecio
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import tracemalloc
+except ImportError:  # python 2
+    tracemalloc = None
+
+if tracemalloc is None or not hasattr(tracemalloc, 'reset_peak'):
+    # no allocation tracing available (reset_peak is needed to measure phases separately), growth of
+    # the process peak RSS is taken instead
+    tracemalloc = None
+    import resource
+
+from pyhtmldiff import Diff
+from pyhtmldiff.cache import ParsedDocumentCache
+from pyhtmldiff.stats import DiffStats
+
+from .corpus import CORPUS
+
+
+PHASES = DiffStats.PHASES
+
+# phases faster than that (in seconds) are too noisy to be reported as regressions
+MIN_COMPARED_TIME = 0.001
+
+# phases allocating less than that (in bytes) are too noisy to be reported as regressions
+MIN_COMPARED_MEMORY = 1024 * 1024
+
+METRICS = (
+    ('time', MIN_COMPARED_TIME),
+    ('peak_memory', MIN_COMPARED_MEMORY),
+)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _peak_rss():
+    """
+    :return: Peak RSS of the process in bytes
+    """
+    try:
+        # unlike ru_maxrss, it is not inherited from the parent process
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except IOError:
+        pass
+
+    # KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _memory_mark():
+    """
+    Start measuring peak memory.
+
+    :return: memory usage in bytes, to be passed to _memory_peak()
+    """
+    if tracemalloc is not None:
+        tracemalloc.reset_peak()
+        return tracemalloc.get_traced_memory()[0]
+
+    return _peak_rss()
+
+
+def _memory_peak(mark):
+    """
+    :return: Peak memory growth in bytes since given mark
+    """
+    if tracemalloc is not None:
+        return tracemalloc.get_traced_memory()[1] - mark
+
+    return _peak_rss() - mark
+
+
+class MemoryStats(DiffStats):
+    """
+    Diff stats which record also peak memory growth of every phase. Without allocation tracing, growth of
+    the process peak RSS is taken, so phase which allocates less than was freed before is reported as 0 and
+    measurement is meaningful only in a fresh process, see measure_memory().
+    """
+
+    def __init__(self):
+        super(MemoryStats, self).__init__()
+        self.peak_memory = dict((phase, 0) for phase in self.PHASES)
+
+    def timer(self, phase):
+        return _MemoryTimer(self, phase, super(MemoryStats, self).timer(phase))
+
+
+class _MemoryTimer(object):
+
+    def __init__(self, stats, phase, timer):
+        self._stats = stats
+        self._phase = phase
+        self._timer = timer
+        self._mark = None
+
+    def __enter__(self):
+        self._mark = _memory_mark()
+        self._timer.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._timer.__exit__(exc_type, exc_val, exc_tb)
+        peak_memory = self._stats.peak_memory
+        peak_memory[self._phase] = max(peak_memory[self._phase], _memory_peak(self._mark))
+
+
+class _MemoryDiff(Diff):
+
+    def _create_stats(self):
+        return MemoryStats()
+
+
+def _options_args(options):
+    args = []
+    for name in ('engine', 'parser', 'cleanup'):
+        if options.get(name):
+            args.extend(['--' + name, options[name]])
+    for name in ('hierarchical', 'streaming', 'cache'):
+        if options.get(name):
+            args.append('--' + name)
+    return args
+
+
+def _create_differ(options, differ_class=Diff, instrument=None):
+    kwargs = dict(options)
+    if kwargs.pop('cache', False):
+        kwargs['cache'] = ParsedDocumentCache()
+    return differ_class(instrument=instrument, **kwargs)
+
+
+def measure_time(original, modified, options, repeat):
+    """
+    Diff given documents repeatedly, best time of every phase is taken. The same Diff instance is used for all
+    runs, so with documents cache enabled, warm cache is measured.
+
+    :return: dict phase -> time in seconds
+    """
+    collected = []
+    differ = _create_differ(options, instrument=collected.append)
+    for _ in range(repeat):
+        differ.get_html_diff(original, modified)
+
+    return dict((phase, min(stats.timings[phase] for stats in collected)) for phase in PHASES)
+
+
+def _memory_by_phase(original_path, modified_path, options):
+    if tracemalloc is not None:
+        tracemalloc.start()
+
+    with io.open(original_path, encoding='utf-8') as original_file:
+        original = original_file.read()
+    with io.open(modified_path, encoding='utf-8') as modified_file:
+        modified = modified_file.read()
+
+    collected = []
+    _create_differ(options, _MemoryDiff, collected.append).get_html_diff(original, modified)
+    return collected[0].peak_memory
+
+
+def measure_memory(original, modified, options):
+    """
+    Diff given documents in a fresh process, so peak memory of every phase is not hidden by earlier
+    allocations. Documents are passed in files, nothing but documents is allocated before the diff.
+
+    :return: dict phase -> peak memory growth in bytes
+    """
+    directory = tempfile.mkdtemp()
+    try:
+        paths = [os.path.join(directory, name) for name in ('original.html', 'modified.html')]
+        for path, document in zip(paths, (original, modified)):
+            with io.open(path, 'w', encoding='utf-8') as document_file:
+                document_file.write(document)
+
+        command = [sys.executable, '-m', 'benchmarks.run', '--measure-memory'] + paths
+        output = subprocess.check_output(command + _options_args(options), cwd=ROOT)
+    finally:
+        shutil.rmtree(directory)
+
+    return json.loads(output.decode('utf-8'))
+
+
+def run(scale=1, repeat=3, cases=None, log=sys.stderr, **options):
+    """
+    Measure corpus cases.
+
+    :param options: Diff options: engine, parser, cleanup, hierarchical, streaming, cache (bool, fresh
+     ParsedDocumentCache is used)
+    """
+    options = dict((name, value) for name, value in options.items() if value)
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'scale': scale,
+            'repeat': repeat,
+            'options': options,
+            'memory': 'tracemalloc' if tracemalloc is not None else 'maxrss',
+            'timestamp': time.time(),
+        },
+        'results': {},
+    }
+
+    for name, generator in CORPUS:
+        if cases and name not in cases:
+            continue
+
+        original, modified = generator(scale)
+        log.write('%-20s %8d bytes ... ' % (name, len(original) + len(modified)))
+        log.flush()
+
+        times = measure_time(original, modified, options, repeat)
+        memory = measure_memory(original, modified, options)
+
+        result = report['results'][name] = dict(
+            (phase, {'time': times[phase], 'peak_memory': memory[phase]}) for phase in PHASES
+        )
+        result['size'] = len(original) + len(modified)
+
+        log.write('%.3fs\n' % sum(times.values()))
+
+    return report
+
+
+def compare(report, baseline, threshold):
+    """
+    Compare report against baseline.
+
+    :param threshold: Maximal allowed ratio of current and baseline time or peak memory
+    :return: list of regressions (case, phase, metric, baseline value, current value)
+    :rtype: list
+    """
+    regressions = []
+    for case, result in sorted(report['results'].items()):
+        base = baseline['results'].get(case)
+        if base is None:
+            continue
+
+        for phase in PHASES:
+            for metric, minimum in METRICS:
+                current_value = result[phase].get(metric)
+                base_value = base[phase].get(metric)
+                if current_value is None or base_value is None or base_value < minimum:
+                    continue
+
+                if float(current_value) / base_value > threshold:
+                    regressions.append((case, phase, metric, base_value, current_value))
+
+    return regressions
+
+
+def _print_table(report, baseline, metric, formatter, out):
+    header = '%-20s' % metric + ''.join('%18s' % phase for phase in PHASES)
+    out.write(header + '\n' + '-' * len(header) + '\n')
+
+    for case, result in sorted(report['results'].items()):
+        cells = []
+        for phase in PHASES:
+            value = result[phase][metric]
+            cell = formatter(value)
+            if baseline and case in baseline['results']:
+                base_value = baseline['results'][case][phase].get(metric)
+                if base_value:
+                    cell += ' (x%.2f)' % (float(value) / base_value)
+            cells.append('%18s' % cell)
+        out.write('%-20s' % case + ''.join(cells) + '\n')
+
+
+def print_report(report, baseline=None, out=sys.stdout):
+    _print_table(report, baseline, 'time', lambda value: '%.4fs' % value, out)
+    out.write('\n')
+    _print_table(report, baseline, 'peak_memory', lambda value: '%.1fM' % (value / 1024.0 / 1024), out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="py-html-diff benchmarks")
+    parser.add_argument('--scale', type=int, default=1, help="Corpus documents size multiplier")
+    parser.add_argument('--repeat', type=int, default=3, help="Number of timing runs, best one is taken")
+    parser.add_argument('--engine', default=None, help="Diff engine name")
+    parser.add_argument('--parser', default=None, help="Parser backend name")
+    parser.add_argument('--cleanup', default=None, help="Opcodes cleanup name")
+    parser.add_argument('--hierarchical', action='store_true', help="Hierarchical diff")
+    parser.add_argument('--streaming', action='store_true', help="Streaming diff")
+    parser.add_argument('--cache', action='store_true', help="Cache parsed documents (warm cache is measured)")
+    parser.add_argument('--case', action='append', dest='cases', help="Run only given case (can be repeated)")
+    parser.add_argument('--output', help="Write JSON results to given file")
+    parser.add_argument('--baseline', help="Compare results with JSON results saved in given file")
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help="Maximal allowed slowdown (or memory growth) against baseline, default 1.25")
+    # used internally, see measure_memory()
+    parser.add_argument('--measure-memory', nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    options = {
+        'engine': args.engine,
+        'parser': args.parser,
+        'cleanup': args.cleanup,
+        'hierarchical': args.hierarchical,
+        'streaming': args.streaming,
+        'cache': args.cache,
+    }
+
+    if args.measure_memory:
+        options = dict((name, value) for name, value in options.items() if value)
+        sys.stdout.write(json.dumps(_memory_by_phase(*args.measure_memory, options=options)))
+        return 0
+
+    report = run(scale=args.scale, repeat=args.repeat, cases=args.cases, **options)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+
+    print_report(report, baseline)
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2, sort_keys=True)
+
+    if baseline is not None:
+        regressions = compare(report, baseline, args.threshold)
+        for case, phase, metric, base_value, current_value in regressions:
+            sys.stdout.write('REGRESSION %s/%s %s: %s -> %s\n' % (case, phase, metric, base_value, current_value))
+
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
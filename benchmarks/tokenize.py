@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+"""Created on 17.10.26
+
+Single pass lxml tokenizing (LxmlBackend.tokenize) against splitting events of built tree
+(SplittedTextNodesIterator(LxmlBackend.parse())). Every variant is measured in a fresh process.
+
+Run from repository root::
+
+    PYTHONPATH=pyhtmldiff python -m benchmarks.tokenize --scale 8
+
+.. moduleauthor:: Paweł Pecio
+"""
+import argparse
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from pyhtmldiff.differ.iterator import SplittedTextNodesIterator
+from pyhtmldiff.parser import LxmlBackend
+
+from .corpus import long_article
+from .run import ROOT, _memory_mark, _memory_peak, tracemalloc
+
+
+VARIANTS = {
+    'single_pass': lambda backend, document: backend.tokenize(document),
+    'tree': lambda backend, document: SplittedTextNodesIterator(backend.parse(document)),
+}
+
+
+def _measure(variant, path):
+    if tracemalloc is not None:
+        tracemalloc.start()
+
+    with io.open(path, encoding='utf-8') as document_file:
+        document = document_file.read()
+
+    backend = LxmlBackend()
+    mark = _memory_mark()
+    start = time.time()
+    tokens = VARIANTS[variant](backend, document)
+    return {'time': time.time() - start, 'peak_memory': _memory_peak(mark), 'tokens': len(tokens)}
+
+
+def measure(document):
+    """
+    :return: dict variant -> measurement (time, peak memory growth in bytes, number of tokens)
+    """
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'document.html')
+        with io.open(path, 'w', encoding='utf-8') as document_file:
+            document_file.write(document)
+
+        results = {}
+        for variant in sorted(VARIANTS):
+            command = [sys.executable, '-m', 'benchmarks.tokenize', '--measure', variant, path]
+            results[variant] = json.loads(subprocess.check_output(command, cwd=ROOT).decode('utf-8'))
+    finally:
+        shutil.rmtree(directory)
+
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="py-html-diff lxml tokenizing benchmark")
+    parser.add_argument('--scale', type=int, default=8, help="Document size multiplier, 8 is about 1 MB")
+    # used internally, see measure()
+    parser.add_argument('--measure', nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.measure:
+        sys.stdout.write(json.dumps(_measure(*args.measure)))
+        return 0
+
+    document = long_article(args.scale)[0]
+    sys.stdout.write('document: %d characters\n' % len(document))
+    for variant, result in sorted(measure(document).items()):
+        sys.stdout.write('%-12s %8.3fs %8.1fM %10d tokens\n' % (
+            variant, result['time'], result['peak_memory'] / 1024.0 / 1024, result['tokens']
+        ))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
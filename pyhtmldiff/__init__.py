@@ -5,4 +5,4 @@
 .. moduleauthor:: Paweł Pecio
 
 """
-from .base import Diff
\ No newline at end of file
+from .base import Diff, register_dtd
\ No newline at end of file
@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+
+"""Created on 17.10.26
+
+Asyncio facade of Diff. Diffs are calculated in a bounded executor (threads or worker processes), so the
+event loop is not blocked by large documents. Only callbacks and futures are used (no async syntax), so the
+module can be imported on python 2, but asyncio is required to use it.
+
+Usage::
+
+    differ = AsyncDiff(Diff(hierarchical=True), workers=4)
+    html = await differ.get_html_diff(version_a, version_b)
+
+    async for chunk in differ.iter_diff(version_a, version_b):
+        await response.write(chunk)
+
+.. moduleauthor:: Paweł Pecio
+"""
+import threading
+from collections import deque
+from multiprocessing import cpu_count
+
+try:
+    import asyncio
+except ImportError:  # python 2
+    asyncio = None
+
+try:
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+except ImportError:  # pragma: no cover, python 2 without futures backport
+    ProcessPoolExecutor = ThreadPoolExecutor = None
+
+from .base import Diff
+from .batch import _load_differ, _pickle_differ
+
+
+def _render_diff(differ, version_a, version_b, format, kwargs):
+    """
+    Diff given versions in the executor.
+
+    :param differ: Diff instance or tuple (key, pickled Diff instance), see batch._pickle_differ()
+    """
+    if isinstance(differ, tuple):
+        differ = _load_differ(*differ)
+
+    return differ.get_diff(version_a, version_b, format=format, **kwargs)
+
+
+class AsyncDiff(object):
+    """
+    Diff with asyncio API. At most max_concurrency diffs are submitted to the executor at once, further
+    diffs wait in a queue (in the event loop, not in the executor), so an overloaded service does not pile up
+    work it cannot do.
+
+    Cancelled diff is removed from the queue, or cancelled in the executor if it has not started yet. Diff
+    which already runs cannot be interrupted, its result is discarded; use deadline (see
+    Diff.get_html_diff()) to bound its time.
+    """
+
+    def __init__(self, differ=None, workers=None, processes=False, max_concurrency=None, executor=None):
+        """
+        :param differ: Diff instance, Diff() by default. With processes, it has to be picklable.
+        :param workers: Number of executor threads or processes, by default number of CPUs
+        :param processes: Diff in worker processes instead of threads. Threads are enough if the event loop
+         has to be kept responsive only, processes make diffs run in parallel.
+        :param max_concurrency: Maximal number of diffs submitted to the executor at once, number of workers
+         by default
+        :param executor: concurrent.futures executor to be used instead of an own one. It is not shut down by
+         close(). Streamed diffs (see iter_diff()) need a thread executor.
+        :type differ: Diff,None
+        """
+        if asyncio is None:
+            raise RuntimeError("AsyncDiff requires asyncio")
+
+        if executor is None and ThreadPoolExecutor is None:
+            raise RuntimeError("AsyncDiff requires concurrent.futures")
+
+        if max_concurrency is not None and max_concurrency < 1:
+            raise ValueError("Concurrency limit has to be positive")
+
+        self._differ = differ if differ is not None else Diff()
+        self._workers = workers or cpu_count()
+        self._processes = processes
+        self._max_concurrency = max_concurrency or self._workers
+        self._executor = executor
+        self._own_executor = executor is None
+
+        # pickled differ sent to worker processes, see batch._pickle_differ()
+        self._pickled = _pickle_differ(self._differ) if processes else None
+
+        # (future, function, args) waiting for a free slot
+        self._queue = deque()
+        self._running = 0
+
+    def get_html_diff(self, version_a, version_b, **kwargs):
+        """
+        :param kwargs: Diff limits, see Diff.get_html_diff()
+        :return: asyncio future of diff rendered as HTML string
+        """
+        return self.get_diff(version_a, version_b, format='html', **kwargs)
+
+    def get_diff(self, version_a, version_b, format='html', **kwargs):
+        """
+        :param kwargs: Diff limits, see Diff.get_diff()
+        :return: asyncio future of diff rendered in given format
+        """
+        differ = self._pickled if self._processes else self._differ
+        return self._submit(_render_diff, differ, version_a, version_b, format, kwargs)
+
+    def iter_diff(self, version_a, version_b, format='html', chunk_size=None, max_buffered=4, **kwargs):
+        """
+        Render diff incrementally, see Diff.iter_diff(). Chunks are rendered in the executor thread, which
+        stops when max_buffered chunks are not consumed yet, so slow client does not make the whole result
+        buffered. With worker processes, diff is rendered as a whole and then splitted into chunks.
+
+        :param max_buffered: Maximal number of rendered chunks waiting to be consumed
+        :param kwargs: Diff limits, see Diff.iter_diff()
+        :return: asynchronous iterator of rendered chunks, it has to be consumed or closed (aclose()),
+         otherwise it occupies a concurrency slot
+        """
+        if max_buffered < 1:
+            raise ValueError("Number of buffered chunks has to be positive")
+
+        iterator = _ChunksIterator(max_buffered)
+        if self._processes:
+            future = self._submit(_render_diff, self._pickled, version_a, version_b, format, kwargs)
+            iterator.set_future(future, chunk_size or Diff.CHUNK_SIZE)
+        else:
+            kwargs = dict(kwargs, format=format, chunk_size=chunk_size)
+            iterator.set_future(self._submit(iterator.produce, self._differ, version_a, version_b, kwargs))
+
+        return iterator
+
+    def close(self, wait=True):
+        """
+        Cancel queued diffs and shut down own executor.
+        """
+        while self._queue:
+            self._queue.popleft()[0].cancel()
+
+        if self._own_executor and self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+    @property
+    def pending(self):
+        """Number of diffs waiting for a free slot"""
+        return len(self._queue)
+
+    @property
+    def running(self):
+        """Number of diffs submitted to the executor"""
+        return self._running
+
+    # -------------------- PRIVATE METHODS ---------------------------
+
+    def _get_executor(self):
+        if self._executor is None:
+            executor_class = ProcessPoolExecutor if self._processes else ThreadPoolExecutor
+            self._executor = executor_class(max_workers=self._workers)
+        return self._executor
+
+    def _submit(self, function, *args):
+        future = asyncio.get_event_loop().create_future()
+        self._queue.append((future, function, args))
+        self._start_queued()
+        return future
+
+    def _start_queued(self):
+        while self._queue and self._running < self._max_concurrency:
+            future, function, args = self._queue.popleft()
+            if future.cancelled():
+                continue
+
+            self._running += 1
+            submitted = asyncio.wrap_future(self._get_executor().submit(function, *args))
+            submitted.add_done_callback(lambda done, future=future: self._finished(done, future))
+            future.add_done_callback(lambda done, submitted=submitted: done.cancelled() and submitted.cancel())
+
+    def _finished(self, submitted, future):
+        self._running -= 1
+        if not future.done():
+            if submitted.cancelled():
+                future.cancel()
+            elif submitted.exception() is not None:
+                future.set_exception(submitted.exception())
+            else:
+                future.set_result(submitted.result())
+
+        self._start_queued()
+
+
+class _ChunksIterator(object):
+    """
+    Asynchronous iterator of chunks rendered in another thread. The producing thread waits, if too many
+    chunks are not consumed yet, and stops when iterator is closed.
+    """
+
+    def __init__(self, max_buffered):
+        self._loop = asyncio.get_event_loop()
+        self._chunks = deque()
+        self._waiter = None
+        self._future = None
+        self._chunk_size = None
+        self._finished = False
+        self._closed = False
+        # released for every consumed chunk, producer acquires it for every rendered one
+        self._free = threading.Semaphore(max_buffered)
+
+    def set_future(self, future, chunk_size=None):
+        """
+        :param future: Future of the producer (see produce()) or, if chunk_size is given, future of the whole
+         rendered diff, which is splitted into chunks of chunk_size
+        """
+        self._future = future
+        self._chunk_size = chunk_size
+        future.add_done_callback(self._producer_done)
+
+    def produce(self, differ, version_a, version_b, kwargs):
+        """
+        Render chunks, called in the executor thread.
+
+        :param kwargs: Diff.iter_diff() arguments
+        """
+        chunks = differ.iter_diff(version_a, version_b, **kwargs)
+        try:
+            for chunk in chunks:
+                self._free.acquire()
+                if self._closed:
+                    return
+                self._loop.call_soon_threadsafe(self._put, chunk)
+        finally:
+            chunks.close()
+
+    def _put(self, chunk):
+        if not self._closed:
+            self._chunks.append(chunk)
+            self._wake()
+
+    def _producer_done(self, future):
+        if future.cancelled():
+            # producer waiting for a free slot notices that iterator is closed
+            self._stop()
+        elif self._chunk_size is not None and future.exception() is None:
+            result = future.result()
+            size = self._chunk_size
+            self._chunks.extend(result[start:start + size] for start in range(0, len(result), size))
+
+        self._finished = True
+        self._wake()
+
+    def _stop(self):
+        if not self._closed:
+            self._closed = True
+            self._chunks.clear()
+            self._free.release()
+
+    def _wake(self):
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        result = self._loop.create_future()
+        self._next(result)
+        return result
+
+    def _next(self, result, waiter=None):
+        if result.done():
+            return
+
+        if self._chunks:
+            if self._chunk_size is None:
+                self._free.release()
+            result.set_result(self._chunks.popleft())
+        elif not self._finished:
+            self._waiter = self._loop.create_future()
+            self._waiter.add_done_callback(lambda waiter: self._next(result))
+        elif self._future.cancelled():
+            result.set_exception(asyncio.CancelledError())
+        elif self._future.exception() is not None:
+            result.set_exception(self._future.exception())
+        else:
+            result.set_exception(StopAsyncIteration())
+
+    def aclose(self):
+        """
+        Stop rendering, remaining chunks are discarded.
+
+        :return: asyncio future
+        """
+        self._stop()
+        if self._future is not None:
+            self._future.cancel()
+
+        closed = self._loop.create_future()
+        closed.set_result(None)
+        return closed
@@ -6,11 +6,18 @@
 
 """
 
-import html5lib
 from genshi import Stream
-from genshi.input import ET
 
 from differ.base import StreamDiffer
+from differ.cleanup import get_cleanup
+from differ.engine import get_engine
+from differ.iterator import SplittedTextNodesIterator
+from dtd.compiled import get_dtd, register_dtd
+from utils import strip_root
+from .batch import iter_diff_many
+from .parser import Html5libBackend, get_parser
+from .prepared import PreparedDocument
+from .stats import DiffStats, timed
 
 
 class Diff(object):
@@ -19,8 +26,71 @@ class Diff(object):
     Differ class
     """
 
-    def __init__(self, encoding=None):
+    # default number of characters of rendered chunk, see iter_diff()
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, encoding=None, engine=None, hierarchical=False, streaming=False, cache=None, parser=None,
+                 instrument=None, tracer=None, dtd=None, cleanup=None, diff_attributes=False,
+                 detect_moves=False, tables=False):
+        """
+        :param encoding: Rendered diff encoding
+        :param engine: Sequence matching engine: 'difflib' (default), 'myers', 'histogram' or DiffEngine instance.
+         See differ.engine module for details.
+        :param hierarchical: Align block elements (paragraphs, list items, table cells, sections) at first and
+         diff words only inside changed blocks. Much faster for large documents with local changes.
+        :param streaming: Generic diff is a lazy stream, diff is calculated while the stream is consumed, so the
+         whole result is never kept in memory. Such stream can be iterated only once.
+        :param cache: Cache of parsed and tokenized documents, can be shared between instances
+        :param parser: HTML parser backend: 'html5lib' (default), 'lxml' or ParserBackend instance.
+         See parser module for details.
+        :param instrument: Function called with DiffStats (phases timings and counters) of every calculated diff.
+         Stats are not collected at all, if not given. In streaming mode, function is called when the stream
+         is consumed. To be used with worker processes, function has to be picklable.
+        :param tracer: Collector of processors trace events, e.g. differ.tracing.Tracer keeping recent events
+         for post-mortem dump of a bad diff. By default events are only logged, if 'pyHtmlDiff' logger has
+         debug level enabled.
+        :param dtd: Document definition: 'html5' (default), name of definition registered with register_dtd(),
+         definition class (e.g. Html5Definition subclass with custom elements) or CompiledDTD instance.
+        :param cleanup: Opcodes cleanup merging fragmented word changes before processing: 'semantic'
+         or OpcodesCleanup instance (e.g. SemanticCleanup with tuned thresholds). Disabled by default.
+         See differ.cleanup module for details.
+        :param diff_attributes: Elements differing only in diffed attributes (style, class of text elements,
+         table cells spans, see DefaultDiffProducer.diff_attrs) are matched as the same element, changes of
+         attributes are marked by x-diff-<attribute> attributes instead of deleting and inserting the whole
+         element. Disabled by default.
+        :param detect_moves: Deleted and inserted blocks with identical or nearly identical contents are
+         rendered as moved: empty block marked by x-diff-move-from attribute at the old position and the block
+         marked by x-diff-move-to attribute (with the same move identifier) at the new one. True or MoveDetector
+         instance (e.g. with tuned similarity). Disabled by default. See differ.moves module for details.
+        :param tables: Diff changed tables by their structure: rows are aligned by their key column and
+         contents, cells by their position, only changed cells are diffed by words. Implies hierarchical diff.
+         Disabled by default. See differ.table module for details.
+        :type engine: basestring,DiffEngine,None
+        :type hierarchical: bool
+        :type streaming: bool
+        :type cache: ParsedDocumentCache,None
+        :type parser: basestring,ParserBackend,None
+        :type instrument: callable,None
+        :type tracer: Tracer,None
+        :type dtd: basestring,type,CompiledDTD,None
+        :type cleanup: basestring,OpcodesCleanup,None
+        :type diff_attributes: bool
+        :type detect_moves: bool,MoveDetector
+        :type tables: bool
+        """
         self._encoding = encoding
+        self._engine = get_engine(engine)
+        self._hierarchical = hierarchical
+        self._streaming = streaming
+        self._cache = cache
+        self._parser = get_parser(parser) if parser is not None else None
+        self._instrument = instrument
+        self._tracer = tracer
+        self._dtd = get_dtd(dtd)
+        self._cleanup = get_cleanup(cleanup)
+        self._diff_attributes = diff_attributes
+        self._detect_moves = detect_moves
+        self._tables = tables
 
     @classmethod
     def parse_html(cls, html_string):
@@ -30,63 +100,301 @@ class Diff(object):
         :return:
         """
         # TODO: take care of self._encoding
-        builder = html5lib.getTreeBuilder('etree')
-        parser = html5lib.HTMLParser(tree=builder)
-        tree = parser.parseFragment(html_string)
+        return Html5libBackend().parse(html_string)
 
-        return ET(tree)
+    def prepare(self, html_string):
+        """
+        Parse and tokenize given document once, so it can be diffed later against many other versions without
+        parsing. Prepared document can be passed to every diff method instead of HTML string, pickled or
+        written to a file (see prepared module).
 
-    def get_generic_diff(self, version_a, version_b):
+        :param html_string: Document contents
+        :rtype: PreparedDocument
+        """
+        return PreparedDocument.prepare(self._prepare_document(html_string, reusable=True), self._dtd)
+
+    def get_generic_diff(self, version_a, version_b, deadline=None, max_tokens=None):
         """
         Returns generic Genshi Stream object with diff calculated on given A and B HTML content
         versions.
 
         :param version_a:
         :param version_b:
+        :param deadline: Time limit of matching in seconds, see get_html_diff()
+        :param max_tokens: Limit of matched tokens, see get_html_diff()
         :return:
         """
-        a_html = self.parse_html(version_a)
-        b_html = self.parse_html(version_b)
+        stats = self._create_stats()
+        stream = self._get_generic_diff(version_a, version_b, stats, deadline, max_tokens)
+        if stats is None:
+            return stream
+
+        if self._streaming:
+            # diff is calculated while the stream is consumed
+            return Stream(self._report_consumed(stream, stats))
 
-        return self._get_diff_stream(a_html, b_html)
+        self._instrument(stats)
+        return stream
 
-    def get_diff(self, version_a, version_b, format='html'):
+    def get_diff(self, version_a, version_b, format='html', deadline=None, max_tokens=None):
         """
         Return diff between version A and B rendered in given format.
         See Genshi stream render method for list of available renders.
         :param version_a:
         :param version_b:
         :param format: By default 'html'
+        :param deadline: Time limit of matching in seconds, see get_html_diff()
+        :param max_tokens: Limit of matched tokens, see get_html_diff()
         :return:
         """
-        return self.get_generic_diff(version_a, version_b).render(format, encoding=self._encoding)
+        stats = self._create_stats()
+        stream = self._get_generic_diff(version_a, version_b, stats, deadline, max_tokens)
+        return self._render(stream, format, stats)
 
-    def get_html_diff(self, version_a, version_b):
+    def get_html_diff(self, version_a, version_b, deadline=None, max_tokens=None):
         """
         Return diff between version A and B rendered as HTML string.
 
+        Matching of pathological documents (e.g. completely reflowed text) can take very long. When a limit
+        is given and exceeded, diff falls back to coarser level: changed blocks are marked as deleted and
+        inserted as a whole ('block'), then the whole document is marked as deleted and inserted ('document').
+        Used level is reported as DiffStats.level, see instrument.
+
         :param version_a:
         :param version_b:
+        :param deadline: Time limit of matching in seconds, applies to every level separately
+        :param max_tokens: Maximal number of matched tokens (words or blocks of both versions)
         :return:
         """
-        return self.get_diff(version_a, version_b, format='html')
+        return self.get_diff(version_a, version_b, format='html', deadline=deadline, max_tokens=max_tokens)
+
+    def iter_diff(self, version_a, version_b, format='html', chunk_size=None, deadline=None, max_tokens=None):
+        """
+        Return diff between version A and B rendered in given format incrementally, as chunks of about
+        chunk_size characters. Rendered result is never kept in memory as a whole (with streaming enabled, nor
+        the generic diff is).
+
+        :param version_a:
+        :param version_b:
+        :param format: By default 'html'
+        :param chunk_size: Minimal number of characters of a chunk (only the last one can be shorter),
+         CHUNK_SIZE by default
+        :param deadline: Time limit of matching in seconds, see get_html_diff()
+        :param max_tokens: Limit of matched tokens, see get_html_diff()
+        :return: generator of rendered chunks, encoded if encoding was given
+        """
+        if chunk_size is not None and chunk_size < 1:
+            raise ValueError("Chunk size has to be positive")
+
+        stats = self._create_stats()
+        stream = self._get_generic_diff(version_a, version_b, stats, deadline, max_tokens)
+        return self._iter_rendered(stream, format, chunk_size or self.CHUNK_SIZE, stats)
+
+    def write_diff(self, version_a, version_b, fp, format='html', chunk_size=None, deadline=None, max_tokens=None):
+        """
+        Write diff between version A and B rendered in given format to a file-like object, chunk by chunk
+        (see iter_diff()), so at most one chunk of the rendered result is kept in memory.
+
+        :param version_a:
+        :param version_b:
+        :param fp: Writable object (file, socket file, gzip stream), binary ones need Diff encoding to be set
+        :param format: By default 'html'
+        :param chunk_size: Number of characters written at once, CHUNK_SIZE by default
+        :param deadline: Time limit of matching in seconds, see get_html_diff()
+        :param max_tokens: Limit of matched tokens, see get_html_diff()
+        :return: Number of written characters (bytes, if encoding was given)
+        :rtype: int
+        """
+        written = 0
+        for chunk in self.iter_diff(version_a, version_b, format, chunk_size, deadline, max_tokens):
+            fp.write(chunk)
+            written += len(chunk)
+
+        return written
+
+    def diff_chain(self, versions, format='html'):
+        """
+        Generate diffs of consecutive versions: v1 and v2, v2 and v3, ... Each version is parsed and tokenized
+        only once. Diffs are rendered lazily, when requested.
+
+        :param versions: iterable of document versions (HTML strings)
+        :param format: By default 'html'
+        :return: generator of rendered diffs
+        """
+        previous = None
+        for version in versions:
+            stats = self._create_stats()
+            with timed(stats, 'parse'):
+                current = self._prepare_document(version, reusable=True)
+
+            if previous is not None:
+                yield self._render(self._get_diff_stream(previous, current, stats), format, stats)
+
+            previous = current
+
+    def get_html_diff_many(self, pairs, workers=None, chunksize=1):
+        """
+        Return diffs of many versions pairs rendered as HTML strings. Pairs are diffed in parallel
+        in worker processes, results order is preserved. If diff of a pair fails, BatchItemError is placed
+        as its result and remaining pairs are processed.
+
+        :param pairs: iterable of tuples (version_a, version_b)
+        :param workers: Number of worker processes, by default number of CPUs, 0 means current process
+        :param chunksize: Number of pairs sent to a worker at once
+        :rtype: list
+        """
+        return list(self.iter_html_diff_many(pairs, workers=workers, chunksize=chunksize))
+
+    def iter_html_diff_many(self, pairs, workers=None, chunksize=1):
+        """
+        Generator variant of get_html_diff_many(). Pairs are consumed lazily.
+
+        :param pairs: iterable of tuples (version_a, version_b)
+        :param workers: Number of worker processes, by default number of CPUs, 0 means current process
+        :param chunksize: Number of pairs sent to a worker at once
+        """
+        return iter_diff_many(self, pairs, workers=workers, chunksize=chunksize)
 
     # -------------------- PRIVATE METHODS ---------------------------
 
+    def _tokenize(self, html_string):
+        if self._parser is None:
+            return SplittedTextNodesIterator(self.parse_html(html_string))
+
+        return self._parser.tokenize(html_string)
+
+    def _prepare_document(self, html_string, reusable=False):
+        """
+        Returns document events ready to be passed to the differ.
+
+        :param html_string:
+        :param reusable: Result have to be suitable for many diffs
+        """
+        if isinstance(html_string, SplittedTextNodesIterator):
+            # already tokenized, see prepare()
+            return html_string
+
+        if self._cache is not None:
+            namespace = self._parser.name if self._parser is not None else ''
+            return self._cache.get_or_create(html_string, self._tokenize, namespace)
+
+        if reusable or self._parser is not None:
+            # parser backends can tokenize document at once, without intermediate events
+            return self._tokenize(html_string)
+
+        return self.parse_html(html_string)
+
+    def _create_stats(self):
+        if self._instrument is None:
+            return None
+
+        return DiffStats()
+
+    def _get_generic_diff(self, version_a, version_b, stats, deadline=None, max_tokens=None):
+        with timed(stats, 'parse'):
+            a_html = self._prepare_document(version_a)
+            if stats is not None and not isinstance(a_html, SplittedTextNodesIterator):
+                # events are parsed lazily, parse these now so parsing is not measured as tokenizing
+                a_html = list(a_html)
+
+            if version_b == version_a:
+                # identical documents are parsed once and not diffed at all
+                b_html = a_html
+            else:
+                b_html = self._prepare_document(version_b)
+                if stats is not None and not isinstance(b_html, SplittedTextNodesIterator):
+                    b_html = list(b_html)
+
+        return self._get_diff_stream(a_html, b_html, stats, deadline, max_tokens)
+
+    def _render(self, stream, format, stats):
+        with timed(stats, 'render'):
+            result = stream.render(format, encoding=self._encoding)
+
+        if stats is not None:
+            self._instrument(stats)
+
+        return result
+
+    def _iter_rendered(self, stream, format, chunk_size, stats):
+        if self._encoding is not None:
+            # the same errors handling as Stream.render() has
+            errors = 'replace' if format == 'text' else 'xmlcharrefreplace'
+            encode = lambda string: string.encode(self._encoding, errors)
+        else:
+            encode = lambda string: string
+
+        parts = stream.serialize(method=format)
+        buffered = []
+        length = 0
+        while True:
+            with timed(stats, 'render'):
+                part = next(parts, None)
+
+            if part is None:
+                break
+
+            buffered.append(part)
+            length += len(part)
+            if length >= chunk_size:
+                yield encode(u''.join(buffered))
+                buffered = []
+                length = 0
+
+        if buffered:
+            yield encode(u''.join(buffered))
+
+        if stats is not None:
+            self._instrument(stats)
+
+    def _report_consumed(self, events, stats):
+        for event in events:
+            yield event
+
+        self._instrument(stats)
+
     def _get_differ_class(self):
         return StreamDiffer
 
-    def _get_differ_context(self, a_html, b_html):
+    def _get_differ_context(self, a_html, b_html, stats=None, deadline=None, max_tokens=None):
         return {
             'old': a_html,
-            'new': b_html
+            'new': b_html,
+            'engine': self._engine,
+            'hierarchical': self._hierarchical,
+            'stats': stats,
+            'tracer': self._tracer,
+            'dtd': self._dtd,
+            'cleanup': self._cleanup,
+            'deadline': deadline,
+            'max_tokens': max_tokens,
+            'diff_attributes': self._diff_attributes,
+            'detect_moves': self._detect_moves,
+            'tables': self._tables,
         }
 
-    def _get_differ(self, a_html, b_html):
-        kwargs = self._get_differ_context(a_html, b_html)
+    def _get_differ(self, a_html, b_html, stats=None, deadline=None, max_tokens=None):
+        kwargs = self._get_differ_context(a_html, b_html, stats, deadline, max_tokens)
         instance = self._get_differ_class()(**kwargs)
         return instance
 
-    def _get_diff_stream(self, a_html, b_html):
+    def _get_diff_stream(self, a_html, b_html, stats=None, deadline=None, max_tokens=None):
+        differ = self._get_differ(a_html, b_html, stats, deadline, max_tokens)
+
         # note: parsed HTMLs are placed in <DOCUMENT_FRAGMENT> element, skip this fake-root
-        return Stream(self._get_differ(a_html, b_html).get_result()[1:-1])
+        if self._streaming:
+            events = strip_root(differ.iter_result())
+            if stats is not None:
+                events = _count_events(events, stats)
+            return Stream(events)
+
+        result = differ.get_result()[1:-1]
+        if stats is not None:
+            stats.output_events = len(result)
+        return Stream(result)
+
+
+def _count_events(events, stats):
+    for event in events:
+        stats.output_events += 1
+        yield event
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+
+"""Created on 17.10.26
+
+Batch diffing of many versions pairs in a pool of worker processes.
+
+.. moduleauthor:: Paweł Pecio
+"""
+import pickle
+import traceback
+import uuid
+import warnings
+from collections import deque
+from itertools import islice
+from multiprocessing import cpu_count
+
+try:
+    from concurrent.futures import ProcessPoolExecutor
+except ImportError:  # pragma: no cover, python 2 without futures backport
+    ProcessPoolExecutor = None
+
+
+class BatchItemError(Exception):
+    """
+    Diff of a single pair in the batch failed. Instance is returned in place of the result, so other
+    items of the batch are not affected.
+    """
+
+    def __init__(self, index, message, details=None):
+        """
+        :param index: Index of the pair in the batch
+        :param message: Original error representation
+        :param details: Original error traceback, if available
+        """
+        super(BatchItemError, self).__init__(index, message, details)
+        self.index = index
+        self.message = message
+        self.details = details
+
+    def __str__(self):
+        return "Diff of pair #%d failed: %s" % (self.index, self.message)
+
+
+# (key, Diff instance) unpickled in the worker process most recently
+_worker_differ = (None, None)
+
+
+def _pickle_differ(differ):
+    """
+    Pickle Diff instance once per batch, so unpicklable instance fails early with a clear error (instead of
+    failing every submitted chunk) and the same bytes are sent with every chunk.
+
+    :return: tuple (key, pickled differ)
+    """
+    try:
+        data = pickle.dumps(differ, pickle.HIGHEST_PROTOCOL)
+    except Exception as e:
+        raise TypeError(
+            "Diff instance cannot be sent to worker processes (%r), make its options picklable (e.g. module "
+            "level functions instead of lambdas) or use workers=0" % e
+        )
+
+    return uuid.uuid4().hex, data
+
+
+def _load_differ(key, data):
+    """
+    Unpickle Diff instance in the worker process. Instance is kept between chunks of the same batch, so its
+    state (like HTML parser or tokens cache) is reused.
+    """
+    global _worker_differ
+
+    if _worker_differ[0] != key:
+        _worker_differ = (key, pickle.loads(data))
+
+    return _worker_differ[1]
+
+
+def _diff_chunk(differ, chunk):
+    """
+    Diff pairs in the worker process. Worker state (like HTML parser) is kept between chunks,
+    see Diff.parse_html().
+
+    :param differ: Diff instance or tuple (key, pickled Diff instance), see _pickle_differ()
+    :param chunk: list of tuples (index, (version_a, version_b))
+    :rtype: list
+    """
+    if isinstance(differ, tuple):
+        differ = _load_differ(*differ)
+
+    result = []
+    for index, (version_a, version_b) in chunk:
+        try:
+            result.append(differ.get_html_diff(version_a, version_b))
+        except Exception as e:
+            result.append(BatchItemError(index, repr(e), traceback.format_exc()))
+
+    return result
+
+
+def _chunks(pairs, chunksize):
+    items = enumerate(pairs)
+    while True:
+        chunk = list(islice(items, chunksize))
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_diff_many(differ, pairs, workers=None, chunksize=1):
+    """
+    Diff given pairs in worker processes. Results are yielded in the same order as pairs were given.
+    Pairs are consumed lazily, only a few chunks per worker are processed in advance.
+
+    :param differ: Diff instance which is used (copied) in workers, it is pickled once per batch
+    :param pairs: iterable of tuples (version_a, version_b)
+    :param workers: Number of worker processes, by default number of CPUs. If 0, pairs are diffed in the
+     current process.
+    :param chunksize: Number of pairs sent to worker process at once
+    :return: generator of rendered HTML diffs, or BatchItemError instances for failed pairs
+    """
+    if workers is not None and workers < 0:
+        raise ValueError("Number of workers cannot be negative")
+
+    if chunksize < 1:
+        raise ValueError("Chunk size has to be positive")
+
+    if workers != 0 and ProcessPoolExecutor is None:
+        warnings.warn("concurrent.futures is not available, batch is diffed in the current process")
+        workers = 0
+
+    if workers == 0:
+        for chunk in _chunks(pairs, chunksize):
+            for result in _diff_chunk(differ, chunk):
+                yield result
+        return
+
+    workers = workers or cpu_count()
+    pending = deque()
+    pickled = _pickle_differ(differ)
+
+    def results(future, chunk):
+        try:
+            return future.result()
+        except Exception as e:
+            # whole chunk failed (e.g. worker process died), report error of every pair
+            return [BatchItemError(index, repr(e)) for index, pair in chunk]
+
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        for chunk in _chunks(pairs, chunksize):
+            pending.append((executor.submit(_diff_chunk, pickled, chunk), chunk))
+
+            if len(pending) >= 2 * workers:
+                for result in results(*pending.popleft()):
+                    yield result
+
+        while pending:
+            for result in results(*pending.popleft()):
+                yield result
+    finally:
+        for future, chunk in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
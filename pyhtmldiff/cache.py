@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+
+"""Created on 17.10.26
+
+.. moduleauthor:: Paweł Pecio
+"""
+import hashlib
+import sys
+import threading
+from collections import OrderedDict
+
+
+def estimate_size(tokens):
+    """
+    Approximate memory used by list of Genshi events (including text nodes contents, excluding shared
+    objects like tag names).
+
+    :param tokens: list of Genshi events or compact tokens (see differ.store.TokenStore)
+    :rtype: int
+    """
+    if hasattr(tokens, 'nbytes'):
+        return tokens.nbytes
+
+    size = sys.getsizeof(tokens)
+    for event in tokens:
+        size += sys.getsizeof(event)
+        data = event[1]
+        if isinstance(data, basestring):
+            size += sys.getsizeof(data)
+
+    return size
+
+
+class ParsedDocumentCache(object):
+    """
+    LRU cache of parsed and tokenized documents, keyed by document contents digest. Cache can be shared
+    between Diff instances and threads.
+    """
+
+    def __init__(self, max_entries=128, max_bytes=None, sizeof=estimate_size):
+        """
+        :param max_entries: Maximum number of cached documents, None means no limit
+        :param max_bytes: Maximum approximate size of cached documents in bytes, None means no limit
+        :param sizeof: Function estimating size of cached value
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def digest(html_string, namespace=''):
+        """
+        :param html_string: Document contents
+        :param namespace: Additional discriminator of the key (e.g. parser name)
+        :return: Cache key of given document
+        :rtype: str
+        """
+        if isinstance(html_string, unicode):
+            html_string = html_string.encode('utf-8')
+
+        return hashlib.sha1(namespace + '\0' + html_string).hexdigest()
+
+    def get(self, key):
+        """
+        :return: Cached value or None, if there is no such key in the cache
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            # move to the end, as most recently used
+            self._entries[key] = entry
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        size = self._sizeof(value)
+
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry[1]
+
+            if self.max_bytes is not None and size > self.max_bytes:
+                # value won't fit in the cache at all
+                return
+
+            self._entries[key] = (value, size)
+            self._bytes += size
+            self._evict()
+
+    def _evict(self):
+        while self._entries and (
+            (self.max_entries is not None and len(self._entries) > self.max_entries) or
+            (self.max_bytes is not None and self._bytes > self.max_bytes)
+        ):
+            key, (value, size) = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+
+    def get_or_create(self, html_string, factory, namespace=''):
+        """
+        Return cached document or create it with given factory and cache it.
+
+        :param html_string: Document contents
+        :param factory: Function creating cached value from given document contents
+        :param namespace: Additional discriminator of the key (e.g. parser name)
+        """
+        key = self.digest(html_string, namespace)
+        value = self.get(key)
+        if value is None:
+            value = factory(html_string)
+            self.put(key, value)
+
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    @property
+    def size(self):
+        """Approximate size of cached values in bytes"""
+        return self._bytes
+
+    def stats(self):
+        """
+        :return: Cache counters
+        :rtype: dict
+        """
+        return {
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+    def __getstate__(self):
+        # copies (e.g. sent to worker processes) start empty
+        return {
+            'max_entries': self.max_entries,
+            'max_bytes': self.max_bytes,
+            'sizeof': self._sizeof,
+        }
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
@@ -4,28 +4,246 @@
 
 .. moduleauthor:: Paweł Pecio
 """
+import time
+
 from differ import RootProcessor
+from differ.block import BlockDiffer, BlockSplitter
+from differ.cleanup import get_cleanup
+from differ.engine import BudgetExceeded, get_engine, is_budget_exceeded, trimmed_opcodes
 from differ.iterator import DiffIterator, SplittedTextNodesIterator
+from differ.moves import MoveDetector
+from differ.table import TableDiffer
+from differ.tokens import AttributesTokenTable, TokenTable
+from differ.tracing import logger
+from dtd.compiled import get_dtd
+from prepared import PreparedDocument
+from producer.standard import DefaultDiffProducer
+from stats import timed
 
 
 class StreamDiffer(object):
 
-    def __init__(self, old, new):
+    # degradation levels, from the finest one: words of changed blocks are matched, changed blocks are deleted
+    # and inserted as a whole, whole document is deleted and inserted
+    LEVELS = ('word', 'block', 'document')
+
+    def __init__(self, old, new, engine=None, hierarchical=False, stats=None, tracer=None, dtd=None,
+                 cleanup=None, deadline=None, max_tokens=None, diff_attributes=False,
+                 detect_moves=False, tables=False):
+        """
+        :param old: Old version Genshi events or already tokenized SplittedTextNodesIterator
+        :param new: New version Genshi events or already tokenized SplittedTextNodesIterator. Identical documents
+         can be passed as the same object, these are not matched at all.
+        :param engine: Diff engine, see differ.engine.get_engine()
+        :param hierarchical: Match blocks at first, then diff by words only changed blocks
+        :param stats: DiffStats collecting timings and counters, None if not collected
+        :param tracer: Processors trace events collector, see differ.tracing module
+        :param dtd: Compiled document definition, HTML5 by default
+        :param cleanup: Opcodes cleanup, see differ.cleanup.get_cleanup()
+        :param deadline: Time limit of matching in seconds. When it is exceeded, coarser level is tried (see
+         LEVELS) with the same time limit. Whole document level is never limited.
+        :param max_tokens: Maximal number of matched tokens (words or blocks), when exceeded, coarser level
+         is tried
+        :param diff_attributes: Match elements ignoring their diffed attributes (see
+         DefaultDiffProducer.diff_attrs), matched elements with changed attributes are marked by x-diff-*
+         attributes instead of being deleted and inserted
+        :param detect_moves: Render deleted and inserted blocks with the same contents as moved, True or
+         MoveDetector instance, see differ.moves module. Moves are not detected at the whole document level.
+        :param tables: Diff changed tables by rows and cells, see differ.table module. Implies hierarchical
+         matching, tables are blocks.
+        :type stats: DiffStats,None
+        :type tracer: Tracer,None
+        :type dtd: CompiledDTD,None
+        :type cleanup: OpcodesCleanup,basestring,None
+        :type detect_moves: bool,MoveDetector
+        """
         self._old = old
         self._new = new
+        self._engine = engine
+        self._hierarchical = hierarchical
+        self._stats = stats
+        self._tracer = tracer
+        self._dtd = get_dtd(dtd)
+        self._cleanup = get_cleanup(cleanup)
+        self._deadline = deadline
+        self._max_tokens = max_tokens
+        self._producer = DefaultDiffProducer if diff_attributes else None
+        self._moves = self._get_move_detector(detect_moves)
+        self._tables = tables
         self._result = None
 
+        # degradation level used, known after matching
+        self.level = None
+
+    def _get_move_detector(self, detect_moves):
+        if not detect_moves:
+            return None
+
+        if hasattr(detect_moves, 'detect'):
+            return detect_moves
+
+        return MoveDetector(self._dtd, self._engine, self._create_table)
+
+    @staticmethod
+    def _tokenize(events):
+        if isinstance(events, SplittedTextNodesIterator):
+            # already tokenized (e.g. cached document)
+            return events
+
+        return SplittedTextNodesIterator(events)
+
+    def _create_table(self):
+        if self._producer is not None:
+            return AttributesTokenTable(self._producer)
+
+        return TokenTable()
+
+    @staticmethod
+    def _materialize(events):
+        if isinstance(events, SplittedTextNodesIterator):
+            return events
+
+        return list(events)
+
+    def _set_level(self, level):
+        self.level = level
+        if self._stats is not None:
+            self._stats.level = level
+
+    def _match(self):
+        """
+        :return: tuple (old tokens, new tokens, opcodes)
+        """
+        if self._old is self._new:
+            # identical documents, nothing to match
+            self._set_level('word')
+            events = self._materialize(self._new)
+            return events, events, [('equal', 0, len(events), 0, len(events))] if len(events) else []
+
+        if self._deadline is None and self._max_tokens is None:
+            self._set_level('word')
+            return self._match_level('word', self._old, self._new)
+
+        # versions are matched again, if the budget is exceeded
+        old = self._materialize(self._old)
+        new = self._materialize(self._new)
+
+        for level in self.LEVELS[:-1]:
+            deadline = time.time() + self._deadline if self._deadline is not None else None
+            try:
+                result = self._match_level(level, old, new, deadline)
+            except Exception as e:
+                if not is_budget_exceeded(e):
+                    raise
+                logger.info("Diff budget exceeded at %s level: %s", level, e)
+            else:
+                self._set_level(level)
+                return result
+
+        self._set_level(self.LEVELS[-1])
+        return self._match_level(self.LEVELS[-1], old, new)
+
+    def _prepared_blocks(self, old, new):
+        """
+        :return: Blocks of both versions splitted when documents were prepared (see PreparedDocument), None if
+         documents are not prepared or their blocks are splitted or compared differently
+        """
+        if self._producer is not None or self._tables:
+            return None
+
+        scheme = PreparedDocument.scheme_of(self._dtd)
+        if getattr(old, 'scheme', None) != scheme or getattr(new, 'scheme', None) != scheme:
+            return None
+
+        return old.get_blocks(), new.get_blocks()
+
+    def _match_level(self, level, old, new, deadline=None):
+        """
+        :param level: Degradation level, see LEVELS
+        :param deadline: time.time() value or None
+        :return: tuple (old tokens, new tokens, opcodes)
+        :raises BudgetExceeded: deadline or tokens limit exceeded
+        """
+        stats = self._stats
+        max_tokens = self._max_tokens
+
+        if level == 'document':
+            old = self._materialize(old)
+            new = self._materialize(new)
+            if not old or not new:
+                return old, new, BlockDiffer.replace(old, new, 0, 0)
+
+            # fake root element is kept, everything inside it is deleted and inserted
+            return old, new, (
+                [('equal', 0, 1, 0, 1)] +
+                BlockDiffer.replace(old[1:-1], new[1:-1], 1, 1) +
+                [('equal', len(old) - 1, len(old), len(new) - 1, len(new))]
+            )
+
+        if level == 'block' or self._hierarchical or self._tables:
+            table_differ = TableDiffer(self._engine, self._create_table) if self._tables else None
+            differ = BlockDiffer(self._engine, BlockSplitter(self._dtd, self._tables), self._create_table,
+                                 table_differ)
+            return differ.diff(list(old), list(new), stats, words=level == 'word', deadline=deadline,
+                               max_tokens=max_tokens, blocks=self._prepared_blocks(old, new))
+
+        with timed(stats, 'tokenize'):
+            old = self._tokenize(old)
+            new = self._tokenize(new)
+
+        if max_tokens is not None and len(old) + len(new) > max_tokens:
+            raise BudgetExceeded("Too many tokens to diff: %d" % (len(old) + len(new)))
+
+        with timed(stats, 'match'):
+            table = self._create_table()
+            old_ids = table.intern(old)
+            new_ids = table.intern(new)
+            # unchanged leading and trailing parts of documents are not passed to the engine
+            opcodes = trimmed_opcodes(get_engine(self._engine), old_ids, new_ids, deadline)
+
+        return old, new, opcodes
+
+    def _get_diff_iterator(self):
+        old, new, opcodes = self._match()
+
+        stats = self._stats
+        if self._cleanup is not None:
+            with timed(stats, 'match'):
+                opcodes = self._cleanup.cleanup(old, new, opcodes)
+
+        if self._moves is not None and self.level != self.LEVELS[-1]:
+            with timed(stats, 'match'):
+                opcodes = self._moves.detect(old, new, opcodes)
+
+        for tokens in (old, new):
+            if hasattr(tokens, 'tag_names'):
+                # tag names of tokenized documents get their identifiers once, before processing; hierarchical
+                # mode yields plain event lists, their tags are compiled on first lookup instead
+                self._dtd.intern_tags(tokens.tag_names())
+
+        if stats is not None:
+            stats.old_tokens = len(old)
+            stats.new_tokens = len(new)
+            stats.count_opcodes(opcodes)
+
+        return DiffIterator(old=old, new=new, opcodes=opcodes, producer=self._producer)
+
     def _execute(self):
-        diff = DiffIterator(
-            old=SplittedTextNodesIterator(self._old),
-            new=SplittedTextNodesIterator(self._new)
-        )
+        diff = self._get_diff_iterator()
 
-        processor = RootProcessor(diff)
-        return processor.execute()
+        with timed(self._stats, 'process'):
+            processor = RootProcessor(diff, self._stats, self._tracer, self._dtd)
+            return processor.execute()
 
     def get_result(self):
         if self._result is None:
             self._result = self._execute()
 
         return self._result
+
+    def iter_result(self):
+        """
+        Lazily calculate diff. Result events are generated while processing, result is not cached.
+        """
+        processor = RootProcessor(self._get_diff_iterator(), self._stats, self._tracer, self._dtd)
+        return processor.iter_execute()
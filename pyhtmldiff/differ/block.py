@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+
+"""Created on 17.10.26
+
+.. moduleauthor:: Paweł Pecio
+"""
+from array import array
+
+from genshi.core import START, END
+
+from differ.engine import BudgetExceeded, get_engine
+from differ.iterator import SplittedTextNodesIterator
+from differ.tokens import TokenTable
+from dtd.compiled import get_dtd
+from dtd.const import DiffBehaviour
+from stats import timed
+
+
+class BlockSplitter(object):
+    """
+    Splits events stream into top-level blocks. Document root, elements which are diffed with step_inside
+    behaviour (lists, tables, table rows) and elements holding block elements (e.g. section or div with
+    paragraphs) are containers: their opening and closing tags are separate blocks and each child node
+    (element with all its contents or text node) is a block.
+    """
+
+    TABLE = 'table'
+
+    def __init__(self, dtd=None, tables=False):
+        """
+        :param dtd: Document definition, see dtd.compiled.get_dtd()
+        :param tables: Tables are not containers, every table is a block, see differ.table.TableDiffer
+        """
+        self._dtd = get_dtd(dtd)
+        self.tables = tables
+
+    def _containers(self, events):
+        """
+        :return: Indexes of START events of container elements
+        :rtype: set
+        """
+        dtd = self._dtd
+        containers = set()
+        # (index, tag) of open elements
+        stack = []
+
+        for idx, (event_type, data, pos) in enumerate(events):
+            if event_type == START:
+                tag = data[0]
+                if not stack or dtd.get_diff_type(tag) == DiffBehaviour.step_inside and not self.is_table(tag):
+                    # outermost element is document fragment root, always step inside it
+                    containers.add(idx)
+                elif dtd.is_block(tag) and dtd.can_contain_diff(stack[-1][1]):
+                    containers.add(stack[-1][0])
+                stack.append((idx, tag))
+            elif event_type == END and stack:
+                stack.pop()
+
+        return containers
+
+    def is_table(self, tag):
+        """
+        :return: True if element with given tag is a table block (only if tables are blocks)
+        """
+        return self.tables and tag is not None and tag.localname == self.TABLE
+
+    @staticmethod
+    def _subtree_end(events, start):
+        """
+        :return: Index just after END event closing element opened at start index
+        :rtype: int
+        """
+        depth = 0
+        for idx in xrange(start, len(events)):
+            event_type = events[idx][0]
+            if event_type == START:
+                depth += 1
+            elif event_type == END:
+                depth -= 1
+                if depth == 0:
+                    return idx + 1
+
+        return len(events)
+
+    def split(self, events):
+        """
+        :param events: list of Genshi events
+        :return: list of blocks boundaries (start, end)
+        :rtype: list
+        """
+        blocks = []
+        containers = self._containers(events)
+        idx = 0
+        count = len(events)
+
+        while idx < count:
+            if events[idx][0] == START and idx not in containers:
+                end = self._subtree_end(events, idx)
+                blocks.append((idx, end))
+                idx = end
+                continue
+
+            blocks.append((idx, idx + 1))
+            idx += 1
+
+        return blocks
+
+
+class BlockDiffer(object):
+    """
+    Two-level differ. At first, blocks of both versions are matched by their contents, then word-level
+    diff is calculated only for ranges of blocks which were changed. Unchanged blocks are passed as equal
+    runs without splitting text nodes into words.
+
+    If splitter keeps tables as blocks, tables of a changed range are paired in order and diffed by the
+    table differ, the rest of the range by words.
+    """
+
+    def __init__(self, engine=None, splitter=None, table_factory=TokenTable, table_differ=None):
+        """
+        :param engine: Diff engine, see differ.engine.get_engine()
+        :param splitter: Blocks splitter, BlockSplitter with HTML5 definition by default
+        :param table_factory: Callable creating token table, which defines equality of events
+        :param table_differ: Differ of changed tables, see differ.table.TableDiffer, used only if splitter
+         keeps tables as blocks
+        """
+        self._engine = get_engine(engine)
+        self._splitter = splitter or BlockSplitter()
+        self._table_factory = table_factory
+        self._table_differ = table_differ
+
+    @staticmethod
+    def _intern_blocks(events, blocks, table, key):
+        result = array('i')
+        for start, end in blocks:
+            block_key = tuple(key(events[idx]) for idx in range(start, end))
+            block_id = table.get(block_key)
+            if block_id is None:
+                block_id = table[block_key] = len(table)
+            result.append(block_id)
+
+        return result
+
+    @staticmethod
+    def _intern_keys(keys, table):
+        result = array('i')
+        for block_key in keys:
+            block_id = table.get(block_key)
+            if block_id is None:
+                block_id = table[block_key] = len(table)
+            result.append(block_id)
+
+        return result
+
+    def _get_opcodes(self, a, b, deadline):
+        if deadline is None:
+            return self._engine.get_opcodes(a, b)
+
+        return self._engine.get_opcodes(a, b, deadline)
+
+    def diff(self, old, new, stats=None, words=True, deadline=None, max_tokens=None, blocks=None):
+        """
+        Calculate diff of given versions.
+
+        :param old: list of old version Genshi events
+        :param new: list of new version Genshi events
+        :param stats: DiffStats, splitting changed blocks into words is measured as tokenize phase, the rest as
+         match phase
+        :param words: Diff changed blocks by words, otherwise changed blocks are deleted and inserted as a whole
+        :param deadline: time.time() value, see DiffEngine.get_opcodes()
+        :param max_tokens: Maximal number of matched items: blocks of both versions and words of changed blocks
+        :param blocks: Already splitted blocks of both versions, tuple of tuples (blocks boundaries, blocks keys),
+         see PreparedDocument.get_blocks(). Blocks with equal keys have to have equal events.
+        :return: tuple (old events, new events, opcodes). Opcodes refer to returned events lists, not the given
+         ones, because text nodes of changed blocks are splitted into words.
+        :rtype: tuple
+        :raises BudgetExceeded: deadline or tokens limit exceeded
+        """
+        with timed(stats, 'match'):
+            if blocks is not None:
+                (old_blocks, old_keys), (new_blocks, new_keys) = blocks
+            else:
+                old_blocks = self._splitter.split(old)
+                new_blocks = self._splitter.split(new)
+
+            tokens = len(old_blocks) + len(new_blocks)
+            if max_tokens is not None and tokens > max_tokens:
+                raise BudgetExceeded("Too many blocks to diff: %d" % tokens)
+
+            table = {}
+            if blocks is not None:
+                old_ids = self._intern_keys(old_keys, table)
+                new_ids = self._intern_keys(new_keys, table)
+            else:
+                key = self._table_factory().key
+                old_ids = self._intern_blocks(old, old_blocks, table, key)
+                new_ids = self._intern_blocks(new, new_blocks, table, key)
+            block_opcodes = self._get_opcodes(old_ids, new_ids, deadline)
+
+        old_result = []
+        new_result = []
+        opcodes = []
+
+        for tag, i1, i2, j1, j2 in block_opcodes:
+            old_part = old[old_blocks[i1][0]:old_blocks[i2 - 1][1]] if i1 < i2 else []
+            new_part = new[new_blocks[j1][0]:new_blocks[j2 - 1][1]] if j1 < j2 else []
+
+            if tag == 'equal':
+                opcodes.append(('equal', len(old_result), len(old_result) + len(old_part),
+                                len(new_result), len(new_result) + len(new_part)))
+            elif not words:
+                opcodes.extend(self.replace(old_part, new_part, len(old_result), len(new_result)))
+            else:
+                for old_part, new_part, table in self._segments(old, new, old_blocks[i1:i2], new_blocks[j1:j2]):
+                    if table:
+                        with timed(stats, 'match'):
+                            old_part, new_part, table_opcodes = self._table_differ.diff(old_part, new_part, deadline)
+                        opcodes.extend(
+                            (op, a1 + len(old_result), a2 + len(old_result), b1 + len(new_result),
+                             b2 + len(new_result))
+                            for op, a1, a2, b1, b2 in table_opcodes
+                        )
+                    else:
+                        with timed(stats, 'tokenize'):
+                            old_part = SplittedTextNodesIterator(old_part)[:]
+                            new_part = SplittedTextNodesIterator(new_part)[:]
+
+                    tokens += len(old_part) + len(new_part)
+                    if max_tokens is not None and tokens > max_tokens:
+                        raise BudgetExceeded("Too many tokens to diff: %d" % tokens)
+
+                    if not table:
+                        with timed(stats, 'match'):
+                            opcodes.extend(
+                                self._diff_words(old_part, new_part, len(old_result), len(new_result), deadline)
+                            )
+
+                    old_result.extend(old_part)
+                    new_result.extend(new_part)
+                continue
+
+            old_result.extend(old_part)
+            new_result.extend(new_part)
+
+        return old_result, new_result, opcodes
+
+    def _segments(self, old, new, old_blocks, new_blocks):
+        """
+        Split changed range into paired tables and ranges between them.
+
+        :return: generator of tuples (old events, new events, True if these are paired tables)
+        """
+        old_start = old_blocks[0][0] if old_blocks else 0
+        new_start = new_blocks[0][0] if new_blocks else 0
+        old_end = old_blocks[-1][1] if old_blocks else 0
+        new_end = new_blocks[-1][1] if new_blocks else 0
+
+        if self._table_differ is None or not getattr(self._splitter, 'tables', False):
+            yield old[old_start:old_end], new[new_start:new_end], False
+            return
+
+        old_tables = [block for block in old_blocks
+                      if old[block[0]][0] == START and self._splitter.is_table(old[block[0]][1][0])]
+        new_tables = [block for block in new_blocks
+                      if new[block[0]][0] == START and self._splitter.is_table(new[block[0]][1][0])]
+
+        for (old_table_start, old_table_end), (new_table_start, new_table_end) in zip(old_tables, new_tables):
+            if old_start < old_table_start or new_start < new_table_start:
+                yield old[old_start:old_table_start], new[new_start:new_table_start], False
+            yield old[old_table_start:old_table_end], new[new_table_start:new_table_end], True
+            old_start, new_start = old_table_end, new_table_end
+
+        if old_start < old_end or new_start < new_end:
+            yield old[old_start:old_end], new[new_start:new_end], False
+
+    @staticmethod
+    def replace(old, new, old_offset, new_offset):
+        """
+        :return: Opcodes deleting whole old part and inserting whole new part
+        """
+        opcodes = []
+        if old:
+            opcodes.append(('delete', old_offset, old_offset + len(old), new_offset, new_offset))
+        if new:
+            opcodes.append(('insert', old_offset + len(old), old_offset + len(old), new_offset, new_offset + len(new)))
+        return opcodes
+
+    def _diff_words(self, old, new, old_offset, new_offset, deadline=None):
+        if not old or not new:
+            return self.replace(old, new, old_offset, new_offset)
+
+        table = self._table_factory()
+        return [
+            (tag, i1 + old_offset, i2 + old_offset, j1 + new_offset, j2 + new_offset)
+            for tag, i1, i2, j1, j2 in self._get_opcodes(table.intern(old), table.intern(new), deadline)
+        ]
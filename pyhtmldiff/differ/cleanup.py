@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+
+"""Created on 17.10.26
+
+Opcodes post-processing, applied after matching and before processing. Word level opcodes of heavily
+rewritten text alternate small changes with tiny equal runs (single spaces, "the", "a"), every run is
+processed by its own processor and marked by its own diff tag. Cleanup merges such runs into larger changes.
+
+.. moduleauthor:: Paweł Pecio
+"""
+from genshi.core import TEXT
+
+
+class OpcodesCleanup(object):
+    """
+    Opcodes cleanup base class
+    """
+
+    name = None
+
+    def cleanup(self, old, new, opcodes):
+        """
+        :param old: Old version events, which opcodes were calculated for
+        :param new: New version events, which opcodes were calculated for
+        :param opcodes: list of tuples (tag, i1, i2, j1, j2), see DiffEngine.get_opcodes()
+        :return: Opcodes covering the same ranges
+        :rtype: list
+        """
+        raise NotImplementedError()
+
+
+class SemanticCleanup(OpcodesCleanup):
+    """
+    Semantic cleanup in the spirit of diff-match-patch. Equal run placed between two changes is merged into
+    them, if its text is not longer than changed text on both its sides (scaled by ratio). Merged change may
+    make previous equal run short enough, so it is checked again.
+
+    Only runs of text are merged, equal tags are always kept, so the result structure stays valid.
+    Changes are returned as delete of the whole old range followed by insert of the whole new range, so these
+    are marked by one pair of diff tags instead of interleaved deleted and inserted words.
+    """
+
+    name = 'semantic'
+
+    def __init__(self, ratio=1.0, max_length=None):
+        """
+        :param ratio: Equal run is merged, if its text length is not greater than ratio * length of
+         changed text (deleted or inserted, the longer one) on both its sides
+        :param max_length: Equal runs with longer text (in characters) are never merged, no limit by default
+        """
+        self.ratio = ratio
+        self.max_length = max_length
+
+    @staticmethod
+    def _range(events, start, stop):
+        if hasattr(events, 'iter_range'):
+            return events.iter_range(start, stop)
+
+        return events[start:stop]
+
+    @classmethod
+    def _text_length(cls, events, start, stop):
+        """
+        :return: Length of text in given range, None if there is any tag
+        """
+        length = 0
+        for event_type, data, pos in cls._range(events, start, stop):
+            if event_type != TEXT:
+                return None
+            length += len(data)
+
+        return length
+
+    @classmethod
+    def _change_length(cls, events, start, stop):
+        # tags are counted as one character
+        return sum(len(data) if event_type == TEXT else 1 for event_type, data, pos in cls._range(events, start, stop))
+
+    def _mergeable(self, before, equal, after):
+        length = equal[5]
+        if length is None or self.max_length is not None and length > self.max_length:
+            return False
+
+        return length <= self.ratio * max(before[5], before[6]) and length <= self.ratio * max(after[5], after[6])
+
+    def cleanup(self, old, new, opcodes):
+        # every item is (tag, i1, i2, j1, j2, a, b), where a and b are: for change lengths of deleted and
+        # inserted text, for equal run length of its text (None if there are tags) and unused b
+        items = []
+        for tag, i1, i2, j1, j2 in opcodes:
+            if tag == 'equal':
+                item = (tag, i1, i2, j1, j2, self._text_length(new, j1, j2), None)
+            else:
+                item = (tag, i1, i2, j1, j2, self._change_length(old, i1, i2), self._change_length(new, j1, j2))
+            items.append(item)
+
+            while len(items) >= 3 and items[-2][0] == 'equal' and items[-1][0] != 'equal' and \
+                    items[-3][0] != 'equal' and self._mergeable(*items[-3:]):
+                before, equal, after = items[-3:]
+                items[-3:] = [(
+                    'replace', before[1], after[2], before[3], after[4],
+                    before[5] + equal[5] + after[5], before[6] + equal[5] + after[6]
+                )]
+
+        result = []
+        for tag, i1, i2, j1, j2, a, b in items:
+            if tag == 'replace':
+                result.append(('delete', i1, i2, j1, j1))
+                result.append(('insert', i2, i2, j1, j2))
+            else:
+                result.append((tag, i1, i2, j1, j2))
+
+        return result
+
+
+CLEANUPS = {
+    SemanticCleanup.name: SemanticCleanup,
+}
+
+
+def get_cleanup(cleanup=None):
+    """
+    Resolve opcodes cleanup.
+
+    :param cleanup: Cleanup instance, cleanup name (see CLEANUPS) or None if opcodes should not be cleaned up
+    :type cleanup: OpcodesCleanup,basestring,None
+    :rtype: OpcodesCleanup,None
+    """
+    if cleanup is None or hasattr(cleanup, 'cleanup'):
+        return cleanup
+
+    try:
+        return CLEANUPS[cleanup]()
+    except KeyError:
+        raise ValueError("Unknown opcodes cleanup %r, available: %s" % (cleanup, ', '.join(sorted(CLEANUPS))))
@@ -0,0 +1,483 @@
+# -*- coding: utf-8 -*-
+
+"""Created on 17.10.26
+
+Sequence matching engines used by the diff iterator. Every engine takes two sequences of hashable
+items and returns opcodes in the same format as :py:meth:`difflib.SequenceMatcher.get_opcodes`, so
+engines can be exchanged without touching the rest of the differ.
+
+.. moduleauthor:: Paweł Pecio
+"""
+import time
+from difflib import SequenceMatcher
+
+
+class BudgetExceeded(Exception):
+    """
+    Diff exceeded its time or size limit
+    """
+
+
+def check_deadline(deadline):
+    """
+    :param deadline: time.time() value or None if there is no deadline
+    :raises BudgetExceeded: deadline exceeded
+    """
+    if deadline is not None and time.time() > deadline:
+        raise BudgetExceeded("Diff deadline exceeded")
+
+
+def is_budget_exceeded(error):
+    """
+    Engine module can be imported twice (as differ.engine and pyhtmldiff.differ.engine), engine instance
+    created by one copy raises BudgetExceeded of its own module, so exception class is recognized by name.
+
+    :return: True if given exception is BudgetExceeded (or its subclass)
+    """
+    return any(cls.__name__ == BudgetExceeded.__name__ for cls in type(error).__mro__)
+
+
+class DiffEngine(object):
+    """
+    Diff engine base class
+    """
+
+    name = None
+
+    def get_opcodes(self, a, b, deadline=None):
+        """
+        Calculate list of operations which transform sequence A into sequence B.
+
+        :param a: Old sequence, items have to be hashable
+        :param b: New sequence, items have to be hashable
+        :param deadline: time.time() value, engine checks it periodically and gives up when it is exceeded
+        :return: list of tuples (tag, i1, i2, j1, j2), where tag is one of: replace, delete, insert, equal
+        :rtype: list
+        :raises BudgetExceeded: deadline exceeded
+        """
+        raise NotImplementedError()
+
+
+class SequenceMatcherEngine(DiffEngine):
+    """
+    Engine based on :py:class:`difflib.SequenceMatcher`. Kept as the default one, because it produces
+    results which were used so far, but its complexity is close to quadratic on long sequences.
+    """
+
+    name = 'difflib'
+
+    def __init__(self, autojunk=True):
+        """
+        :param autojunk: Enable SequenceMatcher popular items heuristic (applied to sequences longer than
+         200 items). See difflib documentation for more details.
+        """
+        self.autojunk = autojunk
+
+    def get_opcodes(self, a, b, deadline=None):
+        if deadline is None:
+            return SequenceMatcher(None, a, b, autojunk=self.autojunk).get_opcodes()
+
+        return _DeadlineSequenceMatcher(deadline, None, a, b, autojunk=self.autojunk).get_opcodes()
+
+
+class _DeadlineSequenceMatcher(SequenceMatcher):
+
+    def __init__(self, deadline, *args, **kwargs):
+        self._deadline = deadline
+        SequenceMatcher.__init__(self, *args, **kwargs)
+
+    def find_longest_match(self, alo, ahi, blo, bhi):
+        # called for every range left between already matched blocks
+        check_deadline(self._deadline)
+        return SequenceMatcher.find_longest_match(self, alo, ahi, blo, bhi)
+
+
+class MatchingBlocksEngine(DiffEngine):
+    """
+    Base class for engines which calculate list of matching blocks. Matching blocks are turned into
+    opcodes in the same way as SequenceMatcher does it.
+    """
+
+    def get_opcodes(self, a, b, deadline=None):
+        return opcodes_from_blocks(self.get_matching_blocks(a, b, deadline), len(a), len(b))
+
+    def get_matching_blocks(self, a, b, deadline=None):
+        """
+        :param deadline: See DiffEngine.get_opcodes()
+        :return: list of triples (i, j, n), where a[i:i+n] == b[j:j+n], in any order
+        :rtype: list
+        """
+        raise NotImplementedError()
+
+
+class MyersEngine(MatchingBlocksEngine):
+    """
+    Myers O(ND) difference algorithm in linear space variant (divide and conquer on "middle snake").
+    Running time depends on number of differences (D), so near-identical sequences are diffed in
+    near-linear time.
+    """
+
+    name = 'myers'
+
+    def get_matching_blocks(self, a, b, deadline=None):
+        blocks = []
+        ranges = [(0, len(a), 0, len(b))]
+
+        while ranges:
+            alo, ahi, blo, bhi = ranges.pop()
+            alo, ahi, blo, bhi = trim_common(a, alo, ahi, b, blo, bhi, blocks)
+
+            if alo == ahi or blo == bhi:
+                # only insertion or removal left in this range
+                continue
+
+            split = self._bisect(a, alo, ahi, b, blo, bhi, deadline)
+            if split is None:
+                # nothing in common
+                continue
+
+            x, y = split
+            ranges.append((alo, x, blo, y))
+            ranges.append((x, ahi, y, bhi))
+
+        return blocks
+
+    def _bisect(self, a, alo, ahi, b, blo, bhi, deadline=None):
+        """
+        Find the "middle snake" of the shortest edit script, walking at the same time from the beginning
+        and from the end of both ranges.
+
+        :return: split point (i, j) lying on the optimal path or None if ranges have nothing in common
+        :rtype: tuple,None
+        """
+        n = ahi - alo
+        m = bhi - blo
+        max_d = (n + m + 1) // 2
+        v_offset = max_d
+        v_length = 2 * max_d + 2
+        v1 = [-1] * v_length
+        v2 = [-1] * v_length
+        v1[v_offset + 1] = 0
+        v2[v_offset + 1] = 0
+        delta = n - m
+        # if total number of items is odd, then the front path will collide with the reverse path
+        front = delta % 2 != 0
+
+        # offsets for start and end of k loop, prevents mapping of space beyond the grid
+        k1start = k1end = k2start = k2end = 0
+
+        for d in range(max_d):
+            check_deadline(deadline)
+
+            # walk the front path one step
+            for k1 in range(-d + k1start, d + 1 - k1end, 2):
+                k1_offset = v_offset + k1
+                if k1 == -d or (k1 != d and v1[k1_offset - 1] < v1[k1_offset + 1]):
+                    x1 = v1[k1_offset + 1]
+                else:
+                    x1 = v1[k1_offset - 1] + 1
+                y1 = x1 - k1
+                while x1 < n and y1 < m and a[alo + x1] == b[blo + y1]:
+                    x1 += 1
+                    y1 += 1
+                v1[k1_offset] = x1
+
+                if x1 > n:
+                    # ran off the right of the graph
+                    k1end += 2
+                elif y1 > m:
+                    # ran off the bottom of the graph
+                    k1start += 2
+                elif front:
+                    k2_offset = v_offset + delta - k1
+                    if 0 <= k2_offset < v_length and v2[k2_offset] != -1:
+                        # mirror x2 onto top-left coordinate system
+                        x2 = n - v2[k2_offset]
+                        if x1 >= x2:
+                            return alo + x1, blo + y1
+
+            # walk the reverse path one step
+            for k2 in range(-d + k2start, d + 1 - k2end, 2):
+                k2_offset = v_offset + k2
+                if k2 == -d or (k2 != d and v2[k2_offset - 1] < v2[k2_offset + 1]):
+                    x2 = v2[k2_offset + 1]
+                else:
+                    x2 = v2[k2_offset - 1] + 1
+                y2 = x2 - k2
+                while x2 < n and y2 < m and a[ahi - x2 - 1] == b[bhi - y2 - 1]:
+                    x2 += 1
+                    y2 += 1
+                v2[k2_offset] = x2
+
+                if x2 > n:
+                    k2end += 2
+                elif y2 > m:
+                    k2start += 2
+                elif not front:
+                    k1_offset = v_offset + delta - k2
+                    if 0 <= k1_offset < v_length and v1[k1_offset] != -1:
+                        x1 = v1[k1_offset]
+                        y1 = v_offset + x1 - k1_offset
+                        # mirror x2 onto top-left coordinate system
+                        x2 = n - x2
+                        if x1 >= x2:
+                            return alo + x1, blo + y1
+
+        return None
+
+
+class HistogramEngine(MatchingBlocksEngine):
+    """
+    Histogram diff (extended patience diff, as known from git). Ranges are split around the longest
+    common region anchored on the least frequent item, so unique items (words, tags with distinct
+    attributes) are aligned first. It usually gives more human readable results than Myers algorithm
+    and is fast for documents with low items repetition. Ranges where all common items are too popular
+    are passed to the Myers algorithm.
+    """
+
+    name = 'histogram'
+
+    def __init__(self, max_chain=64):
+        """
+        :param max_chain: Items occurring in old sequence more often than given limit are not used as anchors
+        """
+        self.max_chain = max_chain
+        self._fallback = MyersEngine()
+
+    def get_matching_blocks(self, a, b, deadline=None):
+        blocks = []
+        ranges = [(0, len(a), 0, len(b))]
+
+        while ranges:
+            check_deadline(deadline)
+            alo, ahi, blo, bhi = ranges.pop()
+            alo, ahi, blo, bhi = trim_common(a, alo, ahi, b, blo, bhi, blocks)
+
+            if alo == ahi or blo == bhi:
+                continue
+
+            region = self._find_region(a, alo, ahi, b, blo, bhi)
+            if region is None:
+                for i, j, size in self._fallback.get_matching_blocks(a[alo:ahi], b[blo:bhi], deadline):
+                    blocks.append((alo + i, blo + j, size))
+                continue
+
+            i, j, size = region
+            blocks.append(region)
+            ranges.append((alo, i, blo, j))
+            ranges.append((i + size, ahi, j + size, bhi))
+
+        return blocks
+
+    def _find_region(self, a, alo, ahi, b, blo, bhi):
+        """
+        Find longest common region anchored on the item with the lowest occurrences count in old sequence.
+
+        :return: matching block (i, j, size) or None if no suitable region was found
+        :rtype: tuple,None
+        """
+        histogram = {}
+        for i in range(alo, ahi):
+            histogram.setdefault(a[i], []).append(i)
+
+        best = None
+        best_count = self.max_chain
+
+        j = blo
+        while j < bhi:
+            positions = histogram.get(b[j])
+            next_j = j + 1
+
+            if positions is not None and len(positions) <= min(self.max_chain, best_count):
+                for i in positions:
+                    # extend region in both directions
+                    start_i, start_j = i, j
+                    while start_i > alo and start_j > blo and a[start_i - 1] == b[start_j - 1]:
+                        start_i -= 1
+                        start_j -= 1
+
+                    end_i, end_j = i + 1, j + 1
+                    while end_i < ahi and end_j < bhi and a[end_i] == b[end_j]:
+                        end_i += 1
+                        end_j += 1
+
+                    size = end_i - start_i
+                    count = len(positions)
+                    if best is None or count < best_count or (count == best_count and size > best[2]):
+                        best = (start_i, start_j, size)
+                        best_count = count
+
+                    next_j = max(next_j, end_j)
+
+            j = next_j
+
+        return best
+
+
+def trim_common(a, alo, ahi, b, blo, bhi, blocks):
+    """
+    Strip common prefix and suffix of given ranges. Stripped items are recorded as matching blocks.
+
+    :return: ranges left after trimming (alo, ahi, blo, bhi)
+    :rtype: tuple
+    """
+    prefix = 0
+    while alo + prefix < ahi and blo + prefix < bhi and a[alo + prefix] == b[blo + prefix]:
+        prefix += 1
+
+    if prefix:
+        blocks.append((alo, blo, prefix))
+        alo += prefix
+        blo += prefix
+
+    suffix = 0
+    while alo < ahi - suffix and blo < bhi - suffix and a[ahi - suffix - 1] == b[bhi - suffix - 1]:
+        suffix += 1
+
+    if suffix:
+        blocks.append((ahi - suffix, bhi - suffix, suffix))
+        ahi -= suffix
+        bhi -= suffix
+
+    return alo, ahi, blo, bhi
+
+
+def _common_prefix(a, b):
+    # binary search, ranges are compared at once instead of item by item
+    lo = 0
+    hi = min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[lo:mid] == b[lo:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+
+    return lo
+
+
+def _common_suffix(a, b, limit):
+    len_a = len(a)
+    len_b = len(b)
+    lo = 0
+    hi = limit
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[len_a - mid:len_a - lo] == b[len_b - mid:len_b - lo]:
+            lo = mid
+        else:
+            hi = mid - 1
+
+    return lo
+
+
+def trimmed_opcodes(engine, a, b, deadline=None):
+    """
+    Calculate opcodes of given sequences. Common prefix and suffix are matched before the engine is invoked,
+    so the engine compares only the rest. Identical sequences are not passed to the engine at all.
+
+    :param engine: Diff engine
+    :param a: Old sequence, slicing and comparison of slices is required (e.g. array)
+    :param b: New sequence, the same type as a
+    :param deadline: See DiffEngine.get_opcodes(), passed to the engine only if given, so engines without
+     deadline support can be used without it
+    :type engine: DiffEngine
+    :rtype: list
+    """
+    len_a = len(a)
+    len_b = len(b)
+
+    prefix = _common_prefix(a, b)
+    if prefix == len_a == len_b:
+        return [('equal', 0, len_a, 0, len_b)] if len_a else []
+
+    suffix = _common_suffix(a, b, min(len_a, len_b) - prefix)
+
+    opcodes = []
+    if prefix:
+        opcodes.append(('equal', 0, prefix, 0, prefix))
+
+    middle_a = a[prefix:len_a - suffix]
+    middle_b = b[prefix:len_b - suffix]
+    if deadline is None:
+        middle = engine.get_opcodes(middle_a, middle_b)
+    else:
+        middle = engine.get_opcodes(middle_a, middle_b, deadline)
+
+    for tag, i1, i2, j1, j2 in middle:
+        opcodes.append((tag, prefix + i1, prefix + i2, prefix + j1, prefix + j2))
+
+    if suffix:
+        opcodes.append(('equal', len_a - suffix, len_a, len_b - suffix, len_b))
+
+    return opcodes
+
+
+def opcodes_from_blocks(blocks, len_a, len_b):
+    """
+    Turn matching blocks into opcodes, the same way as :py:meth:`difflib.SequenceMatcher.get_opcodes` does.
+
+    :param blocks: list of (i, j, size) triples in any order, blocks must not overlap
+    :param len_a: Length of old sequence
+    :param len_b: Length of new sequence
+    :rtype: list
+    """
+    merged = []
+    for i, j, size in sorted(blocks):
+        if not size:
+            continue
+
+        if merged and merged[-1][0] + merged[-1][2] == i and merged[-1][1] + merged[-1][2] == j:
+            # adjacent blocks, join them
+            merged[-1] = (merged[-1][0], merged[-1][1], merged[-1][2] + size)
+        else:
+            merged.append((i, j, size))
+
+    merged.append((len_a, len_b, 0))
+
+    i = j = 0
+    answer = []
+    for ai, bj, size in merged:
+        tag = ''
+        if i < ai and j < bj:
+            tag = 'replace'
+        elif i < ai:
+            tag = 'delete'
+        elif j < bj:
+            tag = 'insert'
+
+        if tag:
+            answer.append((tag, i, ai, j, bj))
+
+        i, j = ai + size, bj + size
+        if size:
+            answer.append(('equal', ai, i, bj, j))
+
+    return answer
+
+
+ENGINES = {
+    SequenceMatcherEngine.name: SequenceMatcherEngine,
+    MyersEngine.name: MyersEngine,
+    HistogramEngine.name: HistogramEngine,
+}
+
+
+def get_engine(engine=None):
+    """
+    Resolve diff engine.
+
+    :param engine: Engine instance, engine name (see ENGINES) or None for default engine
+    :type engine: DiffEngine,basestring,None
+    :rtype: DiffEngine
+    """
+    if engine is None:
+        return SequenceMatcherEngine()
+
+    if hasattr(engine, 'get_opcodes'):
+        return engine
+
+    try:
+        return ENGINES[engine]()
+    except KeyError:
+        raise ValueError("Unknown diff engine %r, available engines: %s" % (engine, ', '.join(sorted(ENGINES))))
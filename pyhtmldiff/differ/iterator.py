@@ -5,37 +5,62 @@
 .. moduleauthor:: Paweł Pecio
 """
 import re
-from difflib import SequenceMatcher
-from itertools import chain, islice
+from itertools import chain, izip
 
-from genshi.core import TEXT
+from genshi.core import START, TEXT, Attrs, QName
 
+from differ.engine import get_engine
+from differ.store import TokenStore
+from differ.tokens import TokenTable
+from dtd.const import DOMNode
+from producer.standard import DefaultDiffProducer
 from utils import longzip, irepeat
 
 
 class SplittedTextNodesIterator(object):
+    """
+    Genshi events with text nodes splitted into words. Events are kept in compact TokenStore, events positions
+    are dropped unless requested.
+    """
 
     _diff_split_re = re.compile(r'(\s+)(?u)')
 
-    def __init__(self, genshi_events):
-        self._prepare_events(genshi_events)
-
-    def _prepare_events(self, genshi_events):
-        result = []
+    def __init__(self, genshi_events, positions=False):
+        self._prepare_events(genshi_events, positions)
+
+    @classmethod
+    def from_tokens(cls, tokens):
+        """
+        Create iterator from events which text nodes are already splitted into words
+        (e.g. by tokenizing parser backend).
+
+        :param tokens: TokenStore or list of Genshi events
+        :rtype: SplittedTextNodesIterator
+        """
+        instance = cls.__new__(cls)
+        # TokenStore might come from the other module object (pyhtmldiff.differ.store), when pyhtmldiff
+        # directory is on the path
+        instance._data = TokenStore(tokens) if isinstance(tokens, list) else tokens
+        return instance
+
+    def _prepare_events(self, genshi_events, positions):
+        self._data = TokenStore(self._split_events(genshi_events), positions)
+
+    @classmethod
+    def _split_events(cls, genshi_events):
         for event_type, data, pos in genshi_events:
             if event_type == TEXT:
-                for word in self._text_split(data):
+                for word in cls._text_split(data):
                     if word:
                         # only if there is a content
-                        result.append((event_type, word, pos))
+                        yield event_type, word, pos
                 continue
 
-            result.append((event_type, data, pos))
-
-        self._data = result
+            yield event_type, data, pos
 
-    def _text_split(self, text):
-        worditer = chain([u''], self._diff_split_re.split(text))
+    @classmethod
+    def _text_split(cls, text):
+        worditer = chain([u''], cls._diff_split_re.split(text))
         return [x + next(worditer) for x in worditer]
 
     def __iter__(self):
@@ -47,6 +72,19 @@ class SplittedTextNodesIterator(object):
     def __getitem__(self, item):
         return self._data[item]
 
+    def iter_range(self, start, stop):
+        return self._data.iter_range(start, stop)
+
+    def intern_into(self, table):
+        return self._data.intern_into(table)
+
+    def tag_names(self):
+        return self._data.tag_names()
+
+    @property
+    def nbytes(self):
+        return self._data.nbytes
+
 
 class ReplaceIterator(object):
 
@@ -83,30 +121,109 @@ class ReplaceIterator(object):
 
 class DiffIterator(object):
 
-    def __init__(self, old, new):
+    def __init__(self, old, new, engine=None, opcodes=None, producer=None):
+        """
+        :param old: Old version events
+        :param new: New version events
+        :param engine: Diff engine used to match events, see differ.engine.get_engine()
+        :param opcodes: Already calculated opcodes of given events, engine is not used if given
+        :param producer: Diff producer class, if given, elements matched as equal (see AttributesTokenTable)
+         but with different attributes are rendered by its same_opening_node(). Moved blocks (see
+         differ.moves) are marked by its render_move_from() and render_move_to(), DefaultDiffProducer is used
+         if not given.
+        :type engine: DiffEngine,basestring,None
+        :type opcodes: list,None
+        :type producer: type,None
+        """
         self._old = old
         self._new = new
-        matcher = SequenceMatcher(None, self._old, self._new)
-        self._parts = iter(matcher.get_opcodes())
+        self._producer = producer
+
+        if opcodes is None:
+            # engine compares interned events identifiers, original events are recovered by index
+            table = TokenTable()
+            old_ids = table.intern(self._old)
+            new_ids = table.intern(self._new)
+            opcodes = get_engine(engine).get_opcodes(old_ids, new_ids)
+
+        self._parts = iter(opcodes)
 
         self._iterator = None
+        # old block START index -> move identifier
+        self._move_ids = {}
+
+    @staticmethod
+    def _range(events, start, stop):
+        if hasattr(events, 'iter_range'):
+            # events are created lazily, while the range is consumed
+            return events.iter_range(start, stop)
+
+        return events[start:stop]
 
     def _fill(self):
 
         operation, i1, i2, j1, j2 = next(self._parts)
         if operation == 'replace':
-            iterator = ReplaceIterator(islice(self._old, i1, i2), islice(self._new, j1, j2))
+            iterator = ReplaceIterator(self._range(self._old, i1, i2), self._range(self._new, j1, j2))
         elif operation == 'delete':
-            iterator = irepeat('delete', islice(self._old, i1, i2))
+            iterator = irepeat('delete', self._range(self._old, i1, i2))
         elif operation == 'insert':
-            iterator = irepeat('insert', islice(self._new, j1, j2))
+            iterator = irepeat('insert', self._range(self._new, j1, j2))
+        elif operation == 'move_from':
+            iterator = irepeat('equal', self._moved_from(i1, i2))
+        elif operation == 'move_to':
+            iterator = irepeat('equal', self._moved_to(i1, j1))
+        elif self._producer is not None:
+            iterator = irepeat('equal', self._aligned(i1, i2, j1, j2))
         else:  # equal
-            # both streams slices are the same,
-            # it make no difference which stream is taken
-            iterator = irepeat('equal', islice(self._old, i1, i2))
+            # both streams slices are the same except events position,
+            # take events from the new version
+            iterator = irepeat('equal', self._range(self._new, j1, j2))
 
         self._iterator = iterator
 
+    def _aligned(self, i1, i2, j1, j2):
+        """
+        Equal events of the new version, elements which attributes were changed are marked by the producer.
+        """
+        for old_event, new_event in izip(self._range(self._old, i1, i2), self._range(self._new, j1, j2)):
+            if new_event[0] == START and old_event[1] != new_event[1]:
+                new_event = self._changed_attrs(old_event, new_event)
+            yield new_event
+
+    def _changed_attrs(self, old_event, new_event):
+        tag, old_attrs = old_event[1]
+        new_attrs = new_event[1][1]
+        node = self._producer.same_opening_node(DOMNode(tag, old_attrs), DOMNode(tag, new_attrs))
+        attrs = Attrs((QName(name), value) for name, value in node.attrs)
+        return START, (tag, attrs), new_event[2]
+
+    def _move_id(self, start):
+        try:
+            return self._move_ids[start]
+        except KeyError:
+            move_id = self._move_ids[start] = len(self._move_ids) + 1
+            return move_id
+
+    def _moved_from(self, start, stop):
+        """
+        Empty old block marked as the old position of the moved block.
+        """
+        event_type, (tag, attrs), pos = self._old[start]
+        producer = self._producer or DefaultDiffProducer
+        node = producer.render_move_from(DOMNode(tag, attrs), self._move_id(start))
+        yield START, (tag, Attrs((QName(name), value) for name, value in node.attrs)), pos
+        yield self._old[stop - 1]
+
+    def _moved_to(self, old_start, start):
+        """
+        Opening tag of the moved block at its new position.
+        """
+        event_type, (tag, attrs), pos = self._new[start]
+        producer = self._producer or DefaultDiffProducer
+        node = producer.render_move_to(DOMNode(tag, attrs), self._move_id(old_start))
+        yield START, (tag, Attrs((QName(name), value) for name, value in node.attrs)), pos
+
     def __iter__(self):
         return self
 
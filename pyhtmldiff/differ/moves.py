@@ -0,0 +1,343 @@
+# -*- coding: utf-8 -*-
+
+"""Created on 17.10.26
+
+Move detection, applied on opcodes after matching (and cleanup). Section moved by an editor is matched as
+a delete of the old position and an insert of the new one, so its contents are rendered twice. Deleted and
+inserted block subtrees (paragraphs, list items, table rows, see Html5Definition.BLOCK_ELEMENTS) are paired
+instead, identical ones by their tokens, near-identical ones by sketches of their shingles, and rendered as
+moved blocks: empty placeholder at the old position and the block (diffed against its old version if it is
+not identical) at the new one, see DiffIterator.
+
+Blocks are indexed by hashes, they are never compared pairwise, so detection is near-linear in the number
+of changed tokens.
+
+.. moduleauthor:: Paweł Pecio
+"""
+import heapq
+from bisect import bisect_left
+from collections import defaultdict, deque
+
+from genshi.core import START, END
+
+from differ.engine import get_engine
+from differ.tokens import TokenTable
+from dtd.compiled import get_dtd
+
+
+# rolling hash of shingles, polynomial modulo Mersenne prime
+_BASE = 1000003
+_MODULUS = (1 << 61) - 1
+# shingles hashes are scrambled, so the smallest ones are a random sample
+_SCRAMBLE = 0x9E3779B97F4A7C15
+_MASK = (1 << 64) - 1
+
+
+class MoveDetector(object):
+    """
+    Pairs deleted and inserted blocks. Opcodes of paired blocks are rewritten to 'move_from' (i1, i2 cover
+    the old block, which is removed from its old position) and 'move_to' (i1, i2 cover the old START event,
+    j1, j2 the new one) followed by opcodes of the block contents.
+    """
+
+    def __init__(self, dtd=None, engine=None, table_factory=TokenTable, min_length=8, similarity=0.6,
+                 shingle=3, sketch_size=16, max_candidates=32):
+        """
+        :param dtd: Document definition defining blocks, see dtd.compiled.get_dtd()
+        :param engine: Diff engine used to diff contents of near-identical blocks, see differ.engine.get_engine()
+        :param table_factory: Callable creating token table, which defines equality of events
+        :param min_length: Shorter blocks (in tokens) are never moved, deleting and inserting is cheaper
+        :param similarity: Minimal estimated Jaccard similarity of shingles of near-identical blocks, blocks are
+         paired only if they are identical if it is greater than 1
+        :param shingle: Number of tokens in a shingle
+        :param sketch_size: Number of the smallest shingles hashes kept for every block
+        :param max_candidates: Maximal number of blocks compared with a block, for every sketch hash
+        """
+        self._dtd = get_dtd(dtd)
+        self._engine = engine
+        self._table_factory = table_factory
+        self.min_length = min_length
+        self.similarity = similarity
+        self.shingle = shingle
+        self.sketch_size = sketch_size
+        self.max_candidates = max_candidates
+
+    @staticmethod
+    def _range(events, start, stop):
+        if hasattr(events, 'iter_range'):
+            return events.iter_range(start, stop)
+
+        return events[start:stop]
+
+    def detect(self, old, new, opcodes):
+        """
+        :param old: Old version events, which opcodes were calculated for
+        :param new: New version events, which opcodes were calculated for
+        :param opcodes: list of tuples (tag, i1, i2, j1, j2), see DiffEngine.get_opcodes()
+        :return: Opcodes with moved blocks, given opcodes if no block was moved
+        :rtype: list
+        """
+        if not any(tag != 'equal' for tag, i1, i2, j1, j2 in opcodes):
+            return opcodes
+
+        table = self._table_factory()
+        old_ids = table.intern(old)
+        new_ids = table.intern(new)
+
+        slided = self._slide(old, new, old_ids, new_ids, opcodes)
+
+        old_blocks = []
+        new_blocks = []
+        for tag, i1, i2, j1, j2 in slided:
+            if tag in ('delete', 'replace'):
+                old_blocks.extend(self._blocks(old, i1, i2))
+            if tag in ('insert', 'replace'):
+                new_blocks.extend(self._blocks(new, j1, j2))
+
+        if not old_blocks or not new_blocks:
+            return opcodes
+
+        # new block start -> (old block, new block, identical)
+        moves = self._pair(old, new, old_ids, new_ids, old_blocks, new_blocks)
+        if not moves:
+            return opcodes
+
+        return self._rewrite(old_ids, new_ids, slided, moves)
+
+    # -------------------- PRIVATE METHODS ---------------------------
+
+    @staticmethod
+    def _is_start(events, idx):
+        return events[idx][0] == START
+
+    def _slide(self, old, new, old_ids, new_ids, opcodes):
+        """
+        Slide deletes and inserts placed between equal runs, so these start by an element opening, if possible.
+        Engines choose any of equivalent ranges, e.g. "text</p><p>" instead of "<p>text</p>", which would hide
+        the deleted paragraph. Sliding right, the first opening tag is the outermost one.
+        """
+        result = [list(opcode) for opcode in opcodes]
+
+        for idx in range(1, len(result) - 1):
+            before, opcode, after = result[idx - 1:idx + 2]
+            if before[0] != 'equal' or after[0] != 'equal':
+                continue
+
+            if opcode[0] == 'delete':
+                events, ids, start, stop = old, old_ids, opcode[1], opcode[2]
+            elif opcode[0] == 'insert':
+                events, ids, start, stop = new, new_ids, opcode[3], opcode[4]
+            else:
+                continue
+
+            if self._is_start(events, start):
+                continue
+
+            # sliding left, outermost of opening tags is taken (e.g. <tr> of "<tr><td>")
+            shift = 0
+            limit = min(before[2] - before[1], stop - start)
+            for offset in range(1, limit + 1):
+                if ids[start - offset] != ids[stop - offset]:
+                    break
+                if self._is_start(events, start - offset):
+                    shift = -offset
+                elif shift:
+                    break
+
+            if not shift:
+                limit = min(after[2] - after[1], stop - start)
+                for offset in range(limit):
+                    if ids[start + offset] != ids[stop + offset]:
+                        break
+                    if self._is_start(events, start + offset + 1):
+                        shift = offset + 1
+                        break
+
+            if shift:
+                before[2] += shift
+                before[4] += shift
+                opcode[1:] = [position + shift for position in opcode[1:]]
+                after[1] += shift
+                after[3] += shift
+
+        return [tuple(opcode) for opcode in result if opcode[1] != opcode[2] or opcode[3] != opcode[4]]
+
+    def _blocks(self, events, start, stop):
+        """
+        :return: Outermost block subtrees (start, end) inside given range, which are not too short
+        """
+        dtd = self._dtd
+        closed = []
+        # indexes of START events of open elements
+        stack = []
+
+        for idx, event in enumerate(self._range(events, start, stop), start):
+            if event[0] == START:
+                stack.append(idx)
+            elif event[0] == END and stack:
+                opened = stack.pop()
+                if idx + 1 - opened >= self.min_length and dtd.is_block(event[1]):
+                    closed.append((opened, idx + 1))
+
+        blocks = []
+        for block in sorted(closed):
+            if not blocks or block[0] >= blocks[-1][1]:
+                blocks.append(block)
+
+        return blocks
+
+    def _sketch(self, ids, start, stop):
+        """
+        :return: Sorted tuple of the smallest hashes of shingles of the block contents
+        """
+        # opening and closing tags are not part of the contents
+        start += 1
+        stop -= 1
+        width = min(self.shingle, stop - start)
+        if width <= 0:
+            return ()
+
+        top = pow(_BASE, width - 1, _MODULUS)
+        value = 0
+        for idx in range(start, start + width):
+            value = (value * _BASE + ids[idx] + 1) % _MODULUS
+
+        hashes = {(value * _SCRAMBLE) & _MASK}
+        for idx in range(start + width, stop):
+            value = ((value - (ids[idx - width] + 1) * top) * _BASE + ids[idx] + 1) % _MODULUS
+            hashes.add((value * _SCRAMBLE) & _MASK)
+
+        return tuple(heapq.nsmallest(self.sketch_size, hashes))
+
+    def _estimate(self, sketch_a, sketch_b):
+        """
+        :return: Jaccard similarity of shingles estimated from bottom-k sketches
+        """
+        union = heapq.nsmallest(self.sketch_size, set(sketch_a) | set(sketch_b))
+        if not union:
+            return 1.0
+
+        common = set(sketch_a) & set(sketch_b)
+        return float(sum(1 for value in union if value in common)) / len(union)
+
+    def _pair(self, old, new, old_ids, new_ids, old_blocks, new_blocks):
+        moves = {}
+
+        # identical blocks, by their tokens
+        exact = defaultdict(deque)
+        for start, end in old_blocks:
+            exact[tuple(old_ids[start:end])].append((start, end))
+
+        unpaired = []
+        for start, end in new_blocks:
+            candidates = exact.get(tuple(new_ids[start:end]))
+            if candidates:
+                moves[start] = (candidates.popleft(), (start, end), True)
+            else:
+                unpaired.append((start, end))
+
+        if not unpaired or self.similarity > 1:
+            return moves
+
+        # near-identical blocks of the same element, by sketches of their shingles
+        sketches = {}
+        index = defaultdict(list)
+        for candidates in exact.values():
+            for block in candidates:
+                sketch = sketches[block] = self._sketch(old_ids, *block)
+                tag = old[block[0]][1][0]
+                for value in sketch:
+                    index[tag, value].append(block)
+
+        used = set()
+        for start, end in unpaired:
+            sketch = self._sketch(new_ids, start, end)
+            tag = new[start][1][0]
+
+            shared = defaultdict(int)
+            for value in sketch:
+                for block in index.get((tag, value), ())[:self.max_candidates]:
+                    if block not in used:
+                        shared[block] += 1
+
+            best = None
+            best_similarity = self.similarity
+            for block, count in shared.items():
+                length = float(min(end - start, block[1] - block[0])) / max(end - start, block[1] - block[0])
+                if length < self.similarity or count < self.similarity * len(sketch):
+                    continue
+
+                similarity = self._estimate(sketches[block], sketch)
+                if similarity > best_similarity or similarity == best_similarity and best is None:
+                    best, best_similarity = block, similarity
+
+            if best is not None:
+                used.add(best)
+                moves[start] = (best, (start, end), False)
+
+        return moves
+
+    def _rewrite(self, old_ids, new_ids, opcodes, moves):
+        moved_from = sorted(old_block for old_block, new_block, identical in moves.values())
+        moved_from_starts = [start for start, end in moved_from]
+        moved_to = sorted(moves)
+        result = []
+
+        for tag, i1, i2, j1, j2 in opcodes:
+            if tag == 'equal':
+                result.append((tag, i1, i2, j1, j2))
+                continue
+
+            old_moved = moved_from[bisect_left(moved_from_starts, i1):bisect_left(moved_from_starts, i2)]
+            new_moved = moved_to[bisect_left(moved_to, j1):bisect_left(moved_to, j2)]
+            if not old_moved and not new_moved:
+                result.append((tag, i1, i2, j1, j2))
+                continue
+
+            # replace is splitted into deletes followed by inserts
+            position = i1
+            for start, end in old_moved:
+                if position < start:
+                    result.append(('delete', position, start, j1, j1))
+                result.append(('move_from', start, end, j1, j1))
+                position = end
+            if position < i2:
+                result.append(('delete', position, i2, j1, j1))
+
+            position = j1
+            for start in new_moved:
+                old_block, new_block, identical = moves[start]
+                if position < start:
+                    result.append(('insert', i2, i2, position, start))
+                result.extend(self._move_to(old_ids, new_ids, old_block, new_block, identical))
+                position = new_block[1]
+            if position < j2:
+                result.append(('insert', i2, i2, position, j2))
+
+        return result
+
+    def _move_to(self, old_ids, new_ids, old_block, new_block, identical):
+        """
+        :return: Opcodes of the block at its new position
+        """
+        (i1, i2), (j1, j2) = old_block, new_block
+        opcodes = [('move_to', i1, i1 + 1, j1, j1 + 1)]
+        if identical:
+            opcodes.append(('equal', i1 + 1, i2, j1 + 1, j2))
+            return opcodes
+
+        a = old_ids[i1 + 1:i2 - 1]
+        b = new_ids[j1 + 1:j2 - 1]
+        if not a or not b:
+            if a:
+                opcodes.append(('delete', i1 + 1, i2 - 1, j1 + 1, j1 + 1))
+            if b:
+                opcodes.append(('insert', i2 - 1, i2 - 1, j1 + 1, j2 - 1))
+        else:
+            opcodes.extend(
+                (tag, a1 + i1 + 1, a2 + i1 + 1, b1 + j1 + 1, b2 + j1 + 1)
+                for tag, a1, a2, b1, b2 in get_engine(self._engine).get_opcodes(a, b)
+            )
+
+        opcodes.append(('equal', i2 - 1, i2, j2 - 1, j2))
+        return opcodes
@@ -4,17 +4,19 @@
 
 .. moduleauthor:: Paweł Pecio
 """
-import warnings, logging
+import warnings
 
 from genshi.core import START, END, TEXT, Attrs, QName
 
 from differ.iterator import OneBackIterator
+from differ.tracing import Tracer
+from dtd.compiled import get_dtd
 from dtd.const import DiffBehaviour, DOMNode
-from dtd.html5 import Html5Definition
 from producer.standard import DefaultDiffProducer
 
 
-logger = logging.getLogger('pyHtmlDiff')
+# yielded by processors with enabled checkpoints, when collected events can be drained
+CHECKPOINT = (None, None, None)
 
 
 class BaseProcessor(object):
@@ -22,20 +24,35 @@ class BaseProcessor(object):
     Diff events processor base class
     """
 
-    def __init__(self, events_iter, parent):
+    def __init__(self, events_iter, parent, tracer=None, dtd=None):
         """
         :param events_iter: Diff events iterator
         :param parent: Parent tag in which result of this processor will be appended
+        :param tracer: Trace events collector, None if tracing is disabled
+        :param dtd: Compiled document definition, HTML5 by default
         :type events_iter: DiffIterator
         :type parent: QName, None
+        :type tracer: Tracer, None
+        :type dtd: CompiledDTD, None
 
         """
         self._iter = events_iter
+        self._tracer = tracer
+        self._dtd = dtd or get_dtd()
+        self.reset(parent)
+
+    def reset(self, parent):
+        """
+        Prepare processor to process a new context, so processor instance can be reused.
+
+        :param parent: Parent tag in which result of this processor will be appended
+        :type parent: QName, None
+        """
         self._parent = parent
         self._result = []
         self._stack = []
         self._exhausted = True
-        logger.debug("Diff context processor %r instantiated within parent %r" % (self.__class__, parent))
+        self._checkpoint = None
 
     def __iter__(self):
         """
@@ -43,6 +60,9 @@ class BaseProcessor(object):
         and should be processed by the parent processor. When context of this processor ends
         iteration is stopped
 
+        If checkpoints are enabled (see set_checkpoint()), CHECKPOINT is yielded every time when enough
+        processed events are collected, so these can be drained.
+
         :raises StopIteration: Processing has been finished by this processor. Diff events iterator
         points just before event which does not belong to this processor work scope
         """
@@ -55,6 +75,8 @@ class BaseProcessor(object):
             result = self._process_event(operation, event)
             if result is False:
                 yield operation, event, self.get_current_element()
+            elif self._checkpoint is not None and len(self._result) >= self._checkpoint:
+                yield CHECKPOINT
 
         self._exhausted = True
         raise StopIteration
@@ -97,7 +119,7 @@ class BaseProcessor(object):
             tag, attrs = data
 
             # check how these tag should be diffed
-            diff_type = Html5Definition.get_diff_type(tag)
+            diff_type = self._dtd.get_diff_type(tag)
             if diff_type == DiffBehaviour.skip:
                 # diffing of this tag and its contents should be skipped
                 # passthrough whole tag to the output
@@ -121,16 +143,18 @@ class BaseProcessor(object):
     def _collect_block(self, start_event, op_to_collect):
 
         event_type, data, pos = start_event
-        result = []
+        result = [start_event]
 
         # track how many times the same tag is open inside pass-thorough block
         counter = 1
 
         for operation, event in self._iter:
 
-            if operation in op_to_collect:
-                # only events from new version are important
-                result.append(event)
+            if operation not in op_to_collect:
+                # only events from one version are important, block is closed in this version too
+                continue
+
+            result.append(event)
 
             et, dt, p = event
             if et == START and dt[0] == data[0]:
@@ -174,17 +198,19 @@ class BaseProcessor(object):
         :return: True if diff tags are allowed as current element contents, False otherwise
         :rtype: bool
         """
-        return Html5Definition.get_diff_type(self.get_current_element()) == DiffBehaviour.internally
+        return self._dtd.can_contain_diff(self.get_current_element())
 
     def _enter(self, tag):
-        logger.debug('  > entering into %r' % tag)
+        if self._tracer is not None:
+            self._tracer.emit('enter', tag)
         self._stack.append(tag)
 
     def pop_stack(self):
         return self._stack.pop() if self._stack else None
 
     def _leave(self, tag):
-        logger.debug('  > trying to leave %r' % tag)
+        if self._tracer is not None:
+            self._tracer.emit('leave', tag)
 
         top = self.pop_stack()
 
@@ -218,6 +244,35 @@ class BaseProcessor(object):
         """
         self._result.extend(result)
 
+    def extend_processed(self, result):
+        """
+        Extends processor result stream by result of the nested processor, which is already processed
+        (e.g. marked by diff tags)
+        :param result: list,tuple
+        :return:
+        """
+        self._result.extend(result)
+
+    def set_checkpoint(self, size):
+        """
+        Enable yielding CHECKPOINT during iteration, when at least given number of events is collected in the
+        processor result.
+
+        :param size: Number of collected events, None disables checkpoints
+        :type size: int,None
+        """
+        self._checkpoint = size
+
+    def drain(self):
+        """
+        Take already finished part of processor result. Can be called in the mid of operation, drained events
+        won't be returned by flush().
+        :return:
+        :rtype: list
+        """
+        result, self._result = self._result, []
+        return result
+
     def flush(self):
         """
         Finalize processing and returns processor result.
@@ -234,16 +289,30 @@ class RootProcessor(BaseProcessor):
     If diff operation is detected control is routed to appropriate special processor.
     """
 
-    def __init__(self, diff_iter):
+    # default number of events collected by top-level processors in lazy mode, before these are yielded
+    checkpoint_size = 256
+
+    def __init__(self, diff_iter, stats=None, tracer=None, dtd=None):
+        """
+        :param diff_iter: Diff iterator
+        :param stats: DiffStats collecting processors counters, None if not collected
+        :param tracer: Trace events collector, by default events are only logged if 'pyHtmlDiff' logger
+         has debug level enabled
+        :param dtd: Compiled document definition, HTML5 by default
+        """
         diff_iter = OneBackIterator(diff_iter)
-        super(RootProcessor, self).__init__(diff_iter, None)
+        if tracer is None:
+            tracer = Tracer.from_logger()
+        super(RootProcessor, self).__init__(diff_iter, None, tracer, dtd)
+        self._stats = stats
+        # processors which finished their work, per processor class, ready to be reused
+        self._pool = {}
 
     def _stop(self, operation, event):
         # never stops, root processor run over all events
         return False
 
-    def _subprocess_event(self, operation, event, parent=None):
-
+    def _create_processor(self, operation, parent, depth=1):
         if operation == 'equal':
             processor_cls = EqualProcessor
         elif operation == 'insert':
@@ -256,16 +325,78 @@ class RootProcessor(BaseProcessor):
         # rewind iterator one step back, so processor will the this event as a first one
         self._iter.go_back()
 
-        logger.debug("-> Entering into processor %r" % processor_cls)
+        parent = parent or self.get_current_element()
+
+        if self._tracer is not None:
+            self._tracer.emit('create', processor_cls, parent)
+
+        if self._stats is not None:
+            self._stats.processors += 1
+            if depth > self._stats.max_depth:
+                self._stats.max_depth = depth
+
+        pool = self._pool.get(processor_cls)
+        if pool:
+            processor = pool.pop()
+            processor.reset(parent)
+            return processor
+
+        return processor_cls(self._iter, parent=parent, tracer=self._tracer, dtd=self._dtd)
+
+    def _release_processor(self, processor):
+        if self._tracer is not None:
+            self._tracer.emit('leave_processor', processor.__class__)
 
-        processor = processor_cls(self._iter, parent=(parent or self.get_current_element()))
-        for op, evt, parent in processor:
-            processor.extend(self._subprocess_event(op, evt, parent))
+        self._pool.setdefault(processor.__class__, []).append(processor)
 
-        res = processor.flush()
+    def _dispatch(self, operation, parent=None, checkpoint=None):
+        """
+        Process diff operation which starts at the current event. Events which cannot be processed by
+        a processor are dispatched to a nested processor. Nested processors are kept on the explicit stack
+        (instead of recursion), when nested processor is done, its result is appended to its parent one.
+
+        :param operation: Operation of the current event
+        :param parent: Parent tag of the processor
+        :param checkpoint: Enable checkpoints of the top-level processor, see BaseProcessor.set_checkpoint()
+        :return: generator of events lists, without checkpoints whole result is generated at once
+        """
+        processor = self._create_processor(operation, parent)
+        processor.set_checkpoint(checkpoint)
+        stack = [(processor, iter(processor))]
+
+        while stack:
+            processor, events = stack[-1]
+            try:
+                op, evt, parent = next(events)
+            except StopIteration:
+                stack.pop()
+                result = processor.flush()
+                self._release_processor(processor)
+
+                if not stack:
+                    yield result
+                    return
 
-        logger.debug('<- Processor %r left' % processor_cls)
-        return res
+                top = stack[-1][0]
+                top.extend_processed(result)
+                if checkpoint is not None and len(stack) == 1:
+                    yield top.drain()
+                continue
+
+            if op is None:
+                # top-level processor collected enough events
+                yield processor.drain()
+                continue
+
+            processor = self._create_processor(op, parent, len(stack) + 1)
+            stack.append((processor, iter(processor)))
+
+    def _subprocess_event(self, operation, event, parent=None):
+        result = []
+        for events in self._dispatch(operation, parent):
+            result.extend(events)
+
+        return result
 
     def _process_event(self, operation, event):
         res = self._subprocess_event(operation, event)
@@ -278,6 +409,25 @@ class RootProcessor(BaseProcessor):
 
         return self.flush()
 
+    def iter_execute(self, checkpoint=None):
+        """
+        Lazy variant of execute(). Result events are yielded as soon as these are processed by top-level
+        processors, so the whole result is never kept in memory.
+
+        :param checkpoint: Number of events collected by top-level processor, after which these are yielded.
+         By default checkpoint_size is used.
+        :type checkpoint: int,None
+        """
+        checkpoint = checkpoint or self.checkpoint_size
+
+        self._exhausted = False
+        for operation, event in self._iter:
+            for events in self._dispatch(operation, None, checkpoint):
+                for result in events:
+                    yield result
+
+        self._exhausted = True
+
     def _process_block(self, start_event):
         raise AssertionError
 
@@ -342,9 +492,12 @@ class SingleOperationProcessor(BaseProcessor):
 
     operation = None
 
-    def __init__(self, *args, **kwargs):
-        super(SingleOperationProcessor, self).__init__(*args, **kwargs)
-        self._stack = []
+    # diff marker node -> its opening and closing events, shared by all processors
+    _marker_events = {}
+    marker_events_cache_size = 256
+
+    def reset(self, parent):
+        super(SingleOperationProcessor, self).reset(parent)
         self._buffer = []
 
         self._rendered = False
@@ -354,51 +507,88 @@ class SingleOperationProcessor(BaseProcessor):
             self.open_diff()
 
     def _stop(self, operation, event):
-        if operation != self.operation and (not self._stack or self._stack[0] is self.MARKER):
+        # stop only when all elements entered by this processor are left
+        stack = self._stack
+        if operation != self.operation and (not stack or len(stack) == 1 and stack[0] is self.MARKER):
             return True
 
         return False
 
-    def _process_event(self, operation, event):
+    def _in_diff(self):
+        """
+        :return: True if diff is open directly in the current element
+        :rtype: bool
+        """
+        return self._rendered and self._stack[-1] is self.MARKER
 
-        if operation == 'equal':
-            self._all_same = False
-            self.append(event)
+    def _close_current_diff(self):
+        # diff marker is always on the top of the stack, see _in_diff()
+        self.pop_stack()
+        self.close_diff()
+
+    def _process_event(self, operation, event):
 
         if operation != self.operation:
+            if not self._rendered:
+                return False
+
+            if self._in_diff():
+                # other operation inside the block, diff is closed and event is processed by nested processor
+                self._close_current_diff()
+                return False
+
+            # element opened inside the diff (e.g. <b>) holds other operation contents, this is a change
+            # of formatting, equal contents are kept inside the diff
             self._all_same = False
+            if operation == 'equal':
+                return super(SingleOperationProcessor, self)._process_event(operation, event)
             return False
 
-        return super(SingleOperationProcessor, self)._process_event(operation, event)
+        event_type, data, pos = event
+        if event_type == START:
+            block = self._dtd.is_block(data[0])
+            if self._in_diff() and (block or self._buffer):
+                # if diff tag is open and we are about to enter into new tag, close current diff, so
+                # Foo <b> bar </b>
+                #  I   I   E   I
+                # will be rendered as:
+                # <ins>Foo</ins><ins formatting><b>E</b></ins>
+                #
+                # diff tags are never placed around block elements, diff is open inside, so
+                # <p>Foo</p>
+                #  I  I  I
+                # will be rendered as:
+                # <p><ins>Foo</ins></p>
+                self._close_current_diff()
+
+            if block and not self._rendered:
+                self.append(event)
+                self._enter(data[0])
+                return True
 
-    def _enter(self, tag):
-        super(SingleOperationProcessor, self)._enter(tag)
-
-        if self._rendered is True and self.get_current_element() is self.MARKER:
-            # if diff tag is open and we are about to enter into new tag
-            # and we are in diff tag, close current diff, so
-            # Foo <b> bar </b>
-            #  I   I   E   I
-            # will be rendered as:
-            # <ins>Foo</ins><ins formatting><b>E</b></ins>
-            #
-            self.close_diff()
+        elif event_type == END:
+            if self._in_diff():
+                # diff open inside closed element
+                self._close_current_diff()
 
-        if self._rendered is False and self.can_contain_diff():
-            self.open_diff()
+            result = super(SingleOperationProcessor, self)._process_event(operation, event)
+            if self._in_diff():
+                # element wrapped by diff is closed
+                self._close_current_diff()
 
-    def _leave(self, tag):
+            return result
 
-        if super(SingleOperationProcessor, self)._leave(tag):
+        if not self._rendered and self.can_contain_diff():
+            self.open_diff()
 
-            top = self.get_current_element()
-            if top is self.MARKER:
-                self.pop_stack()
-                self.close_diff()
+        return super(SingleOperationProcessor, self)._process_event(operation, event)
 
-            return True
+    def get_current_element(self):
+        for tag in reversed(self._stack):
+            if tag is not self.MARKER:
+                return tag
 
-        return False
+        return self._parent
 
     def append(self, result):
         if self._rendered:
@@ -430,6 +620,12 @@ class SingleOperationProcessor(BaseProcessor):
 
             self._result.extend(result)
 
+    def extend_processed(self, result):
+        if self._rendered:
+            self._buffer.extend(result)
+        else:
+            self._result.extend(result)
+
     def _append_hazardous_result(self):
         """
         Items which are about to be appended will not be properly marked according to the processor,
@@ -448,6 +644,11 @@ class SingleOperationProcessor(BaseProcessor):
         Diffed sections are rendered lazily. Here, opening diff tag is put into result stream, then
         collected buffer events and closing tag.
         """
+        if not self._buffer:
+            # nothing was marked
+            self._rendered = False
+            return
+
         # child is an element which should be wrapped by diff, this could be a text node
         # or tag
         child = self._buffer[0]
@@ -466,21 +667,51 @@ class SingleOperationProcessor(BaseProcessor):
             node = getattr(DefaultDiffProducer, 'render_formatting_%s' % self.operation)(self.get_current_element(),
                                                                                          formatting_node)
 
-        logger.debug("Lazy diff '%s' of %d nodes marked using %r" % (self.operation, len(self._buffer), node))
+        if self._tracer is not None:
+            self._tracer.emit('close_diff', self.operation, len(self._buffer), node)
 
-        self._result.append((START, (QName(node.name), Attrs(node.attrs)), None))
+        start, end = self._get_marker_events(node)
+        self._result.append(start)
         self._result.extend(self._buffer)
-        self._result.append((END, QName(node.name), None))
+        self._result.append(end)
 
         self._rendered = False
         self._buffer = []
 
+    @classmethod
+    def _get_marker_events(cls, node):
+        """
+        :param node: Diff marker node
+        :type node: DOMNode
+        :return: tuple (opening event, closing event) of given diff marker
+        """
+        try:
+            return cls._marker_events[node]
+        except KeyError:
+            pass
+        except TypeError:
+            # node attributes are not hashable, cannot be cached
+            return cls._create_marker_events(node)
+
+        if len(cls._marker_events) >= cls.marker_events_cache_size:
+            cls._marker_events.clear()
+
+        events = cls._marker_events[node] = cls._create_marker_events(node)
+        return events
+
+    @staticmethod
+    def _create_marker_events(node):
+        name = QName(node.name)
+        attrs = Attrs((QName(attr), value) for attr, value in node.attrs)
+        return (START, (name, attrs), None), (END, name, None)
+
     def open_diff(self):
         """
         Lazily open diff marked piece of HTML. As now, all results will be stored in temporary buffer until
         opened tags stack return back to diff mark and close_diff() will be called.
         """
-        logger.debug("Diff tag allowed in %r. Opening node." % self.get_current_element())
+        if self._tracer is not None:
+            self._tracer.emit('open_diff', self.get_current_element())
         self._buffer = []
         self._rendered = True
         self._all_same = True
@@ -488,7 +719,7 @@ class SingleOperationProcessor(BaseProcessor):
 
 
     def flush(self):
-        if self._stack and self._stack[0] is self.MARKER:
+        if self._rendered:
             self.close_diff()
 
         return super(SingleOperationProcessor, self).flush()
@@ -520,7 +751,7 @@ class DeleteProcessor(SingleOperationProcessor):
         # node is marked as removed and all its contents should be skipped
         # in deletion it means that should not be passed to the output
         # just consume block
-        self._collect_block(start_event, set())
+        self._collect_block(start_event, {'equal', 'delete'})
 
     def _process_block(self, start_event):
         # whole block should be marked as removed, collect contents events which type is equal or deleted,
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+
+"""Created on 17.10.26
+
+.. moduleauthor:: Paweł Pecio
+"""
+import sys
+from array import array
+from itertools import izip
+
+from genshi.core import END
+
+
+class TokenStore(object):
+    """
+    Compact sequence of Genshi events, stored as struct of arrays: event kind codes and identifiers of
+    interned event data (tag name with attributes, tag name or text). Equal data (e.g. the same word or tag
+    occurring many times) is stored only once. Events positions are not kept by default, events are
+    recreated with POS position.
+
+    Events (tuples) are created only when accessed.
+    """
+
+    POS = (None, -1, -1)
+
+    def __init__(self, events=(), positions=False):
+        """
+        :param events: Initial events
+        :param positions: Keep original events positions
+        """
+        # kind codes and data identifiers of consecutive events
+        self._kinds = array('B')
+        self._values = array('i')
+
+        # kind code -> event kind
+        self._kind_names = []
+        self._kind_codes = {}
+
+        # data identifier -> data, (kind code, data) -> data identifier
+        self._table = []
+        self._ids = {}
+
+        self._positions = [] if positions else None
+
+        self.extend(events)
+
+    def _kind_code(self, kind):
+        code = self._kind_codes.get(kind)
+        if code is None:
+            code = self._kind_codes[kind] = len(self._kind_names)
+            self._kind_names.append(kind)
+        return code
+
+    def _value_id(self, code, data):
+        # data is interned per kind, because tag names (QName) are equal to the same text
+        key = (code, data)
+        value_id = self._ids.get(key)
+        if value_id is None:
+            value_id = self._ids[key] = len(self._table)
+            self._table.append(data)
+        return value_id
+
+    def add(self, kind, data, pos=POS):
+        code = self._kind_code(kind)
+        self._kinds.append(code)
+        self._values.append(self._value_id(code, data))
+        if self._positions is not None:
+            self._positions.append(pos)
+
+    def append(self, event):
+        """
+        :param event: Genshi event (kind, data, pos)
+        """
+        self.add(*event)
+
+    def extend(self, events):
+        # the same as add() for every event, inlined
+        kind_codes = self._kind_codes
+        ids = self._ids
+        table = self._table
+        positions = self._positions
+        append_kind = self._kinds.append
+        append_value = self._values.append
+
+        for kind, data, pos in events:
+            code = kind_codes.get(kind)
+            if code is None:
+                code = self._kind_code(kind)
+
+            key = (code, data)
+            value_id = ids.get(key)
+            if value_id is None:
+                value_id = ids[key] = len(table)
+                table.append(data)
+
+            append_kind(code)
+            append_value(value_id)
+            if positions is not None:
+                positions.append(pos)
+
+    def _event(self, idx):
+        pos = self._positions[idx] if self._positions is not None else self.POS
+        return self._kind_names[self._kinds[idx]], self._table[self._values[idx]], pos
+
+    def iter_range(self, start, stop):
+        """
+        Lazily iterate over events in given range, the same as iterating over store[start:stop] slice, but
+        no list is built.
+
+        :param start: Index of the first event
+        :param stop: Index after the last event
+        """
+        kind_names = self._kind_names
+        table = self._table
+        kinds = self._kinds
+        values = self._values
+        positions = self._positions
+        pos = self.POS
+        for idx in xrange(start, min(stop, len(kinds))):
+            if positions is not None:
+                pos = positions[idx]
+            yield kind_names[kinds[idx]], table[values[idx]], pos
+
+    def tag_names(self):
+        """
+        :return: Distinct tag names of stored events
+        :rtype: set
+        """
+        end = self._kind_codes.get(END)
+        return set(data for code, data in self._ids if code == end)
+
+    def intern_into(self, table):
+        """
+        Intern events in given token table. Every distinct event is interned only once.
+
+        :type table: TokenTable
+        :return: Array of events identifiers, see TokenTable.intern()
+        :rtype: array
+        """
+        local_ids = {}
+        get_id = table.get_id
+        kind_names = self._kind_names
+        data = self._table
+        result = array('i')
+        append = result.append
+
+        for kind, value in izip(self._kinds, self._values):
+            key = (kind, value)
+            token_id = local_ids.get(key)
+            if token_id is None:
+                token_id = local_ids[key] = get_id((kind_names[kind], data[value]))
+            append(token_id)
+
+        return result
+
+    def arrays(self):
+        """
+        :return: tuple (kind codes array, data identifiers array, kind names, interned data), see from_arrays()
+        :rtype: tuple
+        """
+        return self._kinds, self._values, self._kind_names, self._table
+
+    @classmethod
+    def from_arrays(cls, kinds, values, kind_names, table):
+        """
+        Create store from its arrays (e.g. deserialized ones), events positions are not kept.
+
+        :rtype: TokenStore
+        """
+        store = cls.__new__(cls)
+        store.__setstate__((kinds, values, kind_names, table, None))
+        return store
+
+    @property
+    def nbytes(self):
+        """Approximate memory used by the store, including interned data"""
+        size = (
+            sys.getsizeof(self._kinds) + sys.getsizeof(self._values) +
+            sys.getsizeof(self._table) + sys.getsizeof(self._ids)
+        )
+        for data in self._table:
+            if isinstance(data, basestring):
+                size += sys.getsizeof(data)
+        if self._positions is not None:
+            size += sys.getsizeof(self._positions)
+        return size
+
+    def __len__(self):
+        return len(self._kinds)
+
+    def __iter__(self):
+        kind_names = self._kind_names
+        table = self._table
+        if self._positions is None:
+            pos = self.POS
+            for kind, value in izip(self._kinds, self._values):
+                yield kind_names[kind], table[value], pos
+        else:
+            for kind, value, pos in izip(self._kinds, self._values, self._positions):
+                yield kind_names[kind], table[value], pos
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self._event(idx) for idx in range(*item.indices(len(self)))]
+
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError("Token index out of range")
+
+        return self._event(item)
+
+    def __getstate__(self):
+        # lookup dictionaries are rebuilt from the tables
+        return self._kinds, self._values, self._kind_names, self._table, self._positions
+
+    def __setstate__(self, state):
+        self._kinds, self._values, self._kind_names, self._table, self._positions = state
+        self._kind_codes = dict((kind, code) for code, kind in enumerate(self._kind_names))
+        self._ids = dict(
+            ((code, self._table[value_id]), value_id) for code, value_id in izip(self._kinds, self._values)
+        )
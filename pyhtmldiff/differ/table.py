@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+
+"""Created on 17.10.26
+
+Table aware differ. Flattened into the words stream, table with inserted column has every row changed and
+is matched word by word as a whole, into thousands of tiny opcodes. Tables are diffed by their structure
+instead: rows are aligned by their key (contents of the key column) and contents hash, cells of aligned rows
+by their position, and only changed cells are diffed by words. Every row is diffed separately, so the work
+grows linearly with the number of rows.
+
+.. moduleauthor:: Paweł Pecio
+"""
+from genshi.core import START
+
+from differ.block import BlockSplitter
+from differ.engine import get_engine
+from differ.iterator import SplittedTextNodesIterator
+from differ.tokens import TokenTable
+
+
+class _OpcodesBuilder(object):
+    """
+    Collects events of both versions and opcodes referring to them. Adjacent runs of the same operation are
+    merged into one opcode.
+    """
+
+    def __init__(self):
+        self.old = []
+        self.new = []
+        self.opcodes = []
+
+    def add(self, tag, old_part, new_part):
+        i1 = len(self.old)
+        j1 = len(self.new)
+        self.old.extend(old_part)
+        self.new.extend(new_part)
+        self.add_opcode(tag, i1, len(self.old), j1, len(self.new))
+
+    def add_opcode(self, tag, i1, i2, j1, j2):
+        if i1 == i2 and j1 == j2:
+            return
+
+        opcodes = self.opcodes
+        if opcodes and opcodes[-1][0] == tag and opcodes[-1][2] == i1 and opcodes[-1][4] == j1:
+            opcodes[-1] = (tag, opcodes[-1][1], i2, opcodes[-1][3], j2)
+        else:
+            opcodes.append((tag, i1, i2, j1, j2))
+
+    def replace(self, old_part, new_part):
+        self.add('delete', old_part, ())
+        self.add('insert', (), new_part)
+
+
+class TableDiffer(object):
+    """
+    Diffs two versions of a table (events of the whole table element).
+
+    Table is splitted into units: rows (tr elements with all their contents) and single events outside rows
+    (table and sections tags, caption contents). Units are aligned by their key: rows by contents of the key
+    column cell, other units by their contents. Aligned units with the same contents are equal, aligned rows
+    with changed contents are diffed by cells, other units are deleted and inserted.
+
+    Cells (td and th elements) and single events of a row are aligned by their contents, changed cells are
+    paired by position and diffed by words, unless their opening tags differ (e.g. changed colspan).
+    """
+
+    ROW = 'tr'
+    CELLS = frozenset(['td', 'th'])
+
+    def __init__(self, engine=None, table_factory=TokenTable, key_column=0):
+        """
+        :param engine: Diff engine, see differ.engine.get_engine()
+        :param table_factory: Callable creating token table, which defines equality of events
+        :param key_column: Index of the cell identifying the row, whole row contents are the key of rows with
+         fewer cells
+        """
+        self._engine = get_engine(engine)
+        self._table_factory = table_factory
+        self.key_column = key_column
+
+    def diff(self, old, new, deadline=None):
+        """
+        :param old: list of Genshi events of old version of the table
+        :param new: list of Genshi events of new version of the table
+        :param deadline: time.time() value, see DiffEngine.get_opcodes()
+        :return: tuple (old events, new events, opcodes), text nodes of changed cells are splitted into words
+        :rtype: tuple
+        """
+        builder = _OpcodesBuilder()
+        key = self._table_factory().key
+        # unit key -> identifier, shared by all rows and cells
+        ids = {}
+
+        old_units = self._units(old, self.ROW)
+        new_units = self._units(new, self.ROW)
+        old_keys = [self._intern(ids, self._row_key(old, unit, key)) for unit in old_units]
+        new_keys = [self._intern(ids, self._row_key(new, unit, key)) for unit in new_units]
+
+        for tag, i1, i2, j1, j2 in self._get_opcodes(old_keys, new_keys, deadline):
+            if tag in ('equal', 'replace'):
+                for old_unit, new_unit in zip(old_units[i1:i2], new_units[j1:j2]):
+                    self._diff_unit(builder, old, new, old_unit, new_unit, ids, key, deadline)
+
+            # rows left unpaired
+            common = min(i2 - i1, j2 - j1) if tag != 'equal' else i2 - i1
+            old_rest = old_units[i1 + common:i2]
+            new_rest = new_units[j1 + common:j2]
+            if old_rest or new_rest:
+                builder.replace(
+                    old[old_rest[0][0]:old_rest[-1][1]] if old_rest else (),
+                    new[new_rest[0][0]:new_rest[-1][1]] if new_rest else (),
+                )
+
+        return builder.old, builder.new, builder.opcodes
+
+    # -------------------- PRIVATE METHODS ---------------------------
+
+    def _get_opcodes(self, a, b, deadline):
+        if deadline is None:
+            return self._engine.get_opcodes(a, b)
+
+        return self._engine.get_opcodes(a, b, deadline)
+
+    @staticmethod
+    def _intern(ids, unit_key):
+        unit_id = ids.get(unit_key)
+        if unit_id is None:
+            unit_id = ids[unit_key] = len(ids)
+        return unit_id
+
+    @staticmethod
+    def _is_element(events, idx, names):
+        event_type, data, pos = events[idx]
+        return event_type == START and data[0].localname in names
+
+    @classmethod
+    def _units(cls, events, names, start=0, stop=None):
+        """
+        :return: list of units (start, end): elements with given names (outermost ones) with all their contents
+         and single events outside of them
+        """
+        stop = len(events) if stop is None else stop
+        units = []
+        idx = start
+        while idx < stop:
+            if cls._is_element(events, idx, names):
+                end = BlockSplitter._subtree_end(events, idx)
+                units.append((idx, end))
+                idx = end
+                continue
+
+            units.append((idx, idx + 1))
+            idx += 1
+
+        return units
+
+    @staticmethod
+    def _contents_key(events, unit, key):
+        return tuple(key(events[idx]) for idx in range(*unit))
+
+    def _row_key(self, events, unit, key):
+        start, end = unit
+        if not self._is_element(events, start, self.ROW):
+            return self._contents_key(events, unit, key)
+
+        cells = [cell for cell in self._units(events, self.CELLS, start + 1, end - 1)
+                 if self._is_element(events, cell[0], self.CELLS)]
+        if self.key_column < len(cells):
+            return 'row', self._contents_key(events, cells[self.key_column], key)
+
+        return 'row', self._contents_key(events, unit, key)
+
+    def _diff_unit(self, builder, old, new, old_unit, new_unit, ids, key, deadline):
+        old_part = old[old_unit[0]:old_unit[1]]
+        new_part = new[new_unit[0]:new_unit[1]]
+
+        if [key(event) for event in old_part] == [key(event) for event in new_part]:
+            builder.add('equal', old_part, new_part)
+        elif self._is_element(old, old_unit[0], self.ROW) and self._is_element(new, new_unit[0], self.ROW) and \
+                key(old_part[0]) == key(new_part[0]):
+            self._diff_row(builder, old, new, old_unit, new_unit, ids, key, deadline)
+        else:
+            builder.replace(old_part, new_part)
+
+    def _diff_row(self, builder, old, new, old_row, new_row, ids, key, deadline):
+        old_cells = self._units(old, self.CELLS, *old_row)
+        new_cells = self._units(new, self.CELLS, *new_row)
+        old_ids = [self._intern(ids, self._contents_key(old, cell, key)) for cell in old_cells]
+        new_ids = [self._intern(ids, self._contents_key(new, cell, key)) for cell in new_cells]
+
+        for tag, i1, i2, j1, j2 in self._get_opcodes(old_ids, new_ids, deadline):
+            if tag == 'equal':
+                builder.add('equal', old[old_cells[i1][0]:old_cells[i2 - 1][1]],
+                            new[new_cells[j1][0]:new_cells[j2 - 1][1]])
+                continue
+
+            # changed cells are paired by their position
+            common = min(i2 - i1, j2 - j1)
+            for old_cell, new_cell in zip(old_cells[i1:i1 + common], new_cells[j1:j1 + common]):
+                self._diff_cell(builder, old[old_cell[0]:old_cell[1]], new[new_cell[0]:new_cell[1]], key, deadline)
+
+            old_rest = old_cells[i1 + common:i2]
+            new_rest = new_cells[j1 + common:j2]
+            builder.replace(
+                old[old_rest[0][0]:old_rest[-1][1]] if old_rest else (),
+                new[new_rest[0][0]:new_rest[-1][1]] if new_rest else (),
+            )
+
+    def _diff_cell(self, builder, old_cell, new_cell, key, deadline):
+        if len(old_cell) < 2 or len(new_cell) < 2 or old_cell[0][0] != START or \
+                key(old_cell[0]) != key(new_cell[0]):
+            # single events or cells with changed opening tag
+            builder.replace(old_cell, new_cell)
+            return
+
+        builder.add('equal', old_cell[:1], new_cell[:1])
+
+        old_words = SplittedTextNodesIterator(old_cell[1:-1])[:]
+        new_words = SplittedTextNodesIterator(new_cell[1:-1])[:]
+        if not old_words or not new_words:
+            builder.replace(old_words, new_words)
+        else:
+            i1 = len(builder.old)
+            j1 = len(builder.new)
+            builder.old.extend(old_words)
+            builder.new.extend(new_words)
+
+            table = self._table_factory()
+            for tag, a1, a2, b1, b2 in self._get_opcodes(table.intern(old_words), table.intern(new_words), deadline):
+                builder.add_opcode(tag, i1 + a1, i1 + a2, j1 + b1, j1 + b2)
+
+        builder.add('equal', old_cell[-1:], new_cell[-1:])
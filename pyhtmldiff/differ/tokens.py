@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+"""Created on 17.10.26
+
+.. moduleauthor:: Paweł Pecio
+"""
+from array import array
+
+from genshi.core import START, Attrs
+
+
+class TokenTable(object):
+    """
+    Interns Genshi events into small integer identifiers. Equal events (ignoring their position in the
+    source document) get the same identifier, so diff engines can compare plain integers instead of
+    hashing nested (QName, Attrs) tuples on every comparison.
+
+    The same table has to be used for both compared versions.
+    """
+
+    def __init__(self):
+        self._ids = {}
+
+    @staticmethod
+    def key(event):
+        """
+        Returns normalized event key: event type and data, position is skipped.
+
+        :param event: Genshi event (event_type, data, pos)
+        :rtype: tuple
+        """
+        return event[0], event[1]
+
+    def get_id(self, event):
+        """
+        :param event: Genshi event
+        :return: Identifier of given event
+        :rtype: int
+        """
+        key = self.key(event)
+        try:
+            return self._ids[key]
+        except KeyError:
+            token_id = self._ids[key] = len(self._ids)
+            return token_id
+
+    def intern(self, events):
+        """
+        Intern all events. Event with given index in the source sequence can be recovered by the same index
+        in the source sequence, table does not keep events.
+
+        :param events: iterable of Genshi events
+        :return: Array of events identifiers
+        :rtype: array
+        """
+        if hasattr(events, 'intern_into'):
+            # compact token store interns every distinct event only once
+            return events.intern_into(self)
+
+        ids = self._ids
+        key = self.key
+        result = array('i')
+        append = result.append
+
+        for event in events:
+            k = key(event)
+            token_id = ids.get(k)
+            if token_id is None:
+                token_id = ids[k] = len(ids)
+            append(token_id)
+
+        return result
+
+    def __len__(self):
+        return len(self._ids)
+
+
+class AttributesTokenTable(TokenTable):
+    """
+    Token table which ignores diffed attributes of elements (see DefaultDiffProducer.diff_attrs), so elements
+    differing only in these are matched as the same token and can be rendered as the same element with changed
+    attributes (see DefaultDiffProducer.same_opening_node()).
+    """
+
+    def __init__(self, producer):
+        """
+        :param producer: Diff producer class defining diffed attributes
+        :type producer: type
+        """
+        super(AttributesTokenTable, self).__init__()
+        self._producer = producer
+        # (tag, attrs) -> normalized key, the same attributes occur many times
+        self._keys = {}
+
+    def key(self, event):
+        event_type, data = event[0], event[1]
+        if event_type != START:
+            return event_type, data
+
+        try:
+            return self._keys[data]
+        except KeyError:
+            pass
+
+        tag, attrs = data
+        ignored = self._producer.diffed_attrs(tag.localname)
+        key = self._keys[data] = event_type, (tag, Attrs(attr for attr in attrs if attr[0] not in ignored))
+        return key
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+"""Created on 17.10.26
+
+Processors pipeline tracing. Processors record structured trace events (tuples of event kind and
+arguments) only if a tracer is attached, so there is no formatting cost when tracing is disabled. Recorded
+events are kept in a ring buffer and can be dumped when a bad diff is investigated.
+
+.. moduleauthor:: Paweł Pecio
+"""
+import logging
+import sys
+from collections import deque
+
+
+logger = logging.getLogger('pyHtmlDiff')
+
+# trace event kind -> message format of its arguments
+MESSAGES = {
+    'create': "-> Entering into processor %r within parent %r",
+    'leave_processor': "<- Processor %r left",
+    'enter': "  > entering into %r",
+    'leave': "  > trying to leave %r",
+    'open_diff': "Diff tag allowed in %r. Opening node.",
+    'close_diff': "Lazy diff '%s' of %d nodes marked using %r",
+}
+
+
+class Tracer(object):
+    """
+    Collects trace events of processors pipeline.
+    """
+
+    def __init__(self, capacity=1000, log=False):
+        """
+        :param capacity: Number of most recent events kept in the ring buffer, 0 means events are not kept
+        :param log: Pass events to 'pyHtmlDiff' logger at DEBUG level
+        """
+        self._events = deque(maxlen=capacity) if capacity else None
+        self._log = log
+
+    @classmethod
+    def from_logger(cls):
+        """
+        :return: Tracer which only logs events, if debug logging is enabled, None otherwise
+        :rtype: Tracer,None
+        """
+        if logger.isEnabledFor(logging.DEBUG):
+            return cls(capacity=0, log=True)
+
+        return None
+
+    def emit(self, kind, *args):
+        """
+        Record trace event. Arguments are stored as they are, message is formatted only when needed.
+
+        :param kind: Event kind, one of MESSAGES keys
+        """
+        if self._events is not None:
+            self._events.append((kind, args))
+
+        if self._log:
+            logger.debug(MESSAGES[kind], *args)
+
+    @property
+    def events(self):
+        """
+        :return: Recorded events, list of tuples (kind, arguments), oldest first
+        :rtype: list
+        """
+        return list(self._events or ())
+
+    def format(self):
+        """
+        :return: Recorded events messages
+        :rtype: list
+        """
+        return [MESSAGES[kind] % args for kind, args in self.events]
+
+    def dump(self, fp=None):
+        """
+        Write recorded events messages to given file, stderr by default.
+        """
+        fp = fp or sys.stderr
+        for message in self.format():
+            fp.write(message + '\n')
+
+    def clear(self):
+        if self._events is not None:
+            self._events.clear()
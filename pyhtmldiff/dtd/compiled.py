@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+
+"""Created on 17.10.26
+
+.. moduleauthor:: Paweł Pecio
+"""
+import threading
+
+from .const import DiffBehaviour
+from .html5 import Html5Definition
+
+
+class CompiledDTD(object):
+    """
+    Document definition compiled into lookup tables. Every tag name (QName) gets small integer identifier
+    when it is seen for the first time, its diff behaviour is resolved by the definition only once and then
+    taken from the array by tag identifier.
+
+    Compiled DTD is shared between diffs and threads, see get_dtd().
+    """
+
+    # identifier of the tree root parent (None tag)
+    ROOT_ID = 0
+
+    def __init__(self, definition=Html5Definition):
+        """
+        :param definition: Document definition class, e.g. Html5Definition or its subclass with custom
+         elements added to DIFF_TYPE
+        """
+        self.definition = definition
+        self._ids = {None: self.ROOT_ID}
+        self._types = [DiffBehaviour.internally]
+        self._internally = [True]
+        self._blocks = [True]
+        self._lock = threading.Lock()
+
+    def _compile(self, tag):
+        diff_type = self.definition.get_diff_type(tag)
+        block = self.definition.is_block(tag)
+        if diff_type is not None:
+            # custom definitions might be built on pyhtmldiff.dtd.const, which is other module object than
+            # dtd.const used by differ, when pyhtmldiff directory is on the path; enums are compared by name
+            diff_type = getattr(DiffBehaviour, diff_type.name)
+
+        with self._lock:
+            tag_id = self._ids.get(tag)
+            if tag_id is None:
+                # tables are extended before identifier is published
+                self._types.append(diff_type)
+                self._internally.append(diff_type == DiffBehaviour.internally)
+                self._blocks.append(block)
+                tag_id = self._ids[tag] = len(self._types) - 1
+
+        return tag_id
+
+    def intern_tags(self, tags):
+        """
+        Assign identifiers to given tag names in advance (e.g. all tag names of tokenized document), so later
+        lookups never compile.
+
+        :param tags: iterable of tag names
+        """
+        ids = self._ids
+        for tag in tags:
+            if tag not in ids:
+                self._compile(tag)
+
+    def tag_id(self, tag):
+        """
+        :param tag: Tag name, None means tree root parent
+        :type tag: QName,None
+        :return: Identifier of given tag name
+        :rtype: int
+        """
+        try:
+            return self._ids[tag]
+        except KeyError:
+            return self._compile(tag)
+
+    def get_diff_type(self, tag):
+        """
+        :type tag: QName,None
+        :rtype: DiffBehaviour,None
+        """
+        try:
+            return self._types[self._ids[tag]]
+        except KeyError:
+            return self._types[self._compile(tag)]
+
+    def can_contain_diff(self, tag):
+        """
+        :type tag: QName,None
+        :return: True if diff tags can be placed directly in given element
+        :rtype: bool
+        """
+        try:
+            return self._internally[self._ids[tag]]
+        except KeyError:
+            return self._internally[self._compile(tag)]
+
+    def is_block(self, tag):
+        """
+        :type tag: QName,None
+        :return: True if given element is a block of the document (e.g. paragraph, list item, table row)
+        :rtype: bool
+        """
+        try:
+            return self._blocks[self._ids[tag]]
+        except KeyError:
+            return self._blocks[self._compile(tag)]
+
+    def __len__(self):
+        return len(self._types)
+
+    def __getstate__(self):
+        # lookup tables are rebuilt lazily in the other process
+        return {'definition': self.definition}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+
+DTDS = {
+    'html5': Html5Definition,
+}
+
+_compiled = {}
+_compiled_lock = threading.Lock()
+
+
+def register_dtd(name, definition):
+    """
+    Register custom document definition, so it can be used by name (e.g. Diff(dtd='my-components')).
+    Available also as pyhtmldiff.register_dtd().
+
+    :param name: Definition name
+    :param definition: Document definition class, see Html5Definition
+    """
+    DTDS[name] = definition
+
+
+def get_dtd(dtd=None):
+    """
+    Resolve compiled document definition. Definitions are compiled once and shared.
+
+    :param dtd: CompiledDTD instance, registered definition name, definition class or None for HTML5
+    :type dtd: CompiledDTD,basestring,type,None
+    :rtype: CompiledDTD
+    """
+    if dtd is None:
+        dtd = Html5Definition
+    elif isinstance(dtd, CompiledDTD):
+        return dtd
+    elif not hasattr(dtd, 'get_diff_type'):
+        try:
+            dtd = DTDS[dtd]
+        except KeyError:
+            raise ValueError("Unknown DTD %r, available definitions: %s" % (dtd, ', '.join(sorted(DTDS))))
+
+    compiled = _compiled.get(dtd)
+    if compiled is None:
+        with _compiled_lock:
+            compiled = _compiled.setdefault(dtd, CompiledDTD(dtd))
+
+    return compiled
@@ -137,6 +137,15 @@ class Html5Definition(object):
         'template': DiffBehaviour.skip
     }
 
+    # elements which are blocks of the document (not a phrasing content), diff tags are never placed
+    # around these, but inside
+    BLOCK_ELEMENTS = frozenset([
+        'article', 'section', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'footer', 'address',
+        'p', 'blockquote', 'ol', 'ul', 'li', 'dl', 'dt', 'dd', 'figure', 'figcaption', 'div', 'main',
+        'table', 'caption', 'tbody', 'thead', 'tfoot', 'tr', 'td', 'th',
+        'form', 'fieldset', 'legend',
+    ])
+
     @classmethod
     def get_diff_type(cls, tag):
         """
@@ -150,3 +159,17 @@ class Html5Definition(object):
             return DiffBehaviour.internally
 
         return cls.DIFF_TYPE.get(tag.localname)
+
+    @classmethod
+    def is_block(cls, tag):
+        """
+        :param tag:
+        :type tag: QName
+        :rtype: bool
+        :return: True if given element is a block of the document
+        """
+        if tag is None:
+            # tree root parent
+            return True
+
+        return tag.localname in cls.BLOCK_ELEMENTS
@@ -0,0 +1,326 @@
+# -*- coding: utf-8 -*-
+
+"""Created on 17.10.26
+
+HTML parser backends. Every backend parses HTML fragment into Genshi events stream, where fragment
+contents are placed in the fake root element <DOCUMENT_FRAGMENT> and HTML elements are in XHTML namespace,
+exactly as html5lib "etree" tree builder does it.
+
+.. moduleauthor:: Paweł Pecio
+"""
+import threading
+
+import html5lib
+from genshi.core import START, END, TEXT, Attrs, QName
+from genshi.input import ET
+
+from differ.iterator import SplittedTextNodesIterator
+from differ.store import TokenStore
+
+try:
+    import lxml.html
+    from lxml import etree
+except ImportError:  # pragma: no cover
+    lxml = etree = None
+
+
+XHTML_NAMESPACE = 'http://www.w3.org/1999/xhtml'
+
+FRAGMENT_ROOT = 'DOCUMENT_FRAGMENT'
+
+# elements wrapping the fragment, when parsed as a document by libxml2
+WRAPPER_TAGS = frozenset(['html', 'body'])
+
+# elements which first newline is dropped by HTML5 parsers, but not by libxml2
+LEADING_NEWLINE_TAGS = ('pre', 'textarea', 'listing')
+
+
+class ParserBackend(object):
+    """
+    Parser backend base class
+    """
+
+    name = None
+
+    def parse(self, html_string):
+        """
+        Parse given HTML fragment.
+
+        :param html_string:
+        :return: Genshi events
+        """
+        raise NotImplementedError()
+
+    def tokenize(self, html_string):
+        """
+        Parse given HTML fragment and split its text nodes into words.
+
+        :param html_string:
+        :rtype: SplittedTextNodesIterator
+        """
+        return SplittedTextNodesIterator(self.parse(html_string))
+
+
+class Html5libBackend(ParserBackend):
+    """
+    Pure Python, HTML5 compliant parser. Default one.
+    """
+
+    name = 'html5lib'
+
+    # parsers are reusable, but not thread safe, keep one per thread
+    _local = threading.local()
+
+    @classmethod
+    def _get_parser(cls):
+        parser = getattr(cls._local, 'parser', None)
+        if parser is None:
+            builder = html5lib.getTreeBuilder('etree')
+            parser = cls._local.parser = html5lib.HTMLParser(tree=builder)
+
+        return parser
+
+    def parse(self, html_string):
+        return ET(self._get_parser().parseFragment(html_string))
+
+
+class LxmlBackend(ParserBackend):
+    """
+    libxml2 based parser. Much faster than html5lib, but libxml2 is not HTML5 compliant, so its tree is
+    normalized to look like html5lib one (implied table bodies, namespaces, no comments).
+    Produces the same events as html5lib for well-formed documents.
+    """
+
+    name = 'lxml'
+
+    def __init__(self):
+        if lxml is None:
+            raise ImportError("lxml is required by %r parser backend" % self.name)
+
+    @staticmethod
+    def _decode(html_string):
+        # libxml2 would guess encoding of byte strings, these are expected to be UTF-8 encoded
+        if isinstance(html_string, bytes):
+            return html_string.decode('utf-8')
+        return html_string
+
+    @staticmethod
+    def _wrap(html_string):
+        # UTF-8 encoded document is much smaller than unicode one and libxml2 converts it to UTF-8 anyway
+        return b'<html><body>%s</body></html>' % html_string.encode('utf-8')
+
+    @staticmethod
+    def _append_text(root, text):
+        if not text:
+            return
+
+        if len(root):
+            root[-1].tail = (root[-1].tail or '') + text
+        else:
+            root.text = (root.text or '') + text
+
+    def _fragment(self, html_string):
+        root = lxml.html.Element(FRAGMENT_ROOT)
+        if not html_string.strip():
+            # libxml2 refuses to parse empty documents and drops whitespace only ones
+            root.text = html_string or None
+            return root
+
+        parser = lxml.html.HTMLParser(encoding='utf-8')
+        document = lxml.html.document_fromstring(self._wrap(html_string), parser=parser)
+        body = document.find('body')
+        self._append_text(root, body.text)
+        root.extend(body)
+
+        # stray </body> or </html> closes the wrapper early, libxml2 places the rest of the fragment after
+        # the body, html5lib ignores these tags in fragments
+        self._append_text(root, body.tail)
+        root.extend(list(body.itersiblings()))
+        etree.strip_tags(root, *WRAPPER_TAGS)
+
+        return root
+
+    @staticmethod
+    def _wrap_table_rows(table):
+        body = None
+        for child in list(table):
+            if child.tag != 'tr':
+                body = None
+                continue
+
+            if body is None:
+                body = lxml.html.Element('tbody')
+                child.addprevious(body)
+
+            # row is moved with its tail
+            body.append(child)
+
+    def _normalize(self, root):
+        etree.strip_tags(root, etree.Comment, etree.ProcessingInstruction)
+
+        for element in root.iter(*LEADING_NEWLINE_TAGS):
+            if element.text and element.text.startswith('\n'):
+                element.text = element.text[1:] or None
+
+        for table in root.iter('table'):
+            self._wrap_table_rows(table)
+
+        prefix = '{%s}' % XHTML_NAMESPACE
+        for element in root.iterdescendants():
+            element.tag = prefix + element.tag
+
+        return root
+
+    @staticmethod
+    def _unicode_events(events):
+        # libxml2 returns ASCII only text and attribute values as byte strings
+        for kind, data, pos in events:
+            if kind == TEXT:
+                data = unicode(data)
+            elif kind == START and data[1]:
+                data = data[0], Attrs([(name, unicode(value)) for name, value in data[1]])
+            yield kind, data, pos
+
+    def parse(self, html_string):
+        return self._unicode_events(ET(self._normalize(self._fragment(self._decode(html_string)))))
+
+    def tokenize(self, html_string):
+        # single pass: parser callbacks emit splitted tokens, neither tree nor raw events are built
+        parser = etree.HTMLParser(target=TokenizingTarget(), remove_comments=True, remove_pis=True, encoding='utf-8')
+        tokens = etree.fromstring(self._wrap(self._decode(html_string)), parser)
+        return SplittedTextNodesIterator.from_tokens(tokens)
+
+
+class TokenizingTarget(object):
+    """
+    lxml parser target which builds compact tokens store (Genshi events with text nodes splitted into words)
+    directly from parser callbacks. Tokens are the same as html5lib events splitted by
+    SplittedTextNodesIterator, see LxmlBackend for details of libxml2 output normalization.
+
+    Parsed document has to be wrapped into <html><body>, only body contents are taken. Stray </body> or </html>
+    does not end the fragment, libxml2 continues after it, so fragment root is closed when parsing is finished.
+    """
+
+    def __init__(self):
+        self._tokens = TokenStore()
+        self._text = []
+        self._stack = []
+        # stack depths of table bodies which were not present in the document
+        self._implied = []
+        self._in_body = False
+        # first newline of just opened element has to be dropped
+        self._drop_newline = False
+        self._qnames = {}
+        self._empty_attrs = Attrs()
+
+    def _qname(self, tag):
+        qname = self._qnames.get(tag)
+        if qname is None:
+            qname = self._qnames[tag] = QName('%s}%s' % (XHTML_NAMESPACE, tag))
+        return qname
+
+    def _flush_text(self):
+        if not self._text:
+            return
+
+        text = u''.join(self._text)
+        self._text = []
+        self._tokens.extend((TEXT, word, None) for word in SplittedTextNodesIterator._text_split(text) if word)
+
+    def _open(self, tag, attrs):
+        self._tokens.add(START, (self._qname(tag), attrs))
+        self._stack.append(tag)
+
+    def _close(self):
+        tag = self._stack.pop()
+        if self._implied and self._implied[-1] == len(self._stack):
+            self._implied.pop()
+        self._tokens.add(END, self._qname(tag))
+
+    def _in_implied_body(self):
+        return bool(self._implied) and self._implied[-1] == len(self._stack) - 1
+
+    def _open_root(self):
+        self._in_body = True
+        self._tokens.add(START, (QName(FRAGMENT_ROOT), self._empty_attrs))
+
+    def start(self, tag, attrib):
+        if tag in WRAPPER_TAGS:
+            # wrapper tags repeated in the fragment are ignored, as html5lib does
+            if tag == 'body' and not self._in_body:
+                self._open_root()
+            return
+
+        if not self._in_body:
+            return
+
+        self._flush_text()
+        self._drop_newline = tag in LEADING_NEWLINE_TAGS
+
+        if tag == 'tr' and self._stack and self._stack[-1] == 'table':
+            self._implied.append(len(self._stack))
+            self._open('tbody', self._empty_attrs)
+        elif tag != 'tr' and self._in_implied_body():
+            self._close()
+
+        attrs = self._empty_attrs
+        if attrib:
+            attrs = Attrs([(QName(name), unicode(value)) for name, value in attrib.items()])
+        self._open(tag, attrs)
+
+    def end(self, tag):
+        if not self._in_body or tag in WRAPPER_TAGS:
+            return
+
+        self._flush_text()
+        self._drop_newline = False
+
+        if tag == 'table' and self._in_implied_body():
+            self._close()
+
+        self._close()
+
+    def data(self, text):
+        if not self._in_body:
+            return
+
+        if self._drop_newline:
+            self._drop_newline = False
+            if text.startswith(u'\n'):
+                text = text[1:]
+
+        self._text.append(unicode(text))
+
+    def close(self):
+        if not self._in_body:
+            self._open_root()
+
+        self._flush_text()
+        self._tokens.add(END, QName(FRAGMENT_ROOT))
+        return self._tokens
+
+
+BACKENDS = {
+    Html5libBackend.name: Html5libBackend,
+    LxmlBackend.name: LxmlBackend,
+}
+
+
+def get_parser(parser=None):
+    """
+    Resolve parser backend.
+
+    :param parser: Backend instance, backend name (see BACKENDS) or None for default backend
+    :type parser: ParserBackend,basestring,None
+    :rtype: ParserBackend
+    """
+    if parser is None:
+        return Html5libBackend()
+
+    if hasattr(parser, 'parse'):
+        return parser
+
+    try:
+        return BACKENDS[parser]()
+    except KeyError:
+        raise ValueError("Unknown parser backend %r, available backends: %s" % (parser, ', '.join(sorted(BACKENDS))))
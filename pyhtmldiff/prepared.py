@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+
+"""Created on 17.10.26
+
+Prepared documents: parsed and tokenized once (see Diff.prepare()), stored and diffed later against many other
+versions without parsing. Prepared document keeps tokens in compact arrays (see differ.store.TokenStore) and
+digests of its blocks (see differ.block.BlockSplitter), so hierarchical diff of prepared documents neither
+splits nor hashes their contents.
+
+Binary format (all integers little-endian)::
+
+    header        magic (8 bytes), number of tokens, number of blocks, length of data, length of scheme,
+                  size of data identifier (2 or 4 bytes)
+    kinds         kind code of every token, 1 byte each
+    values        data identifier of every token, 2 or 4 bytes each
+    blocks        index of the first token of every block, 4 bytes each
+    digests       digest of every block, DIGEST_SIZE bytes each
+    data          kind names and interned data (tags with attributes, tag names, words) as UTF-8 JSON
+    scheme        blocks scheme (document definition blocks were splitted by), UTF-8
+
+Usage::
+
+    differ = Diff(hierarchical=True)
+    with open('revision-1.bin', 'wb') as output:
+        differ.prepare(html).dump(output)
+
+    html = differ.get_html_diff(load('revision-1.bin'), load('revision-2.bin'))
+
+.. moduleauthor:: Paweł Pecio
+"""
+import hashlib
+import json
+import mmap
+import struct
+import sys
+from array import array
+from itertools import izip
+
+from genshi.core import COMMENT, END, START, TEXT, Attrs, QName, StreamEventKind
+
+from differ.block import BlockSplitter
+from differ.iterator import SplittedTextNodesIterator
+from differ.store import TokenStore
+
+
+MAGIC = b'PHDPREP\x01'
+
+DIGEST_SIZE = 16
+
+_HEADER = struct.Struct('<8sIIIIB')
+
+# array type codes of data identifiers by their size, 2 bytes are enough for most documents
+_VALUES_TYPES = {2: 'H', 4: 'i'}
+
+
+def _encode_data(kind, data):
+    """
+    :return: JSON serializable form of event data
+    """
+    if kind == START:
+        tag, attrs = data
+        return [unicode(tag), [item for name, value in attrs for item in (unicode(name), value)]]
+    if kind == END:
+        return unicode(data)
+    if kind in (TEXT, COMMENT):
+        return data
+
+    raise ValueError("Cannot prepare document with %s events" % kind)
+
+
+def _decode_data(kind, value):
+    if kind == START:
+        tag, attrs = value
+        return QName(tag), Attrs((QName(attrs[idx]), attrs[idx + 1]) for idx in range(0, len(attrs), 2))
+    if kind == END:
+        return QName(value)
+
+    return value
+
+
+def _little_endian(values):
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values
+
+
+class PreparedDocument(SplittedTextNodesIterator):
+    """
+    Tokenized document with digests of its blocks. It can be passed to Diff instead of HTML string, pickled
+    (in its binary form) or written to a file, see dump() and load().
+    """
+
+    def __init__(self, store, block_starts, digests, scheme):
+        """
+        :param store: Tokens of the document
+        :param block_starts: array of indexes of the first token of every block
+        :param digests: Concatenated digests of blocks, DIGEST_SIZE bytes each
+        :param scheme: Blocks scheme, see scheme_of()
+        :type store: TokenStore
+        """
+        self._data = store
+        self._block_starts = block_starts
+        self._digests = digests
+        self.scheme = scheme
+
+    @staticmethod
+    def scheme_of(dtd):
+        """
+        :param dtd: Compiled document definition blocks are splitted by
+        :return: Name of the blocks scheme, digests of documents with different schemes are not comparable
+        :rtype: unicode
+        """
+        definition = dtd.definition
+        while hasattr(definition, 'definition'):
+            # compiled definition from the other module object, compiled again (see get_dtd())
+            definition = definition.definition
+        module = definition.__module__
+        if module.startswith('pyhtmldiff.'):
+            # definitions are loaded also as top-level modules, when pyhtmldiff directory is on the path
+            module = module[len('pyhtmldiff.'):]
+        return u'%s.%s' % (module, definition.__name__)
+
+    @classmethod
+    def prepare(cls, tokens, dtd):
+        """
+        :param tokens: Tokenized document
+        :param dtd: Compiled document definition, which blocks are splitted by
+        :type tokens: SplittedTextNodesIterator
+        :rtype: PreparedDocument
+        """
+        store = tokens._data
+        if not hasattr(store, 'arrays'):
+            store = TokenStore(store)
+
+        kinds, values, kind_names, table = store.arrays()
+
+        # digest of every distinct data, blocks digests are computed from these
+        data_digests = [None] * len(table)
+        for code, value in izip(kinds, values):
+            if data_digests[value] is None:
+                kind = kind_names[code]
+                encoded = json.dumps([kind, _encode_data(kind, table[value])], ensure_ascii=False)
+                data_digests[value] = hashlib.sha1(encoded.encode('utf-8')).digest()
+
+        block_starts = array('i')
+        digests = []
+        for start, end in BlockSplitter(dtd).split(list(store)):
+            block_starts.append(start)
+            block_digest = hashlib.sha1(b''.join(data_digests[values[idx]] for idx in xrange(start, end)))
+            digests.append(block_digest.digest()[:DIGEST_SIZE])
+
+        return cls(store, block_starts, b''.join(digests), cls.scheme_of(dtd))
+
+    def get_blocks(self):
+        """
+        :return: tuple (blocks boundaries, blocks keys), see BlockDiffer.diff()
+        :rtype: tuple
+        """
+        starts = self._block_starts
+        ends = list(starts[1:]) + [len(self)]
+        digests = self._digests
+        keys = [digests[idx * DIGEST_SIZE:(idx + 1) * DIGEST_SIZE] for idx in xrange(len(starts))]
+        return zip(starts, ends), keys
+
+    def dumps(self):
+        """
+        :return: Binary form of the document, see loads()
+        :rtype: bytes
+        """
+        kinds, values, kind_names, table = self._data.arrays()
+
+        codes = [None] * len(table)
+        for code, value in izip(kinds, values):
+            codes[value] = code
+        data = json.dumps({
+            'kinds': list(kind_names),
+            'data': [_encode_data(kind_names[code], value) for code, value in izip(codes, table)],
+        }, ensure_ascii=False).encode('utf-8')
+        scheme = self.scheme.encode('utf-8')
+
+        value_size = 2 if len(table) <= 0xFFFF else 4
+        if value_size != values.itemsize:
+            values = array(_VALUES_TYPES[value_size], values)
+
+        return b''.join([
+            _HEADER.pack(MAGIC, len(kinds), len(self._block_starts), len(data), len(scheme), value_size),
+            kinds.tostring(),
+            _little_endian(values).tostring(),
+            _little_endian(self._block_starts).tostring(),
+            self._digests,
+            data,
+            scheme,
+        ])
+
+    def dump(self, fp):
+        """
+        Write binary form of the document to a binary file-like object.
+        """
+        fp.write(self.dumps())
+
+    def __reduce__(self):
+        return loads, (self.dumps(),)
+
+
+def loads(data):
+    """
+    :param data: Binary form of the document (bytes, buffer or mmap), see PreparedDocument.dumps()
+    :rtype: PreparedDocument
+    :raises ValueError: data are not prepared document of supported version
+    """
+    if len(data) < _HEADER.size or data[:len(MAGIC)] != MAGIC:
+        raise ValueError("Not a prepared document or unsupported format version")
+
+    magic, tokens, blocks, data_size, scheme_size, value_size = _HEADER.unpack(data[:_HEADER.size])
+    if value_size not in _VALUES_TYPES:
+        raise ValueError("Unsupported size of data identifiers: %d" % value_size)
+
+    offset = _HEADER.size
+    sections = []
+    for size in (tokens, tokens * value_size, blocks * 4, blocks * DIGEST_SIZE, data_size, scheme_size):
+        sections.append(data[offset:offset + size])
+        offset += size
+
+    if offset > len(data):
+        raise ValueError("Truncated prepared document")
+
+    kinds_bytes, values_bytes, starts_bytes, digests, encoded, scheme = sections
+
+    kinds = array('B')
+    kinds.fromstring(kinds_bytes)
+    values = array(_VALUES_TYPES[value_size])
+    values.fromstring(values_bytes)
+    block_starts = array('i')
+    block_starts.fromstring(starts_bytes)
+    if sys.byteorder == 'big':
+        values.byteswap()
+        block_starts.byteswap()
+    if values.typecode != 'i':
+        # the same as values of TokenStore
+        values = array('i', values)
+
+    decoded = json.loads(encoded.decode('utf-8'))
+    kind_names = [StreamEventKind(str(kind)) for kind in decoded['kinds']]
+
+    codes = [None] * len(decoded['data'])
+    for code, value in izip(kinds, values):
+        codes[value] = code
+    table = [_decode_data(kind_names[code], value) for code, value in izip(codes, decoded['data'])]
+
+    store = TokenStore.from_arrays(kinds, values, kind_names, table)
+    return PreparedDocument(store, block_starts, bytes(digests), scheme.decode('utf-8'))
+
+
+def load(source):
+    """
+    Load prepared document from a file. File is memory-mapped, its sections are copied into the tokens arrays
+    one by one, the whole file is never read into memory at once.
+
+    :param source: File path or binary file object
+    :rtype: PreparedDocument
+    """
+    if not hasattr(source, 'fileno'):
+        with open(source, 'rb') as fp:
+            return load(fp)
+
+    mapped = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        return loads(mapped)
+    finally:
+        mapped.close()
@@ -21,6 +21,14 @@ class DiffProducer(object):
     def render_formatting_insert(cls, parent_node, formatting_node):
         raise NotImplementedError()
 
+    @classmethod
+    def render_move_from(cls, node, move_id):
+        raise NotImplementedError()
+
+    @classmethod
+    def render_move_to(cls, node, move_id):
+        raise NotImplementedError()
+
     @classmethod
     def render_formatting_delete(cls, parent_node, formatting_node):
         raise NotImplementedError()
@@ -14,10 +14,13 @@ from difflib import SequenceMatcher
 from genshi.core import QName, Attrs
 
 from pyhtmldiff.dtd.const import DOMNode
-from pyhtmldiff.utils import longzip
+from pyhtmldiff.utils import LRUCache, longzip
 from .base import DiffProducer
 
 
+_MISSING = object()
+
+
 class DefaultDiffProducer(DiffProducer):
 
     diff_attrs = {
@@ -32,7 +35,57 @@ class DefaultDiffProducer(DiffProducer):
         'td': {'colspan', 'rowspan'}
     }
 
-    re_css_split = re.compile(r'''((?:[^;)"']|"[^"]*"|'[^']*'|\([^)]*\))+)''')
+    # diff markers are immutable, these are shared
+    _insert_node = DOMNode(name='ins', attrs=())
+    _delete_node = DOMNode(name='del', attrs=())
+    _formatting_insert_node = DOMNode(name='ins', attrs=(('class', "formatting"),))
+
+    re_css_split = re.compile(r'''((?:[^;()"']|"[^"]*"|'[^']*'|\([^)]*\))+)''')
+
+    # parsed attribute values are shared by many elements (e.g. the same inline style of every span),
+    # cache is cleared when it grows over the limit
+    parsed_values_cache_size = 4096
+    _parsed_values = {}
+    # equal CSS declarations and class names of all parsed values are the same objects
+    _interned = {}
+
+    # encoded diffs of attributes values pairs, see _diff_attr()
+    _attr_diffs = LRUCache(4096)
+
+    @classmethod
+    def diffed_attrs(cls, name):
+        """
+        :param name: Element local name
+        :return: Names of attributes which are diffed for given element
+        :rtype: set
+        """
+        attrs = cls.diff_attrs.get('*', frozenset())
+        if name in cls.diff_attrs:
+            attrs = attrs | cls.diff_attrs[name]
+        return attrs
+
+    @classmethod
+    def _parse_value(cls, kind, value, parser):
+        """
+        Parse attribute value, parsed values are memoized.
+
+        :param kind: Kind of the value, e.g. 'css', values of different kinds are cached separately
+        :param value: Attribute value
+        :param parser: Function returning tuple of items of given value
+        :rtype: tuple
+        """
+        key = (kind, value)
+        try:
+            return cls._parsed_values[key]
+        except KeyError:
+            pass
+
+        if len(cls._parsed_values) >= cls.parsed_values_cache_size:
+            cls._parsed_values.clear()
+            cls._interned.clear()
+
+        items = cls._parsed_values[key] = parser(value)
+        return items
 
     @classmethod
     def _diff_item_replace(cls, old_items, new_items):
@@ -47,21 +100,21 @@ class DefaultDiffProducer(DiffProducer):
 
     @classmethod
     def _diff_item_remove(cls, rule):
-        return '-{}'.format(rule)
+        return u'-{}'.format(rule)
 
     @classmethod
     def _diff_item_insert(cls, rule):
-        return '+{}'.format(rule)
+        return u'+{}'.format(rule)
 
     @classmethod
     def _diff_item_unchanged(cls, rule):
-        return ' {}'.format(rule)
+        return u' {}'.format(rule)
 
     @classmethod
     def _diff_items(cls, old_items, new_items):
         result = []
 
-        matcher = SequenceMatcher(old_items, new_items)
+        matcher = SequenceMatcher(None, old_items, new_items)
         for tag, i1, i2, j1, j2 in matcher.get_opcodes():
             if tag == 'replace':
                 result.extend(cls._diff_item_replace(old_items[i1:i2], new_items[j1:j2]))
@@ -69,7 +122,7 @@ class DefaultDiffProducer(DiffProducer):
                 for x in range(i1, i2):
                     result.append(cls._diff_item_remove(old_items[x]))
             elif tag == 'insert':
-                for x in range(i1, i2):
+                for x in range(j1, j2):
                     result.append(cls._diff_item_insert(new_items[x]))
             else:
                 for x in range(i1, i2):
@@ -89,15 +142,34 @@ class DefaultDiffProducer(DiffProducer):
         :type old_node: DOMNode
         :type new_node: DOMNode
         :rtype: basestring
-        :return: base64 encoded diff
+        :return: base64 encoded diff (UTF-8 encoded lines)
         """
-        old_value = old_node.get(attr_name)
-        new_value = new_node.get(attr_name)
+        old_value = cls._get_attr(old_node, attr_name)
+        new_value = cls._get_attr(new_node, attr_name)
 
         if old_value == new_value:
             return None
 
-        return base64.b64encode('\n'.join(differ(old_value, new_value)))
+        # the same change is usually repeated on many elements (e.g. font size of every span)
+        key = (cls, attr_name, old_value, new_value)
+        result = cls._attr_diffs.get(key)
+        if result is None:
+            diff = u'\n'.join(differ(old_value or u'', new_value or u''))
+            result = base64.b64encode(diff.encode('utf-8')).decode('ascii')
+            cls._attr_diffs.put(key, result)
+
+        return result
+
+    @staticmethod
+    def _get_attr(node, attr_name):
+        """
+        :type node: DOMNode
+        :return: Value of given attribute of the node, None if there is no such attribute
+        """
+        for name, value in node.attrs:
+            if name == attr_name:
+                return value
+        return None
 
     @classmethod
     def _get_whole_value_diff(cls, old_value, new_value):
@@ -110,40 +182,116 @@ class DefaultDiffProducer(DiffProducer):
         """
         diff = []
         if old_value == new_value:
-            return ' {}'.format(new_value),
+            return u' {}'.format(new_value),
 
         if old_value:
-            diff.append('-{}'.format(old_value))
+            diff.append(u'-{}'.format(old_value))
 
         if new_value:
-            diff.append('+{}'.format(new_value))
+            diff.append(u'+{}'.format(new_value))
 
         return tuple(diff)
 
+    @classmethod
+    def _intern(cls, item):
+        return cls._interned.setdefault(item, item)
+
     @classmethod
     def _get_css_diff(cls, old_value, new_value):
         """
         Returns diff of CSS rules (any semicolon delimited items, where semicolon is not in quotes or parenthesis).
         See re_css_split regexp for more details.
+
+        Order of declarations does not matter, these are compared by properties: unchanged and inserted
+        declarations are listed in the new order, changed ones as removed old and inserted new declaration,
+        removed declarations at the end. If a property is declared more than once (e.g. fallback values),
+        declarations are diffed as sequences.
         :param old_value:
         :param new_value:
         :return:
         """
-        old_value = cls.re_css_split.split(old_value)[1::2]
-        new_value = cls.re_css_split.split(new_value)[1::2]
-        return cls._diff_items(old_value, new_value)
+        old_rules = cls._parse_value('css', old_value, cls._split_css)
+        new_rules = cls._parse_value('css', new_value, cls._split_css)
+
+        old_properties = dict(old_rules)
+        new_properties = dict(new_rules)
+        if len(old_properties) < len(old_rules) or len(new_properties) < len(new_rules):
+            return cls._diff_items(
+                [cls._format_css_rule(rule) for rule in old_rules],
+                [cls._format_css_rule(rule) for rule in new_rules]
+            )
+
+        result = []
+        for rule in new_rules:
+            old_property_value = old_properties.get(rule[0], _MISSING)
+            if old_property_value == rule[1]:
+                result.append(cls._diff_item_unchanged(cls._format_css_rule(rule)))
+                continue
+
+            if old_property_value is not _MISSING:
+                result.append(cls._diff_item_remove(cls._format_css_rule((rule[0], old_property_value))))
+            result.append(cls._diff_item_insert(cls._format_css_rule(rule)))
+
+        for rule in old_rules:
+            if rule[0] not in new_properties:
+                result.append(cls._diff_item_remove(cls._format_css_rule(rule)))
+
+        return result
+
+    @classmethod
+    def _split_css(cls, value):
+        """
+        :return: tuple of declarations (property, value), property is lowercase, value is None if declaration
+         has no colon
+        """
+        rules = []
+        for rule in cls.re_css_split.split(value)[1::2]:
+            name, colon, rule_value = rule.partition(u':')
+            name = name.strip()
+            if not name:
+                continue
+
+            if colon:
+                rules.append(cls._intern((cls._intern(name.lower()), cls._intern(rule_value.strip()))))
+            else:
+                rules.append(cls._intern((cls._intern(name), None)))
+
+        return tuple(rules)
+
+    @staticmethod
+    def _format_css_rule(rule):
+        name, value = rule
+        return name if value is None else u'{}: {}'.format(name, value)
+
+    @classmethod
+    def _split_class(cls, value):
+        names = []
+        for name in value.split():
+            name = cls._intern(name)
+            if name not in names:
+                names.append(name)
+        return tuple(names)
 
     @classmethod
     def _get_class_diff(cls, old_value, new_value):
         """
-        Return diff of classes names (in fact any space delimited items)
+        Return diff of classes names (in fact any whitespace delimited items). Order of names does not matter:
+        unchanged and inserted names are listed in the new order, removed names at the end.
         :param old_value:
         :param new_value:
         :return:
         """
-        old_class = old_value.split(' ')
-        new_class = new_value.split(' ')
-        return cls._diff_items(old_class, new_class)
+        old_class = cls._parse_value('class', old_value, cls._split_class)
+        new_class = cls._parse_value('class', new_value, cls._split_class)
+
+        old_names = frozenset(old_class)
+        new_names = frozenset(new_class)
+        result = [
+            cls._diff_item_unchanged(name) if name in old_names else cls._diff_item_insert(name)
+            for name in new_class
+        ]
+        result.extend(cls._diff_item_remove(name) for name in old_class if name not in new_names)
+        return result
 
     @classmethod
     def _diff_attr_rowspan(cls, old_node, new_node):
@@ -210,20 +358,15 @@ class DefaultDiffProducer(DiffProducer):
         :type old_node: DOMNode
         :type new_node: DOMNode
         :rtype DOMNode:
-        :return:
+        :return: New node with x-diff-<attribute> attributes added for every changed diffed attribute
         """
+        attrs = list(new_node.attrs)
+        old_values = dict(old_node.attrs)
+        new_values = dict(attrs)
+        for attr in sorted(cls.diffed_attrs(getattr(new_node.name, 'localname', new_node.name))):
+            if old_values.get(attr) == new_values.get(attr):
+                continue
 
-        attrs_to_diff = cls.diff_attrs['*'] if '*' in cls.diff_attrs else set()
-
-        if new_node.name in cls.diff_attrs:
-            attrs_to_diff = attrs_to_diff & cls.diff_attrs[new_node.name]
-
-        result_node = DOMNode(
-            new_node.name,
-            new_node.attrs
-        )
-
-        for attr in attrs_to_diff:
             differ = getattr(cls, '_diff_attr_{}'.format(attr), None)
             if differ is None:
                 warnings.warn("No differ function defined for attribute {}".format(attr))
@@ -233,9 +376,9 @@ class DefaultDiffProducer(DiffProducer):
             if result is None:
                 continue
 
-            result_node.attrs |= [('x-diff-{}'.format(attr), result)]
+            attrs.append(('x-diff-{}'.format(attr), result))
 
-        return result_node
+        return DOMNode(new_node.name, attrs)
 
     @classmethod
     def render_formatting_delete(cls, parent_node, formatting_node):
@@ -251,23 +394,34 @@ class DefaultDiffProducer(DiffProducer):
 
     @classmethod
     def render_formatting_insert(cls, parent_node, formatting_node):
-        return DOMNode(
-            name='ins',
-            attrs=(
-                ('class', "formatting"),
-            )
-        )
+        return cls._formatting_insert_node
 
     @classmethod
     def render_delete(cls, parent_node):
-        return DOMNode(
-            name='del',
-            attrs=()
-        )
+        return cls._delete_node
 
     @classmethod
     def render_insert(cls, parent_node):
-        return DOMNode(
-            name='ins',
-            attrs=()
-        )
+        return cls._insert_node
+
+    @classmethod
+    def render_move_from(cls, node, move_id):
+        """
+        Render old position of moved block, its contents are rendered at the new position only.
+
+        :type node: DOMNode
+        :param move_id: Identifier of the move, the same for both positions of the block
+        :rtype DOMNode:
+        """
+        return DOMNode(node.name, tuple(node.attrs) + ((u'x-diff-move-from', u'%d' % move_id),))
+
+    @classmethod
+    def render_move_to(cls, node, move_id):
+        """
+        Render opening tag of moved block at its new position.
+
+        :type node: DOMNode
+        :param move_id: Identifier of the move, the same for both positions of the block
+        :rtype DOMNode:
+        """
+        return DOMNode(node.name, tuple(node.attrs) + ((u'x-diff-move-to', u'%d' % move_id),))
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+"""Created on 17.10.26
+
+.. moduleauthor:: Paweł Pecio
+"""
+import time
+
+
+class DiffStats(object):
+    """
+    Timings and counters of a single diff. Phases are:
+
+    * parse - parsing HTML (and tokenizing, if parser backend does it at once)
+    * tokenize - splitting text nodes into words (for hierarchical diff only text of changed blocks)
+    * match - matching tokens with diff engine (for hierarchical diff also splitting and matching blocks)
+      and opcodes cleanup
+    * process - processing diff operations into result events
+    * render - serializing result, only if diff was rendered by Diff
+
+    In streaming mode, processing is done while rendering, so it is measured as render phase.
+
+    Token counts are lengths of sequences passed to processing. In hierarchical diff, text of unchanged blocks
+    is not splitted into words, so there are fewer tokens than for the same documents diffed flat; counts of
+    diffs in the same mode are comparable.
+
+    Level is the degradation level of a diff with limited budget, see StreamDiffer.LEVELS: 'word' (not
+    degraded), 'block' or 'document'.
+    """
+
+    PHASES = ('parse', 'tokenize', 'match', 'process', 'render')
+
+    def __init__(self):
+        self.timings = dict((phase, 0.0) for phase in self.PHASES)
+        self.old_tokens = 0
+        self.new_tokens = 0
+        self.opcodes = {'equal': 0, 'insert': 0, 'delete': 0, 'replace': 0}
+        self.processors = 0
+        self.max_depth = 0
+        self.output_events = 0
+        self.level = 'word'
+
+    def timer(self, phase):
+        """
+        Context manager measuring time of given phase. Time is accumulated, if phase is measured many times.
+        """
+        return _Timer(self, phase)
+
+    def count_opcodes(self, opcodes):
+        counts = self.opcodes
+        for opcode in opcodes:
+            counts[opcode[0]] = counts.get(opcode[0], 0) + 1
+
+    @property
+    def total_time(self):
+        return sum(self.timings.values())
+
+    def as_dict(self):
+        return {
+            'timings': dict(self.timings),
+            'old_tokens': self.old_tokens,
+            'new_tokens': self.new_tokens,
+            'opcodes': dict(self.opcodes),
+            'processors': self.processors,
+            'max_depth': self.max_depth,
+            'output_events': self.output_events,
+            'level': self.level,
+        }
+
+    def __repr__(self):
+        return '<DiffStats %r>' % self.as_dict()
+
+
+class _Timer(object):
+
+    __slots__ = ('_stats', '_phase', '_start')
+
+    def __init__(self, stats, phase):
+        self._stats = stats
+        self._phase = phase
+        self._start = None
+
+    def __enter__(self):
+        self._start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._stats.timings[self._phase] += time.time() - self._start
+
+
+class _NullTimer(object):
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+
+_null_timer = _NullTimer()
+
+
+def timed(stats, phase):
+    """
+    Measure time of given phase, if stats are collected.
+
+    :param stats: DiffStats instance or None, when stats are not collected
+    :param phase: Phase name
+    """
+    if stats is None:
+        return _null_timer
+
+    return stats.timer(phase)
@@ -5,6 +5,8 @@
 .. moduleauthor:: Paweł Pecio
 
 """
+import threading
+from collections import OrderedDict
 
 
 def longzip(a, b):
@@ -27,3 +29,53 @@ def irepeat(a, b):
 
     for item in biter:
         yield a, item
+
+
+def strip_root(events):
+    """Like `events[1:-1]`, but works lazily on any iterable."""
+    eiter = iter(events)
+    next(eiter, None)
+
+    previous = next(eiter, None)
+    for item in eiter:
+        yield previous
+        previous = item
+
+
+class LRUCache(object):
+    """
+    Small thread safe LRU mapping, least recently used entries are evicted when it grows over the limit.
+    """
+
+    def __init__(self, max_entries):
+        """
+        :param max_entries: Maximum number of entries, 0 disables caching
+        """
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._entries.pop(key)
+            except KeyError:
+                return default
+
+            # move to the end, as most recently used
+            self._entries[key] = value
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = value
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
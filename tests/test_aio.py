@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+"""
+    Created on 17.10.26
+    @author: druid
+"""
+import threading
+import unittest
+
+from pyhtmldiff import Diff
+from pyhtmldiff.aio import AsyncDiff, asyncio
+
+
+class BlockingDiff(Diff):
+    """Diff which waits until it is released"""
+
+    def __init__(self):
+        super(BlockingDiff, self).__init__()
+        self.started = threading.Semaphore(0)
+        self.release = threading.Event()
+
+    def get_diff(self, *args, **kwargs):
+        self.started.release()
+        self.release.wait()
+        return super(BlockingDiff, self).get_diff(*args, **kwargs)
+
+
+@unittest.skipIf(asyncio is None, "asyncio is not available")
+class AsyncDiffTest(unittest.TestCase):
+
+    original = u''.join(u'<p>Paragraph %d with <b>some</b> text</p>\n' % i for i in range(100))
+    modified = original.replace(u'Paragraph 10 ', u'Paragraph ten ')
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def _run(self, awaitable):
+        return self.loop.run_until_complete(awaitable)
+
+    def _consume(self, iterator):
+        """Consume asynchronous iterator, without async syntax"""
+        chunks = []
+        while True:
+            try:
+                chunks.append(self._run(iterator.__anext__()))
+            except StopAsyncIteration:  # noqa: F821, python 3 only
+                return chunks
+
+    def test_get_html_diff(self):
+        differ = AsyncDiff(workers=2)
+        try:
+            result = self._run(asyncio.gather(
+                differ.get_html_diff(self.original, self.modified),
+                differ.get_html_diff(self.original, self.modified, max_tokens=10),
+            ))
+        finally:
+            differ.close()
+
+        self.assertEqual([
+            Diff().get_html_diff(self.original, self.modified),
+            Diff().get_html_diff(self.original, self.modified, max_tokens=10),
+        ], result)
+
+    def test_processes(self):
+        differ = AsyncDiff(workers=1, processes=True)
+        try:
+            result = self._run(differ.get_html_diff(self.original, self.modified))
+            chunks = self._consume(differ.iter_diff(self.original, self.modified, chunk_size=100))
+        finally:
+            differ.close()
+
+        self.assertEqual(Diff().get_html_diff(self.original, self.modified), result)
+        self.assertEqual(result, u''.join(chunks))
+
+    def test_concurrency_limit(self):
+        blocking = BlockingDiff()
+        differ = AsyncDiff(blocking, workers=2, max_concurrency=1)
+        try:
+            first = differ.get_html_diff(self.original, self.modified)
+            second = differ.get_html_diff(self.original, self.modified)
+            blocking.started.acquire()
+            self.assertEqual((1, 1), (differ.running, differ.pending))
+
+            # queued diff is cancelled without reaching the executor
+            second.cancel()
+            blocking.release.set()
+            self._run(first)
+            self._run(asyncio.sleep(0))
+            self.assertEqual((0, 0), (differ.running, differ.pending))
+            self.assertTrue(second.cancelled())
+        finally:
+            blocking.release.set()
+            differ.close()
+
+    def test_error(self):
+        differ = AsyncDiff(workers=1)
+        try:
+            self.assertRaises(ValueError, self._run, differ.get_html_diff(self.original, self.modified, format='foo'))
+        finally:
+            differ.close()
+
+    def test_iter_diff(self):
+        differ = AsyncDiff(workers=1)
+        try:
+            chunks = self._consume(differ.iter_diff(self.original, self.modified, chunk_size=100))
+        finally:
+            differ.close()
+
+        self.assertGreater(len(chunks), 10)
+        self.assertEqual(Diff().get_html_diff(self.original, self.modified), u''.join(chunks))
+
+    def test_iter_diff_closed(self):
+        differ = AsyncDiff(workers=1)
+        try:
+            chunks = differ.iter_diff(self.original, self.modified, chunk_size=10, max_buffered=1)
+            self.assertTrue(self._run(chunks.__anext__()))
+            self._run(chunks.aclose())
+
+            # producer stopped, so the slot is free again
+            self.assertEqual(
+                Diff().get_html_diff(self.original, self.modified),
+                self._run(differ.get_html_diff(self.original, self.modified))
+            )
+            self.assertEqual(0, differ.running)
+        finally:
+            differ.close()
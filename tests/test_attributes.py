@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+
+"""
+    Created on 17.10.26
+    @author: druid
+"""
+import base64
+import unittest
+
+from genshi.core import START, Attrs, QName
+
+from pyhtmldiff import Diff
+from pyhtmldiff.differ.tokens import AttributesTokenTable, TokenTable
+from pyhtmldiff.dtd.const import DOMNode
+from pyhtmldiff.producer.standard import DefaultDiffProducer
+
+
+def _start(name, **attrs):
+    return START, (QName('http://www.w3.org/1999/xhtml}' + name), Attrs(
+        (QName(attr), value) for attr, value in sorted(attrs.items())
+    )), (None, -1, -1)
+
+
+def _decode(value):
+    return base64.b64decode(value).decode('utf-8').split(u'\n')
+
+
+class SameOpeningNodeTest(unittest.TestCase):
+
+    def test_style(self):
+        node = DefaultDiffProducer.same_opening_node(
+            DOMNode('span', [('style', u'font-size: 10pt;color: red')]),
+            DOMNode('span', [('style', u'font-size: 12pt;color: red')]),
+        )
+        self.assertEqual('span', node.name)
+        attrs = dict(node.attrs)
+        self.assertEqual(u'font-size: 12pt;color: red', attrs['style'])
+        self.assertEqual([u'-font-size: 10pt', u'+font-size: 12pt', u' color: red'], _decode(attrs['x-diff-style']))
+
+    def test_common_and_element_attributes(self):
+        self.assertEqual({'style', 'class'}, DefaultDiffProducer.diffed_attrs('span'))
+        self.assertEqual({'style'}, DefaultDiffProducer.diffed_attrs('a'))
+
+        node = DefaultDiffProducer.same_opening_node(
+            DOMNode('span', [('class', u'big'), ('style', u'color: red')]),
+            DOMNode('span', [('class', u'big bold'), ('style', u'color: red')]),
+        )
+        attrs = dict(node.attrs)
+        self.assertNotIn('x-diff-style', attrs)
+        self.assertEqual([u' big', u'+bold'], _decode(attrs['x-diff-class']))
+
+    def test_added_attribute(self):
+        node = DefaultDiffProducer.same_opening_node(
+            DOMNode('td', []),
+            DOMNode('td', [('colspan', u'2')]),
+        )
+        self.assertEqual([u'+2'], _decode(dict(node.attrs)['x-diff-colspan']))
+
+    def test_css_order_insensitive(self):
+        diff = DefaultDiffProducer._get_css_diff(
+            u'color: red; font-size: 10pt; margin: 0',
+            u'FONT-SIZE:10pt;color:blue;width: url("a;b")'
+        )
+        self.assertEqual(
+            [u' font-size: 10pt', u'-color: red', u'+color: blue', u'+width: url("a;b")', u'-margin: 0'],
+            diff
+        )
+        self.assertEqual([u' margin: 0', u' color: red'], DefaultDiffProducer._get_css_diff(
+            u'color: red; margin: 0', u'margin: 0; color: red;'
+        ))
+
+    def test_css_repeated_property(self):
+        # fallback declarations are order sensitive
+        self.assertEqual(
+            [u' background: red', u'-background: rgba(0, 0, 0, 0.5)', u'+background: rgba(0, 0, 0, 0.7)'],
+            DefaultDiffProducer._get_css_diff(
+                u'background: red; background: rgba(0, 0, 0, 0.5)',
+                u'background: red; background: rgba(0, 0, 0, 0.7)'
+            )
+        )
+
+    def test_class_order_insensitive(self):
+        self.assertEqual([u' b', u' a'], DefaultDiffProducer._get_class_diff(u'a  b', u'b a'))
+        self.assertEqual([u' b', u'+c', u'-a'], DefaultDiffProducer._get_class_diff(u'a b', u'b c'))
+
+    def test_attr_diff_memoized(self):
+        old = DOMNode('span', [('style', u'color: red')])
+        new = DOMNode('span', [('style', u'color: blue')])
+        first = DefaultDiffProducer.same_opening_node(old, new)
+
+        DefaultDiffProducer._parsed_values.clear()
+        self.assertEqual(first, DefaultDiffProducer.same_opening_node(old, new))
+        # diff was not calculated again
+        self.assertEqual({}, DefaultDiffProducer._parsed_values)
+
+    def test_parsed_values_cached(self):
+        DefaultDiffProducer._parsed_values.clear()
+        DefaultDiffProducer._attr_diffs.clear()
+        old = DOMNode('span', [('style', u'color: red')])
+        for size in range(10):
+            DefaultDiffProducer.same_opening_node(old, DOMNode('span', [('style', u'color: red;width: 1px')]))
+        self.assertEqual(2, len(DefaultDiffProducer._parsed_values))
+
+
+class AttributesTokenTableTest(unittest.TestCase):
+
+    def test_diffed_attributes_ignored(self):
+        table = AttributesTokenTable(DefaultDiffProducer)
+        self.assertEqual(
+            table.get_id(_start('span', style=u'color: red')),
+            table.get_id(_start('span', style=u'color: blue'))
+        )
+        self.assertEqual(table.get_id(_start('p', id=u'x')), table.get_id(_start('p', id=u'x', style=u'color: red')))
+        self.assertNotEqual(table.get_id(_start('a', href=u'x')), table.get_id(_start('a', href=u'y')))
+        self.assertNotEqual(table.get_id(_start('p')), table.get_id(_start('span')))
+
+        table = TokenTable()
+        self.assertNotEqual(
+            table.get_id(_start('span', style=u'color: red')),
+            table.get_id(_start('span', style=u'color: blue'))
+        )
+
+
+class DiffAttributesTest(unittest.TestCase):
+
+    original = (
+        u'<p>Some <span style="font-size: 10pt;color: red">styled text</span> here</p>'
+        u'<p class="lead">Zażółć</p><table><tr><td colspan="2">cell</td></tr></table>'
+    )
+    modified = (
+        u'<p>Some <span style="font-size: 12pt;color: red">styled text</span> here</p>'
+        u'<p class="lead wide">Zażółć gęślą</p><table><tr><td colspan="3">cell</td></tr></table>'
+    )
+
+    def test_changed_attributes(self):
+        for hierarchical in (False, True):
+            result = Diff(diff_attributes=True, hierarchical=hierarchical).get_html_diff(self.original, self.modified)
+            self.assertEqual(
+                u'<p>Some <span style="font-size: 12pt;color: red" x-diff-style="%s">styled text</span> here</p>'
+                u'<p class="lead wide" x-diff-class="%s">Zażółć<ins> gęślą</ins></p>'
+                u'<table><tbody><tr><td colspan="3" x-diff-colspan="%s">cell</td></tr></tbody></table>' % (
+                    base64.b64encode(b'-font-size: 10pt\n+font-size: 12pt\n color: red').decode('ascii'),
+                    base64.b64encode(b' lead\n+wide').decode('ascii'),
+                    base64.b64encode(b'-2\n+3').decode('ascii'),
+                ),
+                result
+            )
+
+    def test_unchanged(self):
+        self.assertEqual(
+            Diff().get_html_diff(self.original, self.original),
+            Diff(diff_attributes=True).get_html_diff(self.original, self.original)
+        )
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+
+"""
+    Created on 17.10.26
+    @author: druid
+"""
+import unittest
+
+from pyhtmldiff import Diff
+from pyhtmldiff.batch import BatchItemError, _load_differ, _pickle_differ
+
+
+class BatchDiffTest(unittest.TestCase):
+
+    pairs = [
+        (u'<p>My text</p>', u'<p>My changed text</p>'),
+        (u'<p>My text to remove</p>', u'<p>My text remove</p>'),
+        (u'<p>Same</p>', u'<p>Same</p>'),
+    ] * 3
+
+    def _expected(self):
+        differ = Diff()
+        return [differ.get_html_diff(a, b) for a, b in self.pairs]
+
+    def test_order_preserved(self):
+        self.assertEqual(self._expected(), Diff().get_html_diff_many(self.pairs, workers=2, chunksize=2))
+
+    def test_current_process(self):
+        self.assertEqual(self._expected(), Diff().get_html_diff_many(self.pairs, workers=0))
+
+    def test_lazy(self):
+        results = Diff().iter_html_diff_many(iter(self.pairs), workers=2)
+        self.assertEqual(self._expected()[0], next(results))
+        results.close()
+
+    def test_item_error(self):
+        pairs = [self.pairs[0], (42, u'<p>Foo</p>'), self.pairs[1]]
+        for workers in (0, 2):
+            results = Diff().get_html_diff_many(pairs, workers=workers)
+            self.assertEqual(self._expected()[:2], [results[0], results[2]])
+            self.assertIsInstance(results[1], BatchItemError)
+            self.assertEqual(1, results[1].index)
+
+    def test_unpicklable(self):
+        differ = Diff(instrument=lambda stats: None)
+        self.assertRaises(TypeError, differ.get_html_diff_many, self.pairs, workers=1)
+        self.assertEqual(self._expected(), differ.get_html_diff_many(self.pairs, workers=0))
+
+    def test_differ_loaded_once(self):
+        key, data = _pickle_differ(Diff())
+        self.assertIs(_load_differ(key, data), _load_differ(key, data))
+        self.assertIsNot(_load_differ(key, data), _load_differ(_pickle_differ(Diff())[0], data))
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+"""
+    Created on 17.10.26
+    @author: druid
+"""
+import os
+import unittest
+
+from benchmarks.attributes import PRODUCERS, measure as measure_attributes, styled_elements
+from benchmarks.corpus import CORPUS
+from benchmarks.run import PHASES, compare, run
+
+
+class BenchmarksTest(unittest.TestCase):
+
+    def test_corpus_deterministic(self):
+        for name, generator in CORPUS:
+            self.assertEqual(generator(1), generator(1), name)
+
+    def _run(self, **options):
+        log = open(os.devnull, 'w')
+        self.addCleanup(log.close)
+        return run(repeat=1, cases=['few_big_edits'], log=log, **options)
+
+    def test_run_and_compare(self):
+        report = self._run()
+        result = report['results']['few_big_edits']
+        for phase in PHASES:
+            self.assertGreaterEqual(result[phase]['time'], 0)
+            self.assertGreaterEqual(result[phase]['peak_memory'], 0)
+
+        # documents are parsed in the measured process
+        self.assertGreater(result['parse']['peak_memory'], 0)
+        self.assertEqual([], compare(report, report, 1.0))
+
+        slower = {'results': {'few_big_edits': dict(
+            (phase, {'time': result[phase]['time'] * 2 + 1}) for phase in PHASES
+        )}}
+        self.assertEqual(len(PHASES), len(compare(slower, report, 1.5)))
+
+        bigger = {'results': {'few_big_edits': dict(
+            (phase, {'time': 0, 'peak_memory': 1024 ** 3}) for phase in PHASES
+        )}}
+        regressions = compare(bigger, report, 1.5)
+        self.assertTrue(regressions)
+        self.assertEqual(set(['peak_memory']), set(metric for _, _, metric, _, _ in regressions))
+
+    def test_diff_options(self):
+        report = self._run(hierarchical=True, cache=True)
+        self.assertEqual({'hierarchical': True, 'cache': True}, report['meta']['options'])
+        self.assertIn('few_big_edits', report['results'])
+
+    def test_attributes(self):
+        pairs = styled_elements(100)
+        for name, producer in PRODUCERS:
+            self.assertEqual(
+                [dict(producer.same_opening_node(old, new).attrs).keys() for old, new in pairs],
+                [dict(PRODUCERS[0][1].same_opening_node(old, new).attrs).keys() for old, new in pairs],
+            )
+        self.assertEqual(set(name for name, _ in PRODUCERS), set(measure_attributes(pairs, repeat=1)))
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+"""
+    Created on 17.10.26
+    @author: druid
+"""
+import unittest
+
+from genshi.core import TEXT
+
+from pyhtmldiff import Diff
+from pyhtmldiff.differ.block import BlockDiffer, BlockSplitter
+
+
+class BlockSplitterTest(unittest.TestCase):
+
+    def _split(self, html):
+        events = list(Diff.parse_html(html))
+        return [
+            u''.join(e[1] for e in events[start:end] if e[0] == TEXT)
+            for start, end in BlockSplitter().split(events)
+        ]
+
+    def test_paragraphs(self):
+        self.assertEqual(
+            [u'', u'Foo bar', u'\n', u'Baz', u''],
+            self._split(u'<p>Foo <b>bar</b></p>\n<p>Baz</p>')
+        )
+
+    def test_step_inside(self):
+        # table, its body and rows are containers, each cell is a block
+        self.assertEqual(
+            [u'', u'', u'', u'', u'1', u'2', u'', u'', u'', u''],
+            self._split(u'<table><tr><td>1</td><td>2</td></tr></table>')
+        )
+
+    def test_wrapped(self):
+        # elements holding paragraphs are containers, each paragraph is a block
+        self.assertEqual(
+            [u'', u'', u'', u'Foo bar', u'Baz', u'', u'Qux', u'', u''],
+            self._split(u'<section><div><p>Foo <b>bar</b></p><p>Baz</p></div><p>Qux</p></section>')
+        )
+
+
+class BlockDifferTest(unittest.TestCase):
+
+    original = u'<p>First paragraph</p>\n<p>My text</p>\n<ul><li>One item</li><li>Two</li></ul>'
+    modified = u'<p>First paragraph</p>\n<p>My changed text</p>\n<ul><li>One item</li><li>Three</li></ul>'
+
+    def test_unchanged_blocks_not_splitted(self):
+        old, new, opcodes = BlockDiffer().diff(
+            list(Diff.parse_html(self.original)), list(Diff.parse_html(self.modified))
+        )
+        texts = [e[1] for e in new if e[0] == TEXT]
+        self.assertIn(u'First paragraph', texts)
+        self.assertIn(u'One item', texts)
+        self.assertIn(u' changed', texts)
+
+    def test_wrapped_unchanged_blocks_not_splitted(self):
+        old, new, opcodes = BlockDiffer().diff(
+            list(Diff.parse_html(u'<article>%s</article>' % self.original)),
+            list(Diff.parse_html(u'<article>%s</article>' % self.modified))
+        )
+        texts = [e[1] for e in new if e[0] == TEXT]
+        self.assertIn(u'First paragraph', texts)
+        self.assertIn(u' changed', texts)
+
+    def test_same_as_flat(self):
+        self.assertEqual(
+            Diff().get_html_diff(self.original, self.modified),
+            Diff(hierarchical=True).get_html_diff(self.original, self.modified)
+        )
+
+    def test_identical(self):
+        self.assertEqual(
+            self.original,
+            Diff(hierarchical=True).get_html_diff(self.original, self.original)
+        )
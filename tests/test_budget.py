@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+
+"""
+    Created on 17.10.26
+    @author: druid
+"""
+import unittest
+
+from pyhtmldiff import Diff
+
+
+class BudgetTest(unittest.TestCase):
+
+    original = u'<p>My text</p><ul><li>first item</li><li>second item</li></ul>'
+    modified = u'<p>My new text</p><ul><li>first item</li><li>third item</li></ul>'
+
+    word_diff = (
+        u'<p>My<ins> new</ins> text</p>'
+        u'<ul><li>first item</li><li><del>second</del><ins>third</ins> item</li></ul>'
+    )
+    block_diff = (
+        u'<p><del>My text</del></p><p><ins>My new text</ins></p>'
+        u'<ul><li>first item</li><li><del>second item</del></li><li><ins>third item</ins></li></ul>'
+    )
+    document_diff = (
+        u'<p><del>My text</del></p><ul><li><del>first item</del></li><li><del>second item</del></li></ul>'
+        u'<p><ins>My new text</ins></p><ul><li><ins>first item</ins></li><li><ins>third item</ins></li></ul>'
+    )
+
+    def _diff(self, **kwargs):
+        for hierarchical in (False, True):
+            for streaming in (False, True):
+                collected = []
+                differ = Diff(instrument=collected.append, hierarchical=hierarchical, streaming=streaming)
+                result = differ.get_html_diff(self.original, self.modified, **kwargs)
+                yield result, collected[0].level
+
+    def test_not_exceeded(self):
+        for result, level in self._diff(deadline=60, max_tokens=1000):
+            self.assertEqual(self.word_diff, result)
+            self.assertEqual('word', level)
+
+    def test_too_many_words(self):
+        for result, level in self._diff(max_tokens=20):
+            self.assertEqual(self.block_diff, result)
+            self.assertEqual('block', level)
+
+    def test_too_many_blocks(self):
+        for result, level in self._diff(max_tokens=3):
+            self.assertEqual(self.document_diff, result)
+            self.assertEqual('document', level)
+
+    def test_deadline_exceeded(self):
+        for result, level in self._diff(deadline=-1):
+            self.assertEqual(self.document_diff, result)
+            self.assertEqual('document', level)
+
+    def test_identical(self):
+        collected = []
+        differ = Diff(instrument=collected.append)
+        self.assertEqual(self.original, differ.get_html_diff(self.original, self.original, deadline=-1, max_tokens=0))
+        self.assertEqual('word', collected[0].level)
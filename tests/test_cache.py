@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+"""
+    Created on 17.10.26
+    @author: druid
+"""
+import pickle
+import unittest
+
+from pyhtmldiff import Diff
+from pyhtmldiff.cache import ParsedDocumentCache
+
+
+class ParsedDocumentCacheTest(unittest.TestCase):
+
+    def test_lru_entries(self):
+        cache = ParsedDocumentCache(max_entries=2, sizeof=len)
+        cache.put('a', 'x')
+        cache.put('b', 'x')
+        self.assertEqual('x', cache.get('a'))
+        cache.put('c', 'x')
+
+        # b was least recently used
+        self.assertNotIn('b', cache)
+        self.assertIn('a', cache)
+        self.assertIn('c', cache)
+        self.assertEqual(1, cache.evictions)
+
+    def test_bytes_budget(self):
+        cache = ParsedDocumentCache(max_entries=None, max_bytes=10, sizeof=len)
+        cache.put('a', 'xxxx')
+        cache.put('b', 'xxxx')
+        cache.put('c', 'xxxx')
+        self.assertEqual(['b', 'c'], [k for k in ('a', 'b', 'c') if k in cache])
+        self.assertEqual(8, cache.size)
+
+        # too big to be cached at all
+        cache.put('d', 'x' * 11)
+        self.assertNotIn('d', cache)
+
+    def test_counters(self):
+        cache = ParsedDocumentCache(sizeof=len)
+        self.assertEqual([u'foo'], cache.get_or_create(u'foo', lambda html: [html]))
+        self.assertEqual([u'foo'], cache.get_or_create(u'foo', lambda html: []))
+        self.assertEqual({'entries': 1, 'bytes': 1, 'hits': 1, 'misses': 1, 'evictions': 0}, cache.stats())
+
+    def test_pickled_empty(self):
+        cache = ParsedDocumentCache(max_entries=5)
+        cache.put('a', [])
+        copy = pickle.loads(pickle.dumps(cache))
+        self.assertEqual(0, len(copy))
+        self.assertEqual(5, copy.max_entries)
+
+
+class CachedDiffTest(unittest.TestCase):
+
+    def test_revisions(self):
+        versions = [u'<p>My text</p>', u'<p>My changed text</p>', u'<p>My changed text again</p>']
+        cache = ParsedDocumentCache()
+        differ = Diff(cache=cache)
+
+        for a, b in zip(versions, versions[1:]):
+            self.assertEqual(Diff().get_html_diff(a, b), differ.get_html_diff(a, b))
+
+        self.assertEqual(3, len(cache))
+        self.assertEqual(1, cache.hits)
+        self.assertEqual(3, cache.misses)
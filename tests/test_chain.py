@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+"""
+    Created on 17.10.26
+    @author: druid
+"""
+import types
+import unittest
+
+from pyhtmldiff import Diff
+
+
+class DiffChainTest(unittest.TestCase):
+
+    versions = [
+        u'<p>My text</p>',
+        u'<p>My changed text</p>',
+        u'<p>My text</p><p>Second</p>',
+        u'<p>My text</p><p>Second paragraph</p>',
+    ]
+
+    def _expected(self, differ):
+        return [differ.get_html_diff(a, b) for a, b in zip(self.versions, self.versions[1:])]
+
+    def test_chain(self):
+        for differ in (Diff(), Diff(hierarchical=True), Diff(streaming=True)):
+            self.assertEqual(self._expected(differ), list(differ.diff_chain(self.versions)))
+
+    def test_parsed_once(self):
+        parsed = []
+
+        class CountingDiff(Diff):
+            @classmethod
+            def parse_html(cls, html_string):
+                parsed.append(html_string)
+                return super(CountingDiff, cls).parse_html(html_string)
+
+        result = CountingDiff().diff_chain(iter(self.versions))
+        self.assertIsInstance(result, types.GeneratorType)
+        self.assertEqual(3, len(list(result)))
+        self.assertEqual(self.versions, parsed)
+
+    def test_single_version(self):
+        self.assertEqual([], list(Diff().diff_chain(self.versions[:1])))
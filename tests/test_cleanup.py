@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+"""
+    Created on 17.10.26
+    @author: druid
+"""
+import pickle
+import unittest
+
+from genshi.core import TEXT
+
+from pyhtmldiff import Diff
+from pyhtmldiff.differ.cleanup import SemanticCleanup, get_cleanup
+from pyhtmldiff.differ.engine import get_engine
+from pyhtmldiff.differ.tokens import TokenTable
+
+
+POS = (None, -1, -1)
+
+
+def _words(*words):
+    return [(TEXT, word, POS) for word in words]
+
+
+class SemanticCleanupTest(unittest.TestCase):
+
+    def _cleanup(self, old, new, cleanup=None):
+        table = TokenTable()
+        opcodes = get_engine().get_opcodes(table.intern(old), table.intern(new))
+        return (cleanup or SemanticCleanup()).cleanup(old, new, opcodes)
+
+    def test_short_equality_merged(self):
+        old = _words(u'My', u' old', u' text')
+        new = _words(u'Your', u' old', u' essay')
+        self.assertEqual([('delete', 0, 3, 0, 0), ('insert', 3, 3, 0, 3)], self._cleanup(old, new))
+
+    def test_long_equality_kept(self):
+        old = _words(u'A', u' very long unchanged words', u' B')
+        new = _words(u'C', u' very long unchanged words', u' D')
+        self.assertEqual([
+            ('delete', 0, 1, 0, 0), ('insert', 1, 1, 0, 1),
+            ('equal', 1, 2, 1, 2),
+            ('delete', 2, 3, 2, 2), ('insert', 3, 3, 2, 3),
+        ], self._cleanup(old, new))
+
+    def test_thresholds(self):
+        old = _words(u'My', u' old', u' text')
+        new = _words(u'Your', u' old', u' essay')
+        opcodes = self._cleanup(old, new, SemanticCleanup(max_length=2))
+        self.assertIn(('equal', 1, 2, 1, 2), opcodes)
+
+        opcodes = self._cleanup(old, new, SemanticCleanup(ratio=0.5))
+        self.assertIn(('equal', 1, 2, 1, 2), opcodes)
+
+    def test_tags_kept(self):
+        old = list(Diff.parse_html(u'<p>Foo</p><p>Bar</p>'))
+        new = list(Diff.parse_html(u'<p>Baz</p><p>Qux</p>'))
+        for tag, i1, i2, j1, j2 in self._cleanup(old, new):
+            if tag != 'equal':
+                self.assertTrue(all(event[0] == TEXT for event in old[i1:i2] + new[j1:j2]))
+
+    def test_get_cleanup(self):
+        self.assertIsNone(get_cleanup())
+        self.assertIsInstance(get_cleanup('semantic'), SemanticCleanup)
+        cleanup = SemanticCleanup(ratio=2)
+        self.assertIs(cleanup, get_cleanup(cleanup))
+        self.assertRaises(ValueError, get_cleanup, 'unknown')
+
+
+class DiffCleanupTest(unittest.TestCase):
+
+    original = u'<p>The cat sat on the mat near a door and the dog ran to the yard.</p>'
+    modified = u'<p>One bird flew over the hill past a tree then the fox went to the big red barn.</p>'
+
+    def test_fewer_markers(self):
+        fragmented = Diff().get_html_diff(self.original, self.modified)
+        cleaned = Diff(cleanup='semantic').get_html_diff(self.original, self.modified)
+        self.assertEqual(
+            u'<p><del>The cat sat on the mat near a door and the dog ran to the yard.</del>'
+            u'<ins>One bird flew over the hill past a tree then the fox went to the big red barn.</ins></p>',
+            cleaned
+        )
+        self.assertLess(cleaned.count(u'<ins>'), fragmented.count(u'<ins>'))
+
+    def test_unchanged_text_kept(self):
+        original = u'<p>Some long unchanged sentence here. My old text.</p>'
+        modified = u'<p>Some long unchanged sentence here. Your new essay.</p>'
+        self.assertEqual(
+            u'<p>Some long unchanged sentence here.<del> My old text.</del><ins> Your new essay.</ins></p>',
+            Diff(cleanup='semantic').get_html_diff(original, modified)
+        )
+
+    def test_picklable(self):
+        differ = pickle.loads(pickle.dumps(Diff(cleanup=SemanticCleanup(ratio=2))))
+        self.assertEqual(
+            Diff(cleanup=SemanticCleanup(ratio=2)).get_html_diff(self.original, self.modified),
+            differ.get_html_diff(self.original, self.modified)
+        )
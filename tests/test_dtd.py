@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+
+"""
+    Created on 17.10.26
+    @author: druid
+"""
+import pickle
+import unittest
+import warnings
+
+from genshi.core import QName
+
+from pyhtmldiff import Diff, register_dtd
+from pyhtmldiff.dtd.compiled import CompiledDTD, get_dtd
+from pyhtmldiff.dtd.const import DiffBehaviour
+from pyhtmldiff.dtd.html5 import Html5Definition
+
+
+def _tag(name):
+    return QName('http://www.w3.org/1999/xhtml}' + name)
+
+
+class ComponentsDefinition(Html5Definition):
+
+    DIFF_TYPE = dict(Html5Definition.DIFF_TYPE, **{
+        'x-chart': DiffBehaviour.internally,
+    })
+
+
+class CompiledDTDTest(unittest.TestCase):
+
+    def test_same_as_definition(self):
+        dtd = CompiledDTD()
+        for name, diff_type in Html5Definition.DIFF_TYPE.items():
+            self.assertEqual(str(diff_type), str(dtd.get_diff_type(_tag(name))))
+            self.assertEqual(diff_type == DiffBehaviour.internally, dtd.can_contain_diff(_tag(name)))
+            self.assertEqual(name in Html5Definition.BLOCK_ELEMENTS, dtd.is_block(_tag(name)))
+
+        self.assertIsNone(dtd.get_diff_type(_tag('unknown')))
+        self.assertTrue(dtd.can_contain_diff(None))
+        self.assertTrue(dtd.is_block(None))
+
+    def test_tag_ids(self):
+        dtd = CompiledDTD()
+        dtd.intern_tags([_tag('p'), _tag('b'), _tag('p')])
+        self.assertEqual(3, len(dtd))
+        self.assertEqual(dtd.tag_id(_tag('p')), dtd.tag_id(_tag('p')))
+        self.assertNotEqual(dtd.tag_id(_tag('p')), dtd.tag_id(_tag('b')))
+        self.assertEqual(CompiledDTD.ROOT_ID, dtd.tag_id(None))
+
+    def test_no_warnings(self):
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            CompiledDTD().get_diff_type(_tag('p'))
+        self.assertEqual([], caught)
+
+    def test_get_dtd(self):
+        self.assertIs(get_dtd(), get_dtd('html5'))
+        self.assertIs(get_dtd(ComponentsDefinition), get_dtd(ComponentsDefinition))
+        self.assertRaises(ValueError, get_dtd, 'unknown')
+
+    def test_pickle(self):
+        dtd = pickle.loads(pickle.dumps(get_dtd(ComponentsDefinition)))
+        self.assertIs(ComponentsDefinition, dtd.definition)
+        self.assertEqual(DiffBehaviour.internally.name, dtd.get_diff_type(_tag('x-chart')).name)
+
+        # Diff instances are sent to worker processes
+        pickle.dumps(Diff(dtd=ComponentsDefinition))
+
+
+class CustomDTDTest(unittest.TestCase):
+
+    original = u'<p>Sales <x-chart>10 20 30</x-chart></p>'
+    modified = u'<p>Sales <x-chart>10 25 30</x-chart></p>'
+
+    def test_custom_element(self):
+        # unknown element cannot contain diff tags, so its changes are not marked
+        self.assertEqual(
+            u'<p>Sales <x-chart>10 25 30</x-chart></p>',
+            Diff().get_html_diff(self.original, self.modified)
+        )
+
+        register_dtd('components', ComponentsDefinition)
+        expected = u'<p>Sales <x-chart>10<del> 20</del><ins> 25</ins> 30</x-chart></p>'
+        self.assertEqual(expected, Diff(dtd='components').get_html_diff(self.original, self.modified))
+        self.assertEqual(expected, Diff(dtd=ComponentsDefinition).get_html_diff(self.original, self.modified))
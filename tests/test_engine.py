@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+
+"""
+    Created on 17.10.26
+    @author: druid
+"""
+import random
+import time
+import unittest
+from difflib import SequenceMatcher
+
+from pyhtmldiff import Diff
+from pyhtmldiff.differ.engine import BudgetExceeded, MyersEngine, HistogramEngine, SequenceMatcherEngine, \
+    get_engine, trimmed_opcodes
+from pyhtmldiff.parser import Html5libBackend
+
+
+class EngineTestMixin(object):
+
+    engine = None
+
+    def _apply(self, a, b, opcodes):
+        """Rebuild B from A using opcodes, check opcodes continuity on the way"""
+        result = []
+        i = j = 0
+        for tag, i1, i2, j1, j2 in opcodes:
+            self.assertEqual((i, j), (i1, j1))
+            if tag == 'equal':
+                self.assertEqual(a[i1:i2], b[j1:j2])
+                result.extend(a[i1:i2])
+            elif tag == 'delete':
+                self.assertEqual(j1, j2)
+            else:
+                result.extend(b[j1:j2])
+            i, j = i2, j2
+
+        self.assertEqual((i, j), (len(a), len(b)))
+        return result
+
+    def _check(self, a, b):
+        opcodes = self.engine.get_opcodes(a, b)
+        self.assertEqual(list(b), self._apply(a, b, opcodes))
+        return opcodes
+
+    def test_empty(self):
+        self.assertEqual([], self._check([], []))
+        self.assertEqual([('insert', 0, 0, 0, 2)], self._check([], [1, 2]))
+        self.assertEqual([('delete', 0, 2, 0, 0)], self._check([1, 2], []))
+
+    def test_identical(self):
+        self.assertEqual([('equal', 0, 3, 0, 3)], self._check('abc', 'abc'))
+
+    def test_nothing_common(self):
+        self.assertEqual([('replace', 0, 3, 0, 2)], self._check('abc', 'xy'))
+
+    def test_random(self):
+        rnd = random.Random(1)
+        for _ in range(200):
+            a = [rnd.choice('abcde') for _ in range(rnd.randint(0, 40))]
+            b = list(a)
+            for _ in range(rnd.randint(0, 6)):
+                pos = rnd.randint(0, len(b))
+                if b and rnd.random() < 0.5:
+                    del b[pos:pos + rnd.randint(1, 4)]
+                else:
+                    b[pos:pos] = [rnd.choice('abcdef') for _ in range(rnd.randint(1, 4))]
+            self._check(a, b)
+
+    def test_deadline(self):
+        a, b = 'abcdef', 'abXdYf'
+        self.assertRaises(BudgetExceeded, self.engine.get_opcodes, a, b, time.time() - 1)
+        self.assertEqual(self.engine.get_opcodes(a, b), self.engine.get_opcodes(a, b, time.time() + 60))
+
+
+class MyersEngineTest(EngineTestMixin, unittest.TestCase):
+
+    engine = MyersEngine()
+
+    def test_minimal(self):
+        # Myers algorithm finds the longest common subsequence
+        rnd = random.Random(2)
+        for _ in range(100):
+            a = [rnd.choice('abc') for _ in range(rnd.randint(0, 20))]
+            b = [rnd.choice('abc') for _ in range(rnd.randint(0, 20))]
+            opcodes = self._check(a, b)
+            lcs = sum(i2 - i1 for tag, i1, i2, j1, j2 in opcodes if tag == 'equal')
+            self.assertEqual(self._lcs_length(a, b), lcs)
+
+    @staticmethod
+    def _lcs_length(a, b):
+        row = [0] * (len(b) + 1)
+        for x in a:
+            prev = 0
+            for j, y in enumerate(b):
+                prev, row[j + 1] = row[j + 1], prev + 1 if x == y else max(row[j + 1], row[j])
+        return row[-1]
+
+
+class HistogramEngineTest(EngineTestMixin, unittest.TestCase):
+
+    engine = HistogramEngine()
+
+
+class SequenceMatcherEngineTest(EngineTestMixin, unittest.TestCase):
+
+    engine = SequenceMatcherEngine()
+
+    def test_same_as_difflib(self):
+        a, b = 'private Thread currentThread;', 'private volatile Thread currentThread;'
+        self.assertEqual(SequenceMatcher(None, a, b).get_opcodes(), self.engine.get_opcodes(a, b))
+
+
+class RecordingEngine(SequenceMatcherEngine):
+
+    def __init__(self):
+        super(RecordingEngine, self).__init__()
+        self.calls = []
+
+    def get_opcodes(self, a, b, deadline=None):
+        self.calls.append((a, b))
+        return super(RecordingEngine, self).get_opcodes(a, b, deadline)
+
+
+class CountingParser(Html5libBackend):
+
+    calls = 0
+
+    def tokenize(self, html_string):
+        self.calls += 1
+        return super(CountingParser, self).tokenize(html_string)
+
+
+class TrimmedEngine(object):
+
+    def __init__(self):
+        self.engine = RecordingEngine()
+
+    def get_opcodes(self, a, b, deadline=None):
+        return trimmed_opcodes(self.engine, a, b, deadline)
+
+
+class TrimmedOpcodesTest(EngineTestMixin, unittest.TestCase):
+
+    engine = TrimmedEngine()
+
+    def setUp(self):
+        self.engine.engine.calls = []
+
+    def test_only_middle_matched(self):
+        self.assertEqual(
+            [('equal', 0, 3, 0, 3), ('replace', 3, 4, 3, 5), ('equal', 4, 6, 5, 7)],
+            self._check('abcdef', 'abcXYef')
+        )
+        self.assertEqual([('d', 'XY')], self.engine.engine.calls)
+
+    def test_identical_not_matched(self):
+        self._check('abc', 'abc')
+        self.assertEqual([], self.engine.engine.calls)
+
+    def test_identical_documents(self):
+        parser = CountingParser()
+        collected = []
+        html = u'<p>My text</p><p>Other text</p>'
+        self.assertEqual(html, Diff(parser=parser, instrument=collected.append).get_html_diff(html, html))
+        self.assertEqual(1, parser.calls)
+        self.assertEqual({'equal': 1, 'insert': 0, 'delete': 0, 'replace': 0}, collected[0].opcodes)
+
+
+class GetEngineTest(unittest.TestCase):
+
+    def test_by_name(self):
+        self.assertIsInstance(get_engine('myers'), MyersEngine)
+        self.assertIsInstance(get_engine('histogram'), HistogramEngine)
+        self.assertIsInstance(get_engine(None), SequenceMatcherEngine)
+
+    def test_unknown(self):
+        self.assertRaises(ValueError, get_engine, 'foo')
+
+    def test_diff(self):
+        for engine in ('difflib', 'myers', 'histogram'):
+            self.assertEqual(
+                u'<p>My<ins> changed</ins> text</p>',
+                Diff(engine=engine).get_html_diff(u'<p>My text</p>', u'<p>My changed text</p>')
+            )
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+"""
+    Created on 17.10.26
+    @author: druid
+"""
+import unittest
+
+from pyhtmldiff import Diff
+from pyhtmldiff.differ.moves import MoveDetector
+from pyhtmldiff.differ.iterator import SplittedTextNodesIterator
+
+
+MOVED = u'<p>one two three four five six seven</p>'
+
+ORIGINAL = MOVED + u'<p>short</p><p>alpha beta gamma delta epsilon zeta eta</p><p>tail</p>'
+MODIFIED = u'<p>short</p><p>alpha beta gamma delta epsilon zeta eta</p><p>tail</p>' + MOVED
+
+
+class MoveDetectorTest(unittest.TestCase):
+
+    @staticmethod
+    def _tokens(html):
+        return SplittedTextNodesIterator(Diff.parse_html(html))
+
+    def test_moved_block(self):
+        old = self._tokens(ORIGINAL)
+        new = self._tokens(MODIFIED)
+        opcodes = [('equal', 0, 2, 0, 2), ('delete', 2, 11, 2, 2), ('equal', 11, 24, 2, 15),
+                   ('insert', 24, 24, 15, 24), ('equal', 24, 26, 24, 26)]
+
+        # deleted "one ... seven</p><p>" and inserted "</p><p>one ... seven" are slided to whole paragraphs
+        self.assertEqual([
+            ('equal', 0, 1, 0, 1),
+            ('move_from', 1, 10, 1, 1),
+            ('equal', 10, 25, 1, 16),
+            ('move_to', 1, 2, 16, 17),
+            ('equal', 2, 10, 17, 25),
+            ('equal', 25, 26, 25, 26),
+        ], MoveDetector().detect(old, new, opcodes))
+
+    def test_short_block(self):
+        old = self._tokens(u'<p>a</p><p>b</p>')
+        new = self._tokens(u'<p>b</p><p>a</p>')
+        opcodes = [('delete', 0, 4, 0, 0), ('equal', 4, 8, 0, 4), ('insert', 8, 8, 4, 8)]
+        self.assertIs(opcodes, MoveDetector().detect(old, new, opcodes))
+        self.assertIsNot(opcodes, MoveDetector(min_length=3).detect(old, new, opcodes))
+
+    def test_no_changes(self):
+        old = self._tokens(ORIGINAL)
+        opcodes = [('equal', 0, len(old), 0, len(old))]
+        self.assertIs(opcodes, MoveDetector().detect(old, old, opcodes))
+
+
+class MovedBlocksDiffTest(unittest.TestCase):
+
+    def test_moved_paragraph(self):
+        expected = (
+            u'<p x-diff-move-from="1"></p><p>short</p><p>alpha beta gamma delta epsilon zeta eta</p>'
+            u'<p>tail</p><p x-diff-move-to="1">one two three four five six seven</p>'
+        )
+        self.assertEqual(expected, Diff(detect_moves=True).get_html_diff(ORIGINAL, MODIFIED))
+        self.assertEqual(expected, Diff(detect_moves=True, hierarchical=True).get_html_diff(ORIGINAL, MODIFIED))
+
+    def test_changed_moved_paragraph(self):
+        modified = MODIFIED.replace(u'seven', u'SEVEN')
+        self.assertEqual(
+            u'<p x-diff-move-from="1"></p><p>short</p><p>alpha beta gamma delta epsilon zeta eta</p>'
+            u'<p>tail</p><p x-diff-move-to="1">one two three four five six<del> seven</del><ins> SEVEN</ins></p>',
+            Diff(detect_moves=True).get_html_diff(ORIGINAL, modified)
+        )
+
+        # identical blocks only
+        self.assertNotIn(u'x-diff-move', Diff(detect_moves=MoveDetector(similarity=2)).get_html_diff(
+            ORIGINAL, modified
+        ))
+
+    def test_moved_table_row(self):
+        original = (u'<table><tr><td>a1 a2 a3</td><td>b1 b2</td></tr><tr><td>x</td><td>y</td></tr>'
+                    u'<tr><td>c</td><td>d</td></tr></table>')
+        modified = (u'<table><tr><td>x</td><td>y</td></tr><tr><td>c</td><td>d</td></tr>'
+                    u'<tr><td>a1 a2 a3</td><td>b1 b2</td></tr></table>')
+        self.assertEqual(
+            u'<table><tbody><tr x-diff-move-from="1"></tr><tr><td>x</td><td>y</td></tr><tr><td>c</td><td>d</td></tr>'
+            u'<tr x-diff-move-to="1"><td>a1 a2 a3</td><td>b1 b2</td></tr></tbody></table>',
+            Diff(detect_moves=True).get_html_diff(original, modified)
+        )
+
+    def test_disabled_by_default(self):
+        self.assertNotIn(u'x-diff-move', Diff().get_html_diff(ORIGINAL, MODIFIED))
+
+    def test_stats(self):
+        collected = []
+        Diff(detect_moves=True, instrument=collected.append).get_html_diff(ORIGINAL, MODIFIED)
+        self.assertEqual(1, collected[0].opcodes['move_from'])
+        self.assertEqual(1, collected[0].opcodes['move_to'])
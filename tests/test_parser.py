@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+
+"""
+    Created on 17.10.26
+    @author: druid
+"""
+import os
+import unittest
+
+import yaml
+from genshi.core import START, TEXT
+
+from pyhtmldiff import Diff
+from pyhtmldiff.parser import BACKENDS, Html5libBackend, get_parser
+
+try:
+    import lxml
+except ImportError:
+    lxml = None
+
+
+def scenario_documents():
+    """All HTML snippets used in YAML scenarios"""
+    base = os.path.dirname(__file__)
+    for directory in ('scenarios', '_scenarios'):
+        for filename in sorted(os.listdir(os.path.join(base, directory))):
+            with open(os.path.join(base, directory, filename)) as case_file:
+                data = yaml.safe_load(case_file) or {}
+
+            for name, case in sorted(data.items()):
+                if not isinstance(case, dict):
+                    continue
+
+                for key in ('original', 'modified', 'expected'):
+                    if case.get(key) is not None:
+                        yield '%s:%s:%s' % (filename, name, key), case[key]
+
+
+class BackendConformanceMixin(object):
+    """
+    Backends have to produce exactly the same events as html5lib on all scenarios
+    """
+
+    backend = None
+
+    extra_documents = [
+        u'',
+        u'   ',
+        u'Text only',
+        u'Text <b>with</b> tail',
+        u'<p>Not closed<p>paragraphs',
+        u'<ul><li>Not closed<li>items</ul>',
+        u'<table>\n  <tr><td>1</td></tr>\n  <tr><td>2</td></tr>\n</table>',
+        u'<table><caption>c</caption><tr><td>1</td></tr></table>',
+        u'<p><img src="a.png" alt="x"><br>Line</p>',
+        u'<p>x</p></body><p>lost paragraph</p>',
+        u'<p>x</p></html><p>lost paragraph</p>',
+        u'<pre>\n x</pre>',
+        u'<pre>\n</pre><pre>\n\n</pre><pre><b>\n</b></pre>',
+        u'<textarea>\nfoo</textarea>',
+        u'<listing>\n\nfoo</listing>',
+    ]
+
+    def test_conformance(self):
+        reference = Html5libBackend()
+        backend = get_parser(self.backend)
+        documents = list(scenario_documents()) + [(repr(d), d) for d in self.extra_documents]
+
+        mismatches = [
+            name for name, document in documents
+            if list(reference.parse(document)) != list(backend.parse(document))
+        ]
+        self.assertEqual([], mismatches)
+
+    def test_tokenize_conformance(self):
+        reference = Html5libBackend()
+        backend = get_parser(self.backend)
+        documents = list(scenario_documents()) + [(repr(d), d) for d in self.extra_documents]
+
+        mismatches = [
+            name for name, document in documents
+            if list(reference.tokenize(document)) != list(backend.tokenize(document))
+        ]
+        self.assertEqual([], mismatches)
+
+    def test_unicode(self):
+        backend = get_parser(self.backend)
+        document = u'<p class="a">Some <b>text</b></p>'
+        for events in (backend.parse(document), backend.tokenize(document)):
+            for kind, data, pos in events:
+                if kind == TEXT:
+                    self.assertIsInstance(data, unicode)
+                elif kind == START:
+                    for name, value in data[1]:
+                        self.assertIsInstance(value, unicode)
+
+    def test_diff(self):
+        self.assertEqual(
+            u'<p>My<ins> changed</ins> text</p>',
+            Diff(parser=self.backend).get_html_diff(u'<p>My text</p>', u'<p>My changed text</p>')
+        )
+
+
+@unittest.skipIf(lxml is None, "lxml not installed")
+class LxmlBackendTest(BackendConformanceMixin, unittest.TestCase):
+
+    backend = 'lxml'
+
+    def test_encoded_input(self):
+        self.assertEqual(
+            u'<p>caf\xe9<ins> bar</ins></p>',
+            Diff(parser=self.backend).get_html_diff(b'<p>caf\xc3\xa9</p>', b'<p>caf\xc3\xa9 bar</p>')
+        )
+
+    def test_comments_skipped(self):
+        self.assertEqual(
+            list(get_parser('lxml').parse(u'<p>Foo bar</p>')),
+            list(get_parser('lxml').parse(u'<p>Foo<!-- comment --> bar</p>'))
+        )
+
+
+class GetParserTest(unittest.TestCase):
+
+    def test_default(self):
+        self.assertIsInstance(get_parser(), Html5libBackend)
+
+    def test_unknown(self):
+        self.assertRaises(ValueError, get_parser, 'foo')
+
+    def test_registered(self):
+        self.assertIn('html5lib', BACKENDS)
+        self.assertIn('lxml', BACKENDS)
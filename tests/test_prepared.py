@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+"""
+    Created on 17.10.26
+    @author: druid
+"""
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+from genshi.core import END, START, TEXT, Attrs, QName
+
+from pyhtmldiff import Diff
+from pyhtmldiff.differ.base import StreamDiffer
+from pyhtmldiff.differ.iterator import SplittedTextNodesIterator
+from pyhtmldiff.dtd.compiled import get_dtd
+from pyhtmldiff.prepared import PreparedDocument, load, loads
+
+
+ORIGINAL = u'<p>Zażółć <b class="x">gęślą</b> jaźń</p><ul><li>one two</li><li>three</li></ul><p>Tail</p>'
+MODIFIED = u'<p>Zażółć <b class="x">gęślą</b> duszę</p><ul><li>one two</li><li>four</li></ul><p>Tail</p>'
+
+
+class PreparedDocumentTest(unittest.TestCase):
+
+    def test_diff(self):
+        for differ in (Diff(), Diff(hierarchical=True)):
+            expected = differ.get_html_diff(ORIGINAL, MODIFIED)
+            self.assertEqual(expected, differ.get_html_diff(differ.prepare(ORIGINAL), differ.prepare(MODIFIED)))
+            # prepared and not prepared versions can be mixed
+            self.assertEqual(expected, differ.get_html_diff(differ.prepare(ORIGINAL), MODIFIED))
+
+    def test_dumps(self):
+        prepared = Diff().prepare(ORIGINAL)
+        loaded = loads(prepared.dumps())
+        self.assertEqual(list(prepared), list(loaded))
+        self.assertEqual(prepared.get_blocks(), loaded.get_blocks())
+        self.assertEqual(prepared.scheme, loaded.scheme)
+        self.assertEqual(list(prepared), list(pickle.loads(pickle.dumps(prepared, 2))))
+
+    def test_load(self):
+        differ = Diff(hierarchical=True)
+        directory = tempfile.mkdtemp()
+        try:
+            paths = [os.path.join(directory, name) for name in ('original.bin', 'modified.bin')]
+            for path, version in zip(paths, (ORIGINAL, MODIFIED)):
+                with open(path, 'wb') as output:
+                    differ.prepare(version).dump(output)
+
+            self.assertEqual(
+                differ.get_html_diff(ORIGINAL, MODIFIED),
+                differ.get_html_diff(load(paths[0]), load(paths[1]))
+            )
+            with open(paths[0], 'rb') as source:
+                self.assertEqual(list(differ.prepare(ORIGINAL)), list(load(source)))
+        finally:
+            shutil.rmtree(directory)
+
+    def test_many_distinct_words(self):
+        # data identifiers do not fit in 2 bytes
+        p = QName('http://www.w3.org/1999/xhtml}p')
+        events = [(START, (p, Attrs()), None)]
+        events.extend((TEXT, u'w%d ' % idx, None) for idx in range(70000))
+        events.append((END, p, None))
+        prepared = PreparedDocument.prepare(SplittedTextNodesIterator.from_tokens(events), get_dtd())
+        self.assertEqual(list(prepared), list(loads(prepared.dumps())))
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, loads, b'<p>Not prepared</p>')
+        self.assertRaises(ValueError, loads, Diff().prepare(ORIGINAL).dumps()[:-10])
+
+    def test_prepared_blocks(self):
+        original = Diff().prepare(ORIGINAL)
+        modified = Diff().prepare(MODIFIED)
+        self.assertEqual(
+            (original.get_blocks(), modified.get_blocks()),
+            StreamDiffer(original, modified, hierarchical=True)._prepared_blocks(original, modified)
+        )
+
+        # blocks compared ignoring attributes are not the prepared ones
+        self.assertIsNone(
+            StreamDiffer(original, modified, diff_attributes=True)._prepared_blocks(original, modified)
+        )
+        events = list(Diff.parse_html(MODIFIED))
+        self.assertIsNone(StreamDiffer(original, events)._prepared_blocks(original, events))
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+"""
+    Created on 17.10.26
+    @author: druid
+"""
+import sys
+import unittest
+import warnings
+
+from genshi import Stream
+from genshi.core import START, END, TEXT, Attrs, QName
+
+from pyhtmldiff.differ.engine import HistogramEngine
+from pyhtmldiff.differ.iterator import DiffIterator, SplittedTextNodesIterator
+from pyhtmldiff.differ.processor import RootProcessor
+from pyhtmldiff.parser import Html5libBackend
+from pyhtmldiff.stats import DiffStats
+
+
+POS = (None, -1, -1)
+
+
+def _start(tag):
+    return START, (QName('http://www.w3.org/1999/xhtml}' + tag), Attrs()), POS
+
+
+def _end(tag):
+    return END, QName('http://www.w3.org/1999/xhtml}' + tag), POS
+
+
+def nested_sections(depth, new):
+    """Tokens of nested divisions, in new version every nested division is wrapped by inserted section"""
+    events = []
+    for level in range(depth):
+        if new and level:
+            events.extend([_start('section'), (TEXT, u'new', POS)])
+        events.extend([_start('div'), (TEXT, u'a%d' % level, POS)])
+
+    events.append((TEXT, u'leaf', POS))
+    for level in range(depth - 1, -1, -1):
+        events.append(_end('div'))
+        if new and level:
+            events.append(_end('section'))
+
+    fragment = QName('DOCUMENT_FRAGMENT')
+    return [(START, (fragment, Attrs()), POS)] + events + [(END, fragment, POS)]
+
+
+def nested_sections_diff(depth):
+    """Expected diff of nested_sections()"""
+    opening = u''.join(
+        (u'<section><ins>new</ins>' if level else u'') + u'<div>a%d' % level for level in range(depth)
+    )
+    return opening + u'leaf' + u'</div></section>' * (depth - 1) + u'</div>'
+
+
+class RootProcessorTest(unittest.TestCase):
+
+    def _processor(self, depth, stats=None):
+        # closing tags are too popular for SequenceMatcher autojunk heuristic in deeply nested documents
+        engine = HistogramEngine()
+        iterator = DiffIterator(nested_sections(depth, False), nested_sections(depth, True), engine)
+        return RootProcessor(iterator, stats)
+
+    def _render(self, events):
+        # without the root fragment
+        return Stream(events[1:-1]).render('html', encoding=None)
+
+    def test_nesting(self):
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            result = self._processor(50).execute()
+
+        self.assertEqual([], caught)
+        self.assertEqual(nested_sections_diff(50), self._render(result))
+
+    def test_deep_nesting(self):
+        # every nesting level runs two nested processors, so processors are nested far deeper than
+        # recursion limit
+        depth = sys.getrecursionlimit()
+        stats = DiffStats()
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            result = self._processor(depth, stats).execute()
+
+        self.assertGreater(stats.max_depth, sys.getrecursionlimit())
+        self.assertEqual([], caught)
+        self.assertEqual(nested_sections_diff(depth), self._render(result))
+
+    def test_lazy_same_as_materialized(self):
+        self.assertEqual(self._processor(50).execute(), list(self._processor(50).iter_execute(checkpoint=4)))
+
+    def test_processors_reused(self):
+        parser = Html5libBackend()
+        old = SplittedTextNodesIterator(parser.parse(u'<p>Some text</p>' * 20))
+        new = SplittedTextNodesIterator(parser.parse(u'<p>Some new text</p>' * 20))
+
+        stats = DiffStats()
+        processor = RootProcessor(DiffIterator(old, new), stats)
+        processor.execute()
+
+        instances = sum(len(pool) for pool in processor._pool.values())
+        self.assertLess(instances, stats.processors)
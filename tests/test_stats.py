@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+"""
+    Created on 17.10.26
+    @author: druid
+"""
+import unittest
+
+from pyhtmldiff import Diff
+from pyhtmldiff.stats import DiffStats
+
+
+class DiffStatsTest(unittest.TestCase):
+
+    original = u'<p>My text</p><ul><li>first item</li><li>second item</li></ul>'
+    modified = u'<p>My new text</p><ul><li>first item</li><li>third item</li></ul>'
+
+    def _collect(self, method='get_html_diff', **kwargs):
+        collected = []
+        differ = Diff(instrument=collected.append, **kwargs)
+        result = getattr(differ, method)(self.original, self.modified)
+        return result, collected
+
+    def test_counters(self):
+        result, collected = self._collect()
+        self.assertEqual(1, len(collected))
+
+        stats = collected[0]
+        self.assertIsInstance(stats, DiffStats)
+        # <p> My text </p> <ul> <li> first item </li> <li> second item </li> </ul> + fake root
+        self.assertEqual(16, stats.old_tokens)
+        self.assertEqual(17, stats.new_tokens)
+        self.assertEqual(1, stats.opcodes['insert'])
+        self.assertEqual(1, stats.opcodes['replace'])
+        self.assertEqual(0, stats.opcodes['delete'])
+        self.assertGreater(stats.processors, 0)
+        self.assertGreater(stats.max_depth, 0)
+        self.assertGreater(stats.output_events, 0)
+        self.assertEqual(set(DiffStats.PHASES), set(stats.timings))
+        self.assertGreater(stats.timings['render'], 0)
+
+    def test_same_result(self):
+        result, _ = self._collect()
+        self.assertEqual(Diff().get_html_diff(self.original, self.modified), result)
+
+    def test_generic_diff(self):
+        stream, collected = self._collect('get_generic_diff')
+        self.assertEqual(1, len(collected))
+        self.assertEqual(len(list(stream)), collected[0].output_events)
+        self.assertEqual(0, collected[0].timings['render'])
+
+    def test_streaming(self):
+        stream, collected = self._collect('get_generic_diff', streaming=True)
+        # diff is calculated when the stream is consumed
+        self.assertEqual([], collected)
+
+        events = list(stream)
+        self.assertEqual(1, len(collected))
+        self.assertEqual(len(events), collected[0].output_events)
+        self.assertGreater(collected[0].processors, 0)
+
+    def test_hierarchical(self):
+        result, collected = self._collect(hierarchical=True)
+        # text of equal blocks is not splitted into words
+        self.assertEqual(15, collected[0].old_tokens)
+        self.assertEqual(16, collected[0].new_tokens)
+        self.assertGreater(collected[0].opcodes['equal'], 0)
+        # only the changed paragraph and list item are splitted into words
+        self.assertGreater(collected[0].timings['tokenize'], 0)
+        self.assertGreater(collected[0].timings['match'], 0)
+
+    def test_chain(self):
+        collected = []
+        diffs = list(Diff(instrument=collected.append).diff_chain([self.original, self.modified, self.original]))
+        self.assertEqual(2, len(diffs))
+        self.assertEqual(2, len(collected))
+
+    def test_as_dict(self):
+        stats = DiffStats()
+        stats.count_opcodes([('equal', 0, 1, 0, 1), ('insert', 1, 1, 1, 2), ('equal', 1, 2, 2, 3)])
+        self.assertEqual({'equal': 2, 'insert': 1, 'delete': 0, 'replace': 0}, stats.as_dict()['opcodes'])
+
+        with stats.timer('match'):
+            pass
+        self.assertGreaterEqual(stats.total_time, 0)
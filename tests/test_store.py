@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+"""
+    Created on 17.10.26
+    @author: druid
+"""
+import pickle
+import types
+import unittest
+
+from genshi.core import START, END, TEXT, Attrs, QName
+
+from pyhtmldiff.differ.iterator import SplittedTextNodesIterator
+from pyhtmldiff.differ.store import TokenStore
+from pyhtmldiff.differ.tokens import TokenTable
+from pyhtmldiff.parser import Html5libBackend
+
+
+class TokenStoreTest(unittest.TestCase):
+
+    html = u'<p>Some <b>bold</b> text</p><p>Some text</p>'
+
+    def setUp(self):
+        self.events = list(Html5libBackend().parse(self.html))
+
+    def test_same_events(self):
+        store = TokenStore(self.events)
+        self.assertEqual(self.events, list(store))
+        self.assertEqual(len(self.events), len(store))
+        self.assertEqual(self.events[2], store[2])
+        self.assertEqual(self.events[-1], store[-1])
+        self.assertEqual(self.events[1:4], store[1:4])
+        self.assertRaises(IndexError, lambda: store[len(self.events)])
+
+    def test_iter_range(self):
+        store = TokenStore(self.events)
+        self.assertIsInstance(store.iter_range(1, 4), types.GeneratorType)
+        for start, stop in ((1, 4), (0, len(store)), (3, 3), (5, 100)):
+            self.assertEqual(self.events[start:stop], list(store.iter_range(start, stop)))
+
+        events = [(TEXT, u'a', ('file', 1, 2)), (TEXT, u'b', ('file', 1, 3))]
+        self.assertEqual(events[1:], list(TokenStore(events, positions=True).iter_range(1, 2)))
+
+    def test_data_interned(self):
+        tokens = SplittedTextNodesIterator(self.events)
+        texts = [event[1] for event in tokens if event[0] == TEXT]
+        self.assertEqual(2, texts.count(u'Some'))
+        self.assertIs(tokens[2][1], tokens[-4][1])
+
+    def test_tag_name_is_not_text(self):
+        name = QName('b')
+        store = TokenStore([(START, (name, Attrs()), None), (TEXT, u'b', None), (END, name, None)])
+        self.assertIsInstance(store[2][1], QName)
+        self.assertNotIsInstance(store[1][1], QName)
+
+    def test_positions(self):
+        events = [(TEXT, u'a', ('file', 1, 2)), (TEXT, u'b', ('file', 1, 3))]
+        self.assertEqual([TokenStore.POS] * 2, [event[2] for event in TokenStore(events)])
+        self.assertEqual(events, list(TokenStore(events, positions=True)))
+
+    def test_intern(self):
+        tokens = SplittedTextNodesIterator(self.events)
+        self.assertEqual(list(TokenTable().intern(list(tokens))), list(TokenTable().intern(tokens)))
+
+    def test_pickle(self):
+        store = pickle.loads(pickle.dumps(TokenStore(self.events), pickle.HIGHEST_PROTOCOL))
+        self.assertEqual(self.events, list(store))
+
+        store.append((TEXT, u'Some text', None))
+        self.assertIs(store[-1][1], store[-4][1])
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+"""
+    Created on 17.10.26
+    @author: druid
+"""
+import gzip
+import io
+import types
+import unittest
+
+from pyhtmldiff import Diff
+from pyhtmldiff.differ.iterator import DiffIterator, SplittedTextNodesIterator
+from pyhtmldiff.differ.tracing import Tracer
+from pyhtmldiff.parser import Html5libBackend
+from pyhtmldiff.utils import strip_root
+
+
+class CountingTokens(object):
+    """Tokens which count events taken from them"""
+
+    def __init__(self, tokens):
+        self._tokens = tokens
+        self.produced = 0
+
+    def __len__(self):
+        return len(self._tokens)
+
+    def iter_range(self, start, stop):
+        for event in self._tokens.iter_range(start, stop):
+            self.produced += 1
+            yield event
+
+
+class WritesRecorder(io.StringIO):
+    """Text buffer recording sizes of writes"""
+
+    def __init__(self):
+        super(WritesRecorder, self).__init__()
+        self.writes = []
+
+    def write(self, string):
+        self.writes.append(len(string))
+        return super(WritesRecorder, self).write(string)
+
+
+class StreamingDiffTest(unittest.TestCase):
+
+    original = u''.join(u'<p>Paragraph %d with <b>some</b> text</p>\n' % i for i in range(300))
+    modified = original.replace(u'Paragraph 10 ', u'Paragraph ten ').replace(u'<p>Paragraph 250 ', u'<p>')
+
+    def test_same_as_materialized(self):
+        self.assertEqual(
+            Diff().get_html_diff(self.original, self.modified),
+            Diff(streaming=True).get_html_diff(self.original, self.modified)
+        )
+
+    def test_lazy(self):
+        tracer = Tracer(capacity=100000)
+        stream = Diff(streaming=True, tracer=tracer).get_generic_diff(self.original, self.modified)
+        self.assertIsInstance(stream.events, types.GeneratorType)
+
+        # only beginning of the document is processed
+        events = iter(stream)
+        for _ in range(10):
+            next(events)
+        processed = len(tracer.events)
+
+        # processors trace every opened and closed element
+        list(events)
+        self.assertLess(processed, len(tracer.events) / 10)
+
+    def test_lazy_ranges(self):
+        old = CountingTokens(SplittedTextNodesIterator(Html5libBackend().parse(self.original)))
+        diff = DiffIterator(old, old, opcodes=[('equal', 0, len(old), 0, len(old))])
+        for _ in range(3):
+            next(diff)
+
+        # events of the operation are not created in advance
+        self.assertEqual(3, old.produced)
+
+    def test_chunks(self):
+        expected = Diff().get_html_diff(self.original, self.modified)
+        for streaming in (False, True):
+            chunks = list(Diff(streaming=streaming).iter_diff(self.original, self.modified, chunk_size=1000))
+            self.assertEqual(expected, u''.join(chunks))
+            self.assertGreater(len(chunks), 10)
+            for chunk in chunks[:-1]:
+                self.assertTrue(1000 <= len(chunk) < 1200)
+
+    def test_encoded_chunks(self):
+        differ = Diff(encoding='ascii')
+        chunks = list(differ.iter_diff(u'<p>Zażółć</p>', u'<p>Zażółć gęślą</p>', chunk_size=5))
+        self.assertTrue(all(isinstance(chunk, bytes) for chunk in chunks))
+        self.assertEqual(differ.get_html_diff(u'<p>Zażółć</p>', u'<p>Zażółć gęślą</p>'), b''.join(chunks))
+
+    def test_chunks_stats(self):
+        collected = []
+        chunks = Diff(instrument=collected.append).iter_diff(self.original, self.modified)
+        next(chunks)
+        self.assertEqual([], collected)
+        list(chunks)
+        self.assertEqual(1, len(collected))
+        self.assertGreater(collected[0].timings['render'], 0)
+
+    def test_write(self):
+        expected = Diff().get_html_diff(self.original, self.modified)
+        output = WritesRecorder()
+        written = Diff(streaming=True).write_diff(self.original, self.modified, output, chunk_size=1000)
+        self.assertEqual(expected, output.getvalue())
+        self.assertEqual(len(expected), written)
+        self.assertLess(max(output.writes), 1200)
+
+    def test_write_gzip(self):
+        expected = Diff(encoding='utf-8').get_html_diff(self.original, self.modified)
+        output = io.BytesIO()
+        with gzip.GzipFile(fileobj=output, mode='wb') as compressed:
+            Diff(encoding='utf-8').write_diff(self.original, self.modified, compressed)
+
+        output.seek(0)
+        with gzip.GzipFile(fileobj=output, mode='rb') as compressed:
+            self.assertEqual(expected, compressed.read())
+
+    def test_strip_root(self):
+        self.assertEqual([2, 3], list(strip_root(iter([1, 2, 3, 4]))))
+        self.assertEqual([], list(strip_root(iter([1, 2]))))
+        self.assertEqual([], list(strip_root(iter([]))))
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+"""
+    Created on 17.10.26
+    @author: druid
+"""
+import unittest
+
+from pyhtmldiff import Diff
+from pyhtmldiff.differ.block import BlockSplitter
+from pyhtmldiff.differ.table import TableDiffer
+
+
+def _table(rows, column=None):
+    """
+    :param rows: list of rows cells
+    :param column: text of a column inserted as the third one
+    """
+    html = [u'<p>Report</p><table>']
+    for cells in rows:
+        if column is not None:
+            cells = cells[:2] + [column] + cells[2:]
+        html.append(u'<tr>%s</tr>' % u''.join(u'<td>%s</td>' % cell for cell in cells))
+    html.append(u'</table><p>End</p>')
+    return u''.join(html)
+
+
+ROWS = [
+    [u'k1', u'10 20', u'a b'],
+    [u'k2', u'30', u'c'],
+    [u'k3', u'40', u'd'],
+]
+
+
+class BlockSplitterTest(unittest.TestCase):
+
+    def test_table_block(self):
+        events = list(Diff.parse_html(_table(ROWS)))
+        # every row cell is a block
+        self.assertGreater(len(BlockSplitter().split(events)), 10)
+        # root tags, paragraphs and the whole table
+        self.assertEqual(5, len(BlockSplitter(tables=True).split(events)))
+
+
+class TableDifferTest(unittest.TestCase):
+
+    def _diff(self, original, modified):
+        old = list(Diff.parse_html(original))
+        new = list(Diff.parse_html(modified))
+        return TableDiffer().diff(old[4:-4], new[4:-4])
+
+    def test_identical(self):
+        old, new, opcodes = self._diff(_table(ROWS), _table(ROWS))
+        self.assertEqual([('equal', 0, len(old), 0, len(new))], opcodes)
+
+    def test_inserted_column(self):
+        old, new, opcodes = self._diff(_table(ROWS), _table(ROWS, u'new'))
+        # one insert per row, adjacent equal runs are merged
+        self.assertEqual(['equal', 'insert'] * 3 + ['equal'], [opcode[0] for opcode in opcodes])
+        for tag, i1, i2, j1, j2 in opcodes:
+            if tag == 'insert':
+                self.assertEqual(u'new', u''.join(event[1] for event in new[j1:j2] if event[0] == 'TEXT'))
+
+    def test_changed_cell(self):
+        rows = [ROWS[0][:1] + [u'10 25'] + ROWS[0][2:]] + ROWS[1:]
+        old, new, opcodes = self._diff(_table(ROWS), _table(rows))
+        # only the changed cell is splitted into words
+        changes = [(tag, [event[1] for event in old[i1:i2] + new[j1:j2]])
+                   for tag, i1, i2, j1, j2 in opcodes if tag != 'equal']
+        self.assertEqual([('replace', [u' 20', u' 25'])], changes)
+
+
+class TablesDiffTest(unittest.TestCase):
+
+    def test_inserted_column(self):
+        self.assertEqual(
+            u'<p>Report</p><table><tbody>'
+            u'<tr><td>k1</td><td>10 20</td><td><ins>new</ins></td><td>a b</td></tr>'
+            u'<tr><td>k2</td><td>30</td><td><ins>new</ins></td><td>c</td></tr>'
+            u'<tr><td>k3</td><td>40</td><td><ins>new</ins></td><td>d</td></tr>'
+            u'</tbody></table><p>End</p>',
+            Diff(tables=True).get_html_diff(_table(ROWS), _table(ROWS, u'new'))
+        )
+
+    def test_rows_aligned_by_key(self):
+        rows = [[u'k1', u'10 25', u'a b'], ROWS[2], [u'k4', u'50', u'e']]
+        self.assertEqual(
+            u'<p>Report</p><table><tbody>'
+            u'<tr><td>k1</td><td>10<del> 20</del><ins> 25</ins></td><td>a b</td></tr>'
+            u'<tr><td><del>k2</del></td><td><del>30</del></td><td><del>c</del></td></tr>'
+            u'<tr><td>k3</td><td>40</td><td>d</td></tr>'
+            u'<tr><td><ins>k4</ins></td><td><ins>50</ins></td><td><ins>e</ins></td></tr>'
+            u'</tbody></table><p>End</p>',
+            Diff(tables=True).get_html_diff(_table(ROWS), _table(rows))
+        )
+
+    def test_text_around_tables(self):
+        original = _table(ROWS)
+        modified = _table(ROWS, u'new').replace(u'End', u'Total')
+        result = Diff(tables=True).get_html_diff(original, modified)
+        self.assertIn(u'<p><del>End</del><ins>Total</ins></p>', result)
+        self.assertEqual(3, result.count(u'<ins>new</ins>'))
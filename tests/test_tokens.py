@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+
+"""
+    Created on 17.10.26
+    @author: druid
+"""
+import unittest
+
+from genshi.core import START, END, TEXT, QName, Attrs
+
+from pyhtmldiff.differ.tokens import TokenTable
+
+
+class TokenTableTest(unittest.TestCase):
+
+    def test_position_ignored(self):
+        table = TokenTable()
+        old = [
+            (START, (QName('p'), Attrs()), ('a.html', 1, 1)),
+            (TEXT, u'Foo', ('a.html', 1, 4)),
+            (END, QName('p'), ('a.html', 1, 7)),
+        ]
+        new = [
+            (START, (QName('p'), Attrs()), ('b.html', 2, 1)),
+            (TEXT, u'Bar', ('b.html', 2, 4)),
+            (END, QName('p'), ('b.html', 2, 7)),
+        ]
+
+        self.assertEqual([0, 1, 2], list(table.intern(old)))
+        self.assertEqual([0, 3, 2], list(table.intern(new)))
+        self.assertEqual(4, len(table))
+
+    def test_attributes_distinguished(self):
+        table = TokenTable()
+        ids = table.intern([
+            (START, (QName('p'), Attrs([(QName('class'), u'a')])), None),
+            (START, (QName('p'), Attrs([(QName('class'), u'b')])), None),
+            (START, (QName('p'), Attrs([(QName('class'), u'a')])), None),
+        ])
+        self.assertEqual([0, 1, 0], list(ids))
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+"""
+    Created on 17.10.26
+    @author: druid
+"""
+import logging
+import unittest
+
+try:
+    from cStringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+from pyhtmldiff import Diff
+from pyhtmldiff.differ.tracing import Tracer
+
+
+class TracerTest(unittest.TestCase):
+
+    original = u'<p>My text</p><ul><li>first item</li></ul>'
+    modified = u'<p>My new text</p><ul><li>first item</li></ul>'
+
+    def test_ring_buffer(self):
+        tracer = Tracer(capacity=5)
+        Diff(tracer=tracer).get_html_diff(self.original, self.modified)
+
+        events = tracer.events
+        self.assertEqual(5, len(events))
+        kinds = set(kind for kind, args in events)
+        self.assertTrue(kinds <= {'create', 'leave_processor', 'enter', 'leave', 'open_diff', 'close_diff'})
+
+    def test_events(self):
+        tracer = Tracer()
+        Diff(tracer=tracer).get_html_diff(self.original, self.modified)
+
+        kinds = [kind for kind, args in tracer.events]
+        self.assertIn('create', kinds)
+        self.assertIn('open_diff', kinds)
+        self.assertIn('close_diff', kinds)
+        self.assertEqual(kinds.count('create'), kinds.count('leave_processor'))
+
+    def test_dump(self):
+        tracer = Tracer()
+        Diff(tracer=tracer).get_html_diff(self.original, self.modified)
+
+        out = StringIO()
+        tracer.dump(out)
+        self.assertEqual(len(tracer.events), len(out.getvalue().splitlines()))
+
+        tracer.clear()
+        self.assertEqual([], tracer.events)
+
+    def test_disabled(self):
+        self.assertIsNone(Tracer.from_logger())
+
+    def test_debug_logging(self):
+        logger = logging.getLogger('pyHtmlDiff')
+        handler = _CollectingHandler()
+        logger.addHandler(handler)
+        level = logger.level
+        logger.setLevel(logging.DEBUG)
+        try:
+            Diff().get_html_diff(self.original, self.modified)
+        finally:
+            logger.removeHandler(handler)
+            logger.setLevel(level)
+
+        self.assertTrue(any(message.startswith('-> Entering into processor') for message in handler.messages))
+
+
+class _CollectingHandler(logging.Handler):
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())